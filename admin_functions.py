@@ -1,238 +1,1078 @@
-from database import get_airline_connection
-import streamlit as st
-
-# ------------------- Aircraft Management -------------------
-def add_aircraft(model, manufacturer, seat_capacity):
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO aircrafts (model, manufacturer, seat_capacity) VALUES (%s, %s, %s)",
-        (model, manufacturer, seat_capacity)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def delete_aircraft_by_model(model):
-    """Delete aircraft by model name"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM aircrafts WHERE model = %s", (model,))
-    rows_affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
-    return rows_affected
-
-def get_aircrafts():
-    """Get all aircrafts - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT aircraft_id, model, manufacturer, seat_capacity FROM aircrafts ORDER BY aircraft_id")
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-# ------------------- Airport Management -------------------
-def add_airport(code, name, city, country):
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO airports (code, name, city, country) VALUES (%s, %s, %s, %s)",
-        (code, name, city, country)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def delete_airport_by_code(code):
-    """Delete airport by airport code"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM airports WHERE code = %s", (code,))
-    rows_affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
-    return rows_affected
-
-def get_airports():
-    """Get all airports - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT airport_id, code, name, city, country FROM airports ORDER BY airport_id")
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-# ------------------- Flight Management -------------------
-def add_flight(flight_number, origin_airport_id, destination_airport_id,
-               departure_time, arrival_time, aircraft_id, fare):
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id, 
-                           departure_time, arrival_time, aircraft_id, fare)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-    """, (flight_number, origin_airport_id, destination_airport_id,
-          departure_time, arrival_time, aircraft_id, fare))
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def delete_flight_by_number(flight_number):
-    """Delete flight by flight number"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM flights WHERE flight_number = %s", (flight_number,))
-    rows_affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
-    return rows_affected
-
-def view_flights():
-    """Get all flights with capacity info - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT f.flight_id, f.flight_number, 
-               o.name AS origin, d.name AS destination, 
-               f.departure_time, f.arrival_time, 
-               a.model AS aircraft, 
-               a.seat_capacity,
-               COALESCE(
-                   (SELECT COUNT(*) FROM tickets t 
-                    WHERE t.flight_id = f.flight_id 
-                    AND t.status != 'cancelled'), 0
-               ) AS booked_seats,
-               f.fare
-        FROM flights f
-        LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
-        LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
-        LEFT JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
-        ORDER BY f.flight_id
-    """)
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-# ------------------- Passenger Management -------------------
-def delete_passenger_completely(email):
-    """Delete user from both airline DB and auth DB"""
-    # 1. Get passenger_id from airline DB
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT passanger_id FROM passangers WHERE email = %s", (email,))
-    result = cur.fetchone()
-    passanger_id = result[0] if result else None
-    cur.close()
-    conn.close()
-
-    if passanger_id:
-        # 2. Delete from main airline DB
-        conn = get_airline_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM passangers WHERE passanger_id = %s", (passanger_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        # 3. Delete login credentials from auth DB
-        conn = get_auth_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM user_credentials WHERE passanger_id = %s", (passanger_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return True
-    return False
-
-
-def view_passengers():
-    """Get all passengers - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT passanger_id, full_name, email, phone, nationality 
-        FROM passangers 
-        ORDER BY passanger_id
-    """)
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-# ------------------- Ticket Management -------------------
-def delete_ticket_by_id(ticket_id):
-    """Delete ticket by ticket ID"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tickets WHERE ticket_id = %s", (ticket_id,))
-    rows_affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
-    return rows_affected
-
-def view_all_tickets():
-    """Get all tickets - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT t.ticket_id, t.passanger_id, p.email, f.flight_number,
-               o.name AS origin, d.name AS destination,
-               f.departure_time, t.seat_no, t.status
-        FROM tickets t
-        JOIN passangers p ON t.passanger_id = p.passanger_id
-        JOIN flights f ON t.flight_id = f.flight_id
-        LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
-        LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
-        ORDER BY t.ticket_id
-    """)
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-# ------------------- Payment Management -------------------
-def delete_payment_by_id(payment_id):
-    """Delete payment by payment ID"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM payments WHERE payment_id = %s", (payment_id,))
-    rows_affected = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
-    return rows_affected
-
-def view_all_payments():
-    """Get all payments - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT p.payment_id, p.ticket_id, t.passanger_id, 
-               ps.email, p.amount, p.method, p.status, p.payment_time
-        FROM payments p
-        JOIN tickets t ON p.ticket_id = t.ticket_id
-        JOIN passangers ps ON t.passanger_id = ps.passanger_id
-        ORDER BY p.payment_id DESC
-    """)
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-
-
+import csv
+import io
+from contextlib import ExitStack
+from datetime import datetime
+from psycopg2.extras import execute_values
+from database import (airline_connection, replica_connection, TwoPhaseCommit, stream_query, copy_query_to,
+                      IteratorFile, query_stats, pool_stats, replica_stats)
+from inventory import record_ticket_changes, rebuild_inventory
+from cache import reference_cache, analytics_cache, view_cache, cache_stats
+from itinerary import flight_graph
+from change_feed import change_feed
+from db_config import HOLD_CONFIG
+import streamlit as st
+
+# ------------------- Keyset Pagination -------------------
+def _where(select_sql, clauses):
+    return select_sql + (" WHERE " + " AND ".join(clauses) if clauses else "")
+
+
+def _fetch_page(select_sql, key_column, clauses, params, after_id, limit, descending=False):
+    """Fetch one page ordered by key_column, starting after the key ``after_id``.
+
+    Seeks on the key instead of using OFFSET, so every page costs the same
+    however deep it is. The key must be the first selected column. Returns
+    ``(columns, data, next_after_id)``; next_after_id is None on the last page.
+    """
+    clauses, params = list(clauses), list(params)
+    if after_id is not None:
+        clauses.append(f"{key_column} {'<' if descending else '>'} %s")
+        params.append(after_id)
+    sql = _where(select_sql, clauses) + f" ORDER BY {key_column} {'DESC' if descending else 'ASC'} LIMIT %s"
+    params.append(limit + 1)
+
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+
+    next_after_id = data[limit - 1][0] if len(data) > limit else None
+    return columns, data[:limit], next_after_id
+
+# ------------------- Aircraft Management -------------------
+def add_aircraft(model, manufacturer, seat_capacity, seats_per_row=6):
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO aircrafts (model, manufacturer, seat_capacity, seats_per_row) VALUES (%s, %s, %s, %s)",
+            (model, manufacturer, seat_capacity, seats_per_row)
+        )
+        conn.commit()
+    reference_cache.invalidate("aircrafts")
+
+def delete_aircraft_by_model(model):
+    """Delete aircraft by model name"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM aircrafts WHERE model = %s", (model,))
+        rows_affected = cur.rowcount
+        conn.commit()
+    reference_cache.invalidate("aircrafts", "flight_metadata")
+    flight_graph.invalidate()  # cascaded flight deletes
+    return rows_affected
+
+def _load_aircrafts():
+    with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+        cur.execute("SELECT aircraft_id, model, manufacturer, seat_capacity, seats_per_row FROM aircrafts ORDER BY aircraft_id")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def get_aircrafts():
+    """Get all aircrafts - cached process-wide, invalidated by aircraft writes"""
+    return reference_cache.get_or_load("aircrafts", _load_aircrafts)
+
+# ------------------- Airport Management -------------------
+def add_airport(code, name, city, country):
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO airports (code, name, city, country) VALUES (%s, %s, %s, %s)",
+            (code, name, city, country)
+        )
+        conn.commit()
+    reference_cache.invalidate("airports")
+    flight_graph.invalidate()
+
+def delete_airport_by_code(code):
+    """Delete airport by airport code"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM airports WHERE code = %s", (code,))
+        rows_affected = cur.rowcount
+        conn.commit()
+    reference_cache.invalidate("airports", "flight_metadata")
+    flight_graph.invalidate()  # cascaded flight deletes
+    return rows_affected
+
+def _load_airports():
+    with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+        cur.execute("SELECT airport_id, code, name, city, country FROM airports ORDER BY airport_id")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def get_airports():
+    """Get all airports - cached process-wide, invalidated by airport writes"""
+    return reference_cache.get_or_load("airports", _load_airports)
+
+# ------------------- Flight Management -------------------
+def add_flight(flight_number, origin_airport_id, destination_airport_id,
+               departure_time, arrival_time, aircraft_id, fare):
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH new_flight AS (
+                INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id,
+                                   departure_time, arrival_time, aircraft_id, fare)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING flight_id, flight_number, origin_airport_id, destination_airport_id,
+                          departure_time, arrival_time, fare, aircraft_id
+            ), inventory AS (
+                INSERT INTO flight_inventory (flight_id, seat_bitmap)
+                SELECT nf.flight_id, decode(repeat('00', (a.seat_capacity + 7) / 8), 'hex')
+                FROM new_flight nf
+                JOIN aircrafts a ON a.aircraft_id = nf.aircraft_id
+            )
+            SELECT flight_id, flight_number, origin_airport_id, destination_airport_id,
+                   departure_time, arrival_time, fare
+            FROM new_flight
+        """, (flight_number, origin_airport_id, destination_airport_id,
+              departure_time, arrival_time, aircraft_id, fare))
+        leg = cur.fetchone()
+        conn.commit()
+    reference_cache.invalidate("flight_metadata")
+    flight_graph.add_flight(leg)
+    return leg[0]
+
+# One VALUES row per flight, numbered by ``item`` so outcomes come back in
+# input order. Invalid rows get an error instead of failing the statement;
+# a NULL flight_id with no error means ON CONFLICT skipped an existing flight.
+# Literal percent signs are doubled for execute_values.
+_ADD_FLIGHTS_BULK_SQL = """
+    WITH input (item, flight_number, origin_id, destination_id, departure_time, arrival_time,
+                aircraft_id, fare) AS (
+        VALUES %s
+    ), resolved AS MATERIALIZED (
+        SELECT i.item, COALESCE(btrim(i.flight_number), '') AS flight_number,
+               o.airport_id AS origin_id, d.airport_id AS destination_id,
+               try_timestamp(i.departure_time) AS departure_time,
+               try_timestamp(i.arrival_time) AS arrival_time,
+               a.aircraft_id, round(try_numeric(i.fare), 2) AS fare,
+               i.origin_id AS raw_origin, i.destination_id AS raw_destination,
+               i.departure_time AS raw_departure, i.arrival_time AS raw_arrival,
+               i.aircraft_id AS raw_aircraft, i.fare AS raw_fare
+        FROM input i
+        LEFT JOIN airports o ON o.airport_id = i.origin_id
+        LEFT JOIN airports d ON d.airport_id = i.destination_id
+        LEFT JOIN aircrafts a ON a.aircraft_id = i.aircraft_id
+    ), checked AS MATERIALIZED (
+        SELECT c.*,
+               CASE
+                   WHEN c.flight_number = '' THEN 'missing flight_number'
+                   WHEN c.origin_id IS NULL THEN format('unknown origin airport %%s', c.raw_origin)
+                   WHEN c.destination_id IS NULL THEN format('unknown destination airport %%s', c.raw_destination)
+                   WHEN c.origin_id = c.destination_id THEN 'origin and destination are the same airport'
+                   WHEN c.departure_time IS NULL THEN format('invalid departure_time %%L', c.raw_departure)
+                   WHEN c.arrival_time IS NULL THEN format('invalid arrival_time %%L', c.raw_arrival)
+                   WHEN c.arrival_time <= c.departure_time THEN 'arrival_time is not after departure_time'
+                   WHEN c.aircraft_id IS NULL THEN format('unknown aircraft %%s', c.raw_aircraft)
+                   WHEN c.fare IS NULL OR c.fare < 0 OR c.fare >= 1e8 THEN format('invalid fare %%L', c.raw_fare)
+                   WHEN c.item > min(c.item) OVER (PARTITION BY c.flight_number, c.departure_time)
+                       THEN format('duplicate of item %%s',
+                                   min(c.item) OVER (PARTITION BY c.flight_number, c.departure_time))
+               END AS error
+        FROM resolved c
+    ), new_flights AS (
+        INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id,
+                             departure_time, arrival_time, aircraft_id, fare)
+        SELECT flight_number, origin_id, destination_id, departure_time, arrival_time, aircraft_id, fare
+        FROM checked WHERE error IS NULL ORDER BY item
+        ON CONFLICT (flight_number, departure_time) DO NOTHING
+        RETURNING flight_id, flight_number, origin_airport_id, destination_airport_id,
+                  departure_time, arrival_time, fare, aircraft_id
+    ), inventory AS (
+        INSERT INTO flight_inventory (flight_id, seat_bitmap)
+        SELECT nf.flight_id, decode(repeat('00', (a.seat_capacity + 7) / 8), 'hex')
+        FROM new_flights nf
+        JOIN aircrafts a ON a.aircraft_id = nf.aircraft_id
+    )
+    SELECT c.item, nf.flight_id, nf.flight_number, nf.origin_airport_id, nf.destination_airport_id,
+           nf.departure_time, nf.arrival_time, nf.fare,
+           COALESCE(c.error, CASE WHEN nf.flight_id IS NULL THEN 'flight already exists' END)
+    FROM checked c
+    LEFT JOIN new_flights nf ON c.error IS NULL
+                            AND nf.flight_number = c.flight_number AND nf.departure_time = c.departure_time
+    ORDER BY c.item
+"""
+_ADD_FLIGHTS_BULK_TEMPLATE = "(%s, %s::text, %s::int, %s::int, %s::text, %s::text, %s::int, %s::text)"
+
+
+def add_flights_bulk(flights, page_size=1000):
+    """Add many flights in one transaction, ``page_size`` flights per statement.
+
+    ``flights`` is an iterable of add_flight's arguments. Returns one
+    ``(flight_id, error)`` per flight in input order: a rejected flight
+    has no flight_id and an error message, and does not stop the others.
+    """
+    items = [(item, *flight) for item, flight in enumerate(flights)]
+    if not items:
+        return []
+    with airline_connection() as conn, conn.cursor() as cur:
+        rows = execute_values(cur, _ADD_FLIGHTS_BULK_SQL, items, template=_ADD_FLIGHTS_BULK_TEMPLATE,
+                              page_size=page_size, fetch=True)
+        conn.commit()
+    reference_cache.invalidate("flight_metadata")
+    for _, *leg, error in rows:
+        if error is None:
+            flight_graph.add_flight(tuple(leg))
+    return [(flight_id, error) for _, flight_id, *_, error in rows]
+
+def delete_flight_by_number(flight_number):
+    """Delete flight by flight number"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_number = %s RETURNING flight_id", (flight_number,))
+        deleted = [flight_id for (flight_id,) in cur.fetchall()]
+        conn.commit()
+    reference_cache.invalidate("flight_metadata")
+    for flight_id in deleted:
+        flight_graph.remove_flight(flight_id)
+    return len(deleted)
+
+def reconcile_flight_inventory():
+    """Rebuild flight_inventory counters from tickets. Returns (flights_checked, flights_corrected)"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        result = rebuild_inventory(cur)
+        conn.commit()
+    return result
+
+FLIGHTS_SELECT = """
+    SELECT f.flight_id, f.flight_number,
+           o.name AS origin, d.name AS destination,
+           f.departure_time, f.arrival_time,
+           a.model AS aircraft,
+           a.seat_capacity,
+           COALESCE(fi.booked_seats, 0) AS booked_seats,
+           f.fare
+    FROM flights f
+    LEFT JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+    LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+    LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+    LEFT JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+"""
+
+
+def _flight_filters(flight_number=None):
+    clauses, params = [], []
+    if flight_number:
+        clauses.append("f.flight_number = %s")
+        params.append(flight_number)
+    return clauses, params
+
+
+def _load_flight_metadata():
+    with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.flight_id, f.flight_number,
+                   f.origin_airport_id, o.code AS origin_code, o.name AS origin,
+                   f.destination_airport_id, d.code AS destination_code, d.name AS destination,
+                   f.departure_time, f.arrival_time,
+                   f.aircraft_id, a.model AS aircraft, a.seat_capacity,
+                   f.fare
+            FROM flights f
+            LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+            LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+            LEFT JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+            ORDER BY f.flight_id
+        """)
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def get_flight_metadata():
+    """Get schedule data for all flights without seat counts - cached process-wide"""
+    return reference_cache.get_or_load("flight_metadata", _load_flight_metadata)
+
+def view_flights():
+    """Get all flights with capacity info from flight_inventory - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(FLIGHTS_SELECT + " ORDER BY f.flight_id")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def view_flights_page(after_id=None, limit=50, **filters):
+    """One page of flights ordered by flight_id. Returns (columns, data, next_after_id)"""
+    clauses, params = _flight_filters(**filters)
+    return _fetch_page(FLIGHTS_SELECT, "f.flight_id", clauses, params, after_id, limit)
+
+# ------------------- Bulk Import -------------------
+# (required, optional) columns per importable table. Other columns in a file are ignored.
+IMPORT_COLUMNS = {
+    "airports": (["code", "name"], ["city", "country"]),
+    "aircrafts": (["model", "manufacturer", "seat_capacity"], ["seats_per_row"]),
+    "flights": (["flight_number", "origin_code", "destination_code", "departure_time",
+                 "arrival_time", "aircraft_model", "fare"], []),
+}
+IMPORT_FORMATS = ("csv", "parquet")
+IMPORT_REJECT_COLUMNS = ["row", "reason", "values"]
+MAX_REPORTED_REJECTS = 1000
+IMPORT_WORK_MEM = "64MB"  # keeps the duplicate-check sort of a large file in memory
+
+# Each checker turns the staged text rows (import_rows) into typed, resolved
+# rows with a NULL error for the good ones (import_checked). Everything is
+# set-based: one statement resolves every code and model in the file.
+# resolved is materialized so each try_*() cast runs once per row, not once
+# per reference in the error CASE.
+_CHECK_AIRPORTS_SQL = """
+    CREATE TEMP TABLE import_checked ON COMMIT DROP AS
+    WITH resolved AS MATERIALIZED (
+        SELECT r.row_number, upper(COALESCE(btrim(r.code), '')) AS code, COALESCE(btrim(r.name), '') AS name,
+               nullif(btrim(r.city), '') AS city, nullif(btrim(r.country), '') AS country,
+               array_to_string(ARRAY[r.code, r.name, r.city, r.country], ',', '') AS raw
+        FROM import_rows r
+    )
+    SELECT c.*,
+           CASE
+               WHEN c.code = '' THEN 'missing code'
+               WHEN c.name = '' THEN 'missing name'
+               WHEN c.row_number > min(c.row_number) OVER (PARTITION BY c.code)
+                   THEN format('duplicate of row %s', min(c.row_number) OVER (PARTITION BY c.code))
+           END AS error
+    FROM resolved c
+"""
+
+_UPSERT_AIRPORTS_SQL = """
+    WITH upserted AS (
+        INSERT INTO airports AS ap (code, name, city, country)
+        SELECT code, name, city, country FROM import_checked WHERE error IS NULL ORDER BY row_number
+        ON CONFLICT (code) DO UPDATE
+        SET name = EXCLUDED.name,
+            city = COALESCE(EXCLUDED.city, ap.city),
+            country = COALESCE(EXCLUDED.country, ap.country)
+        WHERE (ap.name, ap.city, ap.country) IS DISTINCT FROM
+              (EXCLUDED.name, COALESCE(EXCLUDED.city, ap.city), COALESCE(EXCLUDED.country, ap.country))
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+_CHECK_AIRCRAFTS_SQL = """
+    CREATE TEMP TABLE import_checked ON COMMIT DROP AS
+    WITH resolved AS MATERIALIZED (
+        SELECT r.row_number, COALESCE(btrim(r.model), '') AS model,
+               COALESCE(btrim(r.manufacturer), '') AS manufacturer,
+               try_integer(btrim(r.seat_capacity)) AS seat_capacity,
+               CASE WHEN nullif(btrim(r.seats_per_row), '') IS NULL THEN COALESCE(ea.seats_per_row, 6)
+                    ELSE try_integer(btrim(r.seats_per_row)) END AS seats_per_row,
+               ea.aircraft_id AS existing_id,
+               ea.seat_capacity AS existing_capacity, ea.seats_per_row AS existing_per_row,
+               r.seat_capacity AS raw_capacity, r.seats_per_row AS raw_per_row,
+               array_to_string(ARRAY[r.model, r.manufacturer, r.seat_capacity, r.seats_per_row], ',', '')
+                   AS raw
+        FROM import_rows r
+        LEFT JOIN aircrafts ea ON ea.model = btrim(r.model)
+    )
+    SELECT c.*,
+           CASE
+               WHEN c.model = '' THEN 'missing model'
+               WHEN c.manufacturer = '' THEN 'missing manufacturer'
+               WHEN c.seat_capacity IS NULL OR c.seat_capacity <= 0
+                   THEN format('invalid seat_capacity %L', c.raw_capacity)
+               WHEN c.seats_per_row IS NULL OR c.seats_per_row NOT BETWEEN 1 AND 10
+                   THEN format('invalid seats_per_row %L', c.raw_per_row)
+               WHEN c.seat_capacity > c.seats_per_row * 9999 THEN 'more than 9999 seat rows'
+               WHEN c.row_number > min(c.row_number) OVER (PARTITION BY c.model)
+                   THEN format('duplicate of row %s', min(c.row_number) OVER (PARTITION BY c.model))
+           END AS error
+    FROM resolved c
+"""
+
+# Seat maps of existing flights are sized by the aircraft layout, so the
+# layout is frozen once an aircraft has flights. The aircraft rows are locked
+# first so add_flight cannot attach a flight between the check and the upsert.
+_LOCK_AIRCRAFTS_SQL = """
+    SELECT a.aircraft_id FROM aircrafts a
+    JOIN import_checked c ON c.existing_id = a.aircraft_id
+    WHERE c.error IS NULL AND (c.existing_capacity, c.existing_per_row) IS DISTINCT FROM (c.seat_capacity, c.seats_per_row)
+    ORDER BY a.aircraft_id
+    FOR UPDATE OF a
+"""
+
+_RECHECK_AIRCRAFTS_SQL = """
+    UPDATE import_checked c
+    SET error = 'seat layout cannot change on an aircraft with flights'
+    WHERE c.error IS NULL
+      AND (c.existing_capacity, c.existing_per_row) IS DISTINCT FROM (c.seat_capacity, c.seats_per_row)
+      AND EXISTS (SELECT 1 FROM flights f WHERE f.aircraft_id = c.existing_id)
+"""
+
+_UPSERT_AIRCRAFTS_SQL = """
+    WITH upserted AS (
+        INSERT INTO aircrafts AS a (model, manufacturer, seat_capacity, seats_per_row)
+        SELECT model, manufacturer, seat_capacity, seats_per_row FROM import_checked WHERE error IS NULL
+        ORDER BY row_number
+        ON CONFLICT (model) DO UPDATE
+        SET manufacturer = EXCLUDED.manufacturer,
+            seat_capacity = EXCLUDED.seat_capacity,
+            seats_per_row = EXCLUDED.seats_per_row
+        WHERE (a.manufacturer, a.seat_capacity, a.seats_per_row) IS DISTINCT FROM
+              (EXCLUDED.manufacturer, EXCLUDED.seat_capacity, EXCLUDED.seats_per_row)
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+_CHECK_FLIGHTS_SQL = """
+    CREATE TEMP TABLE import_checked ON COMMIT DROP AS
+    WITH resolved AS MATERIALIZED (
+        SELECT r.row_number, COALESCE(btrim(r.flight_number), '') AS flight_number,
+               o.airport_id AS origin_id, d.airport_id AS destination_id,
+               try_timestamp(r.departure_time) AS departure_time,
+               try_timestamp(r.arrival_time) AS arrival_time,
+               a.aircraft_id, round(try_numeric(r.fare), 2) AS fare,
+               ef.flight_id AS existing_id, ef.aircraft_id AS existing_aircraft_id,
+               r.origin_code AS raw_origin, r.destination_code AS raw_destination,
+               r.departure_time AS raw_departure, r.arrival_time AS raw_arrival,
+               r.aircraft_model AS raw_aircraft, r.fare AS raw_fare,
+               array_to_string(ARRAY[r.flight_number, r.origin_code, r.destination_code,
+                                     r.departure_time, r.arrival_time, r.aircraft_model, r.fare], ',', '') AS raw
+        FROM import_rows r
+        LEFT JOIN airports o ON o.code = upper(btrim(r.origin_code))
+        LEFT JOIN airports d ON d.code = upper(btrim(r.destination_code))
+        LEFT JOIN aircrafts a ON a.model = btrim(r.aircraft_model)
+        LEFT JOIN flights ef ON ef.flight_number = btrim(r.flight_number)
+                            AND ef.departure_time = try_timestamp(r.departure_time)
+    )
+    SELECT c.*,
+           CASE
+               WHEN c.flight_number = '' THEN 'missing flight_number'
+               WHEN c.origin_id IS NULL THEN format('unknown origin airport %L', c.raw_origin)
+               WHEN c.destination_id IS NULL THEN format('unknown destination airport %L', c.raw_destination)
+               WHEN c.origin_id = c.destination_id THEN 'origin and destination are the same airport'
+               WHEN c.departure_time IS NULL THEN format('invalid departure_time %L', c.raw_departure)
+               WHEN c.arrival_time IS NULL THEN format('invalid arrival_time %L', c.raw_arrival)
+               WHEN c.arrival_time <= c.departure_time THEN 'arrival_time is not after departure_time'
+               WHEN c.aircraft_id IS NULL THEN format('unknown aircraft model %L', c.raw_aircraft)
+               WHEN c.fare IS NULL OR c.fare < 0 OR c.fare >= 1e8 THEN format('invalid fare %L', c.raw_fare)
+               WHEN c.row_number > min(c.row_number) OVER (PARTITION BY c.flight_number, c.departure_time)
+                   THEN format('duplicate of row %s',
+                               min(c.row_number) OVER (PARTITION BY c.flight_number, c.departure_time))
+           END AS error
+    FROM resolved c
+"""
+
+# A flight's seat bitmap is sized by its aircraft, so switching aircraft is
+# only allowed while nothing is booked. Locking the inventory rows blocks
+# book_flight on those flights until the import commits.
+_LOCK_FLIGHTS_SQL = """
+    SELECT fi.flight_id FROM flight_inventory fi
+    JOIN import_checked c ON c.existing_id = fi.flight_id
+    WHERE c.error IS NULL AND c.aircraft_id <> c.existing_aircraft_id
+    ORDER BY fi.flight_id
+    FOR UPDATE OF fi
+"""
+
+_RECHECK_FLIGHTS_SQL = """
+    UPDATE import_checked c
+    SET error = 'aircraft cannot change on a flight with booked seats'
+    WHERE c.error IS NULL
+      AND c.aircraft_id <> c.existing_aircraft_id
+      AND EXISTS (SELECT 1 FROM tickets t WHERE t.flight_id = c.existing_id AND t.status != 'cancelled')
+"""
+
+_UPSERT_FLIGHTS_SQL = """
+    WITH upserted AS (
+        INSERT INTO flights AS f (flight_number, origin_airport_id, destination_airport_id,
+                                  departure_time, arrival_time, aircraft_id, fare)
+        SELECT flight_number, origin_id, destination_id, departure_time, arrival_time, aircraft_id, fare
+        FROM import_checked WHERE error IS NULL ORDER BY row_number
+        ON CONFLICT (flight_number, departure_time) DO UPDATE
+        SET origin_airport_id = EXCLUDED.origin_airport_id,
+            destination_airport_id = EXCLUDED.destination_airport_id,
+            arrival_time = EXCLUDED.arrival_time,
+            aircraft_id = EXCLUDED.aircraft_id,
+            fare = EXCLUDED.fare
+        WHERE (f.origin_airport_id, f.destination_airport_id, f.arrival_time, f.aircraft_id, f.fare)
+              IS DISTINCT FROM
+              (EXCLUDED.origin_airport_id, EXCLUDED.destination_airport_id, EXCLUDED.arrival_time,
+               EXCLUDED.aircraft_id, EXCLUDED.fare)
+        RETURNING f.flight_id, f.aircraft_id, xmax = 0 AS inserted
+    ), inventory AS (
+        -- Empty seat map for new flights and for flights that switched aircraft
+        INSERT INTO flight_inventory AS fi (flight_id, seat_bitmap)
+        SELECT u.flight_id, decode(repeat('00', (a.seat_capacity + 7) / 8), 'hex')
+        FROM upserted u
+        JOIN aircrafts a ON a.aircraft_id = u.aircraft_id
+        WHERE u.inserted
+           OR EXISTS (SELECT 1 FROM import_checked c
+                      WHERE c.error IS NULL AND c.existing_id = u.flight_id
+                        AND c.existing_aircraft_id <> u.aircraft_id)
+        ON CONFLICT (flight_id) DO UPDATE
+        SET seat_bitmap = EXCLUDED.seat_bitmap, updated_at = NOW()
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+_IMPORT_STEPS = {
+    "airports": (_CHECK_AIRPORTS_SQL, None, None, _UPSERT_AIRPORTS_SQL),
+    "aircrafts": (_CHECK_AIRCRAFTS_SQL, _LOCK_AIRCRAFTS_SQL, _RECHECK_AIRCRAFTS_SQL, _UPSERT_AIRCRAFTS_SQL),
+    "flights": (_CHECK_FLIGHTS_SQL, _LOCK_FLIGHTS_SQL, _RECHECK_FLIGHTS_SQL, _UPSERT_FLIGHTS_SQL),
+}
+
+
+def _import_format(source, fmt):
+    if fmt is None:
+        name = source if isinstance(source, str) else getattr(source, "name", "")
+        fmt = "parquet" if str(name).lower().endswith((".parquet", ".pq")) else "csv"
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}, expected one of {', '.join(IMPORT_FORMATS)}")
+    return fmt
+
+
+def _open_csv(source):
+    """Header columns and a file object positioned on the first data row"""
+    first = source.readline()
+    if isinstance(first, bytes):
+        first = first.decode("utf-8-sig")
+    header = next(csv.reader([first]), None)
+    if not header:
+        raise ValueError("The file is empty")
+    return header, source
+
+
+def _open_parquet(source, batch_size=50_000):
+    """Header columns and a CSV stream of the rows, converted one record batch at a time"""
+    try:
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet import needs pyarrow (pip install pyarrow)") from None
+
+    parquet = pq.ParquetFile(source)
+
+    def chunks():
+        options = pa_csv.WriteOptions(include_header=False)
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, options)
+            yield buffer.getvalue()
+
+    return parquet.schema_arrow.names, IteratorFile(chunks())
+
+
+def bulk_import(table, source, fmt=None, dry_run=False):
+    """Load airports, aircrafts or flights from a CSV or Parquet file.
+
+    ``source`` is a path or a binary file object (e.g. a Streamlit upload);
+    the format is taken from its name unless ``fmt`` is given. Columns are
+    matched by header name (see IMPORT_COLUMNS). The file is streamed with
+    COPY into a temporary staging table, validated and resolved to ids there,
+    and upserted in the same transaction - rows already present (same code,
+    model, or flight number and departure time) are updated. Bad rows are
+    skipped and reported, the rest is committed unless ``dry_run``.
+
+    Returns a dict of row counts and ``rejects``, a (columns, data) report of
+    at most MAX_REPORTED_REJECTS rejected rows.
+    """
+    if table not in IMPORT_COLUMNS:
+        raise ValueError(f"Cannot import {table!r}, expected one of {', '.join(IMPORT_COLUMNS)}")
+    required, optional = IMPORT_COLUMNS[table]
+    check_sql, lock_sql, recheck_sql, upsert_sql = _IMPORT_STEPS[table]
+    fmt = _import_format(source, fmt)
+
+    with ExitStack() as stack:
+        if isinstance(source, str):
+            source = stack.enter_context(open(source, "rb"))
+        header, stream = _open_parquet(source) if fmt == "parquet" else _open_csv(source)
+
+        # Unknown columns are staged under a placeholder name and ignored
+        names = [name.strip().lower() for name in header]
+        missing = [name for name in required if name not in names]
+        if missing:
+            raise ValueError(f"Missing column(s) for {table}: {', '.join(missing)}")
+        staged = [name if name in required + optional and names.index(name) == i else f"ignored_{i}"
+                  for i, name in enumerate(names)]
+        absent = [name for name in optional if name not in staged]
+
+        with airline_connection() as conn, conn.cursor() as cur:
+            cur.execute("SET LOCAL work_mem = %s", (IMPORT_WORK_MEM,))
+            cur.execute(f"""
+                CREATE TEMP TABLE import_rows (
+                    row_number BIGINT GENERATED ALWAYS AS IDENTITY,
+                    {", ".join(f"{name} TEXT" for name in staged + absent)}
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert(f"COPY import_rows ({', '.join(staged)}) FROM STDIN WITH (FORMAT csv)",
+                            stream, size=1 << 16)
+            cur.execute(check_sql)
+            if lock_sql:
+                cur.execute(lock_sql)
+                cur.execute(recheck_sql)
+            cur.execute("SELECT COUNT(*), COUNT(error) FROM import_checked")
+            total, rejected = cur.fetchone()
+            cur.execute("""
+                SELECT row_number, error, raw FROM import_checked
+                WHERE error IS NOT NULL ORDER BY row_number LIMIT %s
+            """, (MAX_REPORTED_REJECTS,))
+            rejects = cur.fetchall()
+            cur.execute(upsert_sql)
+            inserted, updated = cur.fetchone()
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+
+    if not dry_run:
+        reference_cache.invalidate(table, "flight_metadata")
+        if table != "aircrafts":
+            flight_graph.invalidate()
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": total - rejected - inserted - updated,
+        "rejected": rejected,
+        "rejects": (IMPORT_REJECT_COLUMNS, rejects),
+    }
+
+# ------------------- Ticket Deletion -------------------
+# {where} selects the tickets. The payments subquery reads the statement's
+# snapshot, so it still sees the payments the cascade is about to remove.
+DELETE_TICKETS_SQL = """
+    DELETE FROM tickets t WHERE {where}
+    RETURNING t.flight_id, t.status, t.seat_no,
+              (SELECT COALESCE(SUM(p.amount), 0) FROM payments p
+               WHERE p.ticket_id = t.ticket_id AND p.status = 'success'),
+              (SELECT COUNT(*) FROM payments p WHERE p.ticket_id = t.ticket_id AND p.status = 'success'),
+              t.ticket_id, t.passanger_id
+"""
+
+
+def record_deleted_tickets(cur, deleted):
+    """Release the seats and revenue of tickets returned by DELETE_TICKETS_SQL"""
+    record_ticket_changes(cur, [(flight_id, status, None, seat) for flight_id, status, seat, *_ in deleted],
+                          payments=[(flight_id, -paid, -count)
+                                    for flight_id, _, _, paid, count, *_ in deleted if count])
+
+
+def _evict_deleted_tickets(deleted):
+    """Drop the cached views the committed DELETE_TICKETS_SQL rows ``deleted`` changed"""
+    passengers = {row[-1] for row in deleted}
+    view_cache.invalidate(*{("seat_map", row[0]) for row in deleted},
+                          *[(view, passanger_id) for passanger_id in passengers for view in ("tickets", "payments")])
+
+# ------------------- Passenger Management -------------------
+# Deleting the passenger first locks out new bookings; their tickets are
+# deleted explicitly, ahead of the cascade, to release seats and revenue
+DELETE_PASSENGER_SQL = """
+    WITH passanger AS (
+        DELETE FROM passangers WHERE email = %s RETURNING passanger_id
+    ), deleted AS ({delete_tickets})
+    SELECT passanger.passanger_id, deleted.*
+    FROM passanger LEFT JOIN deleted ON TRUE
+""".format(delete_tickets=DELETE_TICKETS_SQL.format(where="t.passanger_id = (SELECT passanger_id FROM passanger)"))
+
+
+def delete_passenger_completely(email):
+    """Delete user from both airline DB and auth DB as one atomic change (see database.TwoPhaseCommit)"""
+    with TwoPhaseCommit() as tpc:
+        rows = tpc.airline_execute(DELETE_PASSENGER_SQL, (email,)).fetchall()
+        if not rows:
+            return False
+        deleted = [row[1:] for row in rows if row[-1] is not None]
+        record_deleted_tickets(tpc.airline, deleted)
+        tpc.prepare_auth("DELETE FROM user_credentials WHERE passanger_id = %(passanger_id)s",
+                         {"passanger_id": rows[0][0]})
+        tpc.commit()
+    _evict_deleted_tickets(deleted)
+    return True
+
+
+PASSENGERS_SELECT = """
+    SELECT passanger_id, full_name, email, phone, nationality
+    FROM passangers
+"""
+
+
+def _passenger_filters(search=None, nationality=None):
+    clauses, params = [], []
+    if search:
+        clauses.append("(full_name ILIKE %s OR email ILIKE %s)")
+        params.extend([f"%{search}%"] * 2)
+    if nationality:
+        clauses.append("nationality = %s")
+        params.append(nationality)
+    return clauses, params
+
+
+def view_passengers():
+    """Get all passengers - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(PASSENGERS_SELECT + " ORDER BY passanger_id")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def view_passengers_page(after_id=None, limit=50, **filters):
+    """One page of passengers ordered by passanger_id. Returns (columns, data, next_after_id)"""
+    clauses, params = _passenger_filters(**filters)
+    return _fetch_page(PASSENGERS_SELECT, "passanger_id", clauses, params, after_id, limit)
+
+def iter_passengers(batch_size=2000, **filters):
+    """Stream all matching passengers as (columns, rows) batches via a server-side cursor"""
+    clauses, params = _passenger_filters(**filters)
+    return stream_query(_where(PASSENGERS_SELECT, clauses) + " ORDER BY passanger_id", params, batch_size,
+                        connection=replica_connection)
+
+# ------------------- Ticket Management -------------------
+def delete_ticket_by_id(ticket_id):
+    """Delete ticket by ticket ID"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(DELETE_TICKETS_SQL.format(where="t.ticket_id = %s"), (ticket_id,))
+        deleted = cur.fetchall()
+        record_deleted_tickets(cur, deleted)
+        rows_affected = len(deleted)
+        conn.commit()
+    _evict_deleted_tickets(deleted)
+    return rows_affected
+
+
+def delete_tickets_bulk(ticket_ids):
+    """Delete many tickets in one statement. Returns {ticket_id: 'deleted' or 'not found'}"""
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(DELETE_TICKETS_SQL.format(where="t.ticket_id = ANY(%s::int[])"), (ticket_ids,))
+        deleted = cur.fetchall()
+        record_deleted_tickets(cur, deleted)
+        conn.commit()
+    _evict_deleted_tickets(deleted)
+    found = {ticket_id for *_, ticket_id, _ in deleted}
+    return {ticket_id: "deleted" if ticket_id in found else "not found" for ticket_id in ticket_ids}
+
+TICKETS_SELECT = """
+    SELECT t.ticket_id, t.passanger_id, p.email, f.flight_number,
+           o.name AS origin, d.name AS destination,
+           f.departure_time, t.seat_no, t.status
+    FROM tickets t
+    JOIN passangers p ON t.passanger_id = p.passanger_id
+    JOIN flights f ON t.flight_id = f.flight_id
+    LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+    LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+"""
+
+
+def _ticket_filters(status=None, email=None, flight_number=None, depart_from=None, depart_to=None):
+    clauses, params = [], []
+    if status:
+        clauses.append("t.status = %s")
+        params.append(status)
+    if email:
+        clauses.append("p.email = %s")
+        params.append(email)
+    if flight_number:
+        clauses.append("f.flight_number = %s")
+        params.append(flight_number)
+    # Dates are inclusive on both ends
+    if depart_from:
+        clauses.append("f.departure_time >= %s::date")
+        params.append(depart_from)
+    if depart_to:
+        clauses.append("f.departure_time < %s::date + 1")
+        params.append(depart_to)
+    return clauses, params
+
+
+def view_all_tickets():
+    """Get all tickets - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(TICKETS_SELECT + " ORDER BY t.ticket_id")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def view_all_tickets_page(after_id=None, limit=50, **filters):
+    """One page of tickets ordered by ticket_id. Returns (columns, data, next_after_id)"""
+    clauses, params = _ticket_filters(**filters)
+    return _fetch_page(TICKETS_SELECT, "t.ticket_id", clauses, params, after_id, limit)
+
+def iter_all_tickets(batch_size=2000, **filters):
+    """Stream all matching tickets as (columns, rows) batches via a server-side cursor"""
+    clauses, params = _ticket_filters(**filters)
+    return stream_query(_where(TICKETS_SELECT, clauses) + " ORDER BY t.ticket_id", params, batch_size,
+                        connection=replica_connection)
+
+def export_all_tickets(file, compress=False, **filters):
+    """Write all matching tickets as CSV (gzipped if ``compress``) to a file or path via COPY.
+
+    Same columns and filters as view_all_tickets_page. Returns the number of rows written.
+    """
+    clauses, params = _ticket_filters(**filters)
+    return copy_query_to(file, _where(TICKETS_SELECT, clauses) + " ORDER BY t.ticket_id", params, compress,
+                         connection=replica_connection)
+
+# ------------------- Seat Holds -------------------
+# Oldest expired holds first; rows a payment or cancellation has locked are
+# skipped rather than waited on, and looked at again next time
+EXPIRE_HOLDS_SQL = """
+    WITH expired AS (
+        SELECT ticket_id FROM tickets
+        WHERE status = 'pending' AND booked_at < NOW() - make_interval(secs => %(ttl_seconds)s)
+        ORDER BY booked_at
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE tickets t
+    SET status = 'cancelled'
+    FROM expired
+    WHERE t.ticket_id = expired.ticket_id
+    RETURNING t.flight_id, t.seat_no
+"""
+
+
+def _hold_ttl_seconds(ttl_minutes):
+    return 60 * (HOLD_CONFIG["ttl_minutes"] if ttl_minutes is None else ttl_minutes)
+
+
+def expire_pending_holds(batch_size=None, ttl_minutes=None):
+    """Cancel up to batch_size pending tickets older than the hold TTL, giving their seats back.
+
+    One transaction per call; see hold_sweeper.py for the loop around it.
+    Returns the number of tickets cancelled.
+    """
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(EXPIRE_HOLDS_SQL, {"ttl_seconds": _hold_ttl_seconds(ttl_minutes),
+                                       "batch_size": batch_size or HOLD_CONFIG["batch_size"]})
+        expired = cur.fetchall()
+        record_ticket_changes(cur, [(flight_id, 'pending', 'cancelled', seat) for flight_id, seat in expired])
+        conn.commit()
+    return len(expired)
+
+
+def hold_backlog(ttl_minutes=None):
+    """(expired holds not cancelled yet, seconds the oldest of them is past its expiry or None)"""
+    ttl_seconds = _hold_ttl_seconds(ttl_minutes)
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(booked_at))::float - %s
+            FROM tickets
+            WHERE status = 'pending' AND booked_at < NOW() - make_interval(secs => %s)
+        """, (ttl_seconds, ttl_seconds))
+        return cur.fetchone()
+
+
+def view_hold_sweepers():
+    """Latest status reported by each hold_sweeper.py process, as (columns, data)"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT worker, started_at, updated_at, expired_total, expired_per_second, backlog,
+                   oldest_expired_seconds
+            FROM hold_sweeper_status
+            ORDER BY updated_at DESC
+        """)
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+# ------------------- Payment Management -------------------
+def delete_payment_by_id(payment_id):
+    """Delete payment by payment ID"""
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM payments p
+            USING tickets t
+            WHERE p.payment_id = %s AND t.ticket_id = p.ticket_id
+            RETURNING t.flight_id, p.amount, p.status, t.passanger_id
+        """, (payment_id,))
+        deleted = cur.fetchall()
+        record_ticket_changes(cur, [], payments=[(flight_id, -amount, -1)
+                                                 for flight_id, amount, status, _ in deleted if status == 'success'])
+        rows_affected = len(deleted)
+        conn.commit()
+    view_cache.invalidate(*{("payments", passanger_id) for *_, passanger_id in deleted})
+    return rows_affected
+
+
+def delete_payments_bulk(payment_ids):
+    """Delete many payments in one statement. Returns {payment_id: 'deleted' or 'not found'}"""
+    payment_ids = list(dict.fromkeys(payment_ids))
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM payments p
+            USING tickets t
+            WHERE p.payment_id = ANY(%s::int[]) AND t.ticket_id = p.ticket_id
+            RETURNING t.flight_id, p.amount, p.status, p.payment_id, t.passanger_id
+        """, (payment_ids,))
+        deleted = cur.fetchall()
+        record_ticket_changes(cur, [], payments=[(flight_id, -amount, -1)
+                                                 for flight_id, amount, status, *_ in deleted if status == 'success'])
+        conn.commit()
+    view_cache.invalidate(*{("payments", passanger_id) for *_, passanger_id in deleted})
+    found = {payment_id for *_, payment_id, _ in deleted}
+    return {payment_id: "deleted" if payment_id in found else "not found" for payment_id in payment_ids}
+
+PAYMENTS_SELECT = """
+    SELECT p.payment_id, p.ticket_id, t.passanger_id,
+           ps.email, p.amount, p.method, p.status, p.payment_time
+    FROM payments p
+    JOIN tickets t ON p.ticket_id = t.ticket_id
+    JOIN passangers ps ON t.passanger_id = ps.passanger_id
+"""
+
+
+def _payment_filters(status=None, method=None, email=None, paid_from=None, paid_to=None):
+    clauses, params = [], []
+    if status:
+        clauses.append("p.status = %s")
+        params.append(status)
+    if method:
+        clauses.append("p.method = %s")
+        params.append(method)
+    if email:
+        clauses.append("ps.email = %s")
+        params.append(email)
+    if paid_from:
+        clauses.append("p.payment_time >= %s::date")
+        params.append(paid_from)
+    if paid_to:
+        clauses.append("p.payment_time < %s::date + 1")
+        params.append(paid_to)
+    return clauses, params
+
+
+def view_all_payments():
+    """Get all payments - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(PAYMENTS_SELECT + " ORDER BY p.payment_id DESC")
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+def view_all_payments_page(after_id=None, limit=50, **filters):
+    """One page of payments, newest first by payment_id. Returns (columns, data, next_after_id)"""
+    clauses, params = _payment_filters(**filters)
+    return _fetch_page(PAYMENTS_SELECT, "p.payment_id", clauses, params, after_id, limit, descending=True)
+
+def iter_all_payments(batch_size=2000, **filters):
+    """Stream all matching payments, newest first, as (columns, rows) batches via a server-side cursor"""
+    clauses, params = _payment_filters(**filters)
+    return stream_query(_where(PAYMENTS_SELECT, clauses) + " ORDER BY p.payment_id DESC", params, batch_size,
+                        connection=replica_connection)
+
+def export_all_payments(file, compress=False, **filters):
+    """Write all matching payments, newest first, as CSV (gzipped if ``compress``) via COPY.
+
+    Same columns and filters as view_all_payments_page. Returns the number of rows written.
+    """
+    clauses, params = _payment_filters(**filters)
+    return copy_query_to(file, _where(PAYMENTS_SELECT, clauses) + " ORDER BY p.payment_id DESC", params, compress,
+                         connection=replica_connection)
+
+# ------------------- Analytics -------------------
+# Aggregates over the per-flight counters in flight_inventory, which
+# record_ticket_changes keeps current on every booking and payment, for the
+# flights departing in a date window - the ticket and payment history is
+# never rescanned. Dates are inclusive; rates are percentages.
+ANALYTICS_FROM = """
+    FROM flights f
+    JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+    JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+    JOIN airports o ON o.airport_id = f.origin_airport_id
+    JOIN airports d ON d.airport_id = f.destination_airport_id
+"""
+
+ANALYTICS_MEASURES = """
+    SUM(a.seat_capacity) AS seats,
+    SUM(fi.booked_seats) AS booked_seats,
+    ROUND(100.0 * SUM(fi.booked_seats) / NULLIF(SUM(a.seat_capacity), 0), 1) AS load_factor,
+    SUM(fi.confirmed_seats) AS confirmed_seats,
+    SUM(fi.cancelled_seats) AS cancelled_seats,
+    ROUND(100.0 * SUM(fi.cancelled_seats) / NULLIF(SUM(fi.booked_seats + fi.cancelled_seats), 0), 1)
+        AS cancellation_rate,
+    SUM(fi.revenue) AS revenue
+"""
+
+
+def _analytics_filters(depart_from=None, depart_to=None, origin=None, destination=None):
+    clauses, params = [], []
+    if depart_from:
+        clauses.append("f.departure_time >= %s::date")
+        params.append(depart_from)
+    if depart_to:
+        clauses.append("f.departure_time < %s::date + 1")
+        params.append(depart_to)
+    if origin:
+        clauses.append("o.code = %s")
+        params.append(origin.strip().upper())
+    if destination:
+        clauses.append("d.code = %s")
+        params.append(destination.strip().upper())
+    return clauses, params
+
+
+def _analytics_query(select_sql, clauses, params, tail=""):
+    """Run an analytics query, cached process-wide for ANALYTICS_CACHE_CONFIG['ttl'] seconds"""
+    sql = _where(select_sql + ANALYTICS_FROM, clauses) + tail
+
+    def load():
+        with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            columns = [desc[0] for desc in cur.description]
+            data = cur.fetchall()
+        return columns, data
+
+    return analytics_cache.get_or_load((sql, tuple(params)), load)
+
+
+def analytics_summary(**filters):
+    """Totals over all flights in the window: one row of seats, load factor, cancellations and revenue"""
+    clauses, params = _analytics_filters(**filters)
+    return _analytics_query(f"SELECT COUNT(*) AS flights, {ANALYTICS_MEASURES}", clauses, params)
+
+
+def flight_load_factors(sort="load_factor", limit=100, **filters):
+    """Per-flight load factor, cancellations and revenue, highest load factor (or earliest) first"""
+    order = {"load_factor": "load_factor DESC NULLS LAST, f.departure_time",
+             "departure": "f.departure_time, f.flight_id"}
+    if sort not in order:
+        raise ValueError(f"Unknown sort {sort!r}, expected one of {', '.join(order)}")
+    clauses, params = _analytics_filters(**filters)
+    return _analytics_query(f"""
+        SELECT f.flight_id, f.flight_number, o.code || ' → ' || d.code AS route, f.departure_time,
+               a.seat_capacity AS seats, fi.booked_seats,
+               ROUND(100.0 * fi.booked_seats / a.seat_capacity, 1) AS load_factor,
+               fi.confirmed_seats, fi.cancelled_seats, fi.revenue
+    """, clauses, params + [limit], f" ORDER BY {order[sort]} LIMIT %s")
+
+
+def daily_revenue(**filters):
+    """Revenue, load factor and cancellation rate per departure day, all routes together"""
+    clauses, params = _analytics_filters(**filters)
+    return _analytics_query(f"""
+        SELECT f.departure_time::date AS day, COUNT(*) AS flights, {ANALYTICS_MEASURES}
+    """, clauses, params, " GROUP BY 1 ORDER BY 1")
+
+
+def route_daily_revenue(limit=500, **filters):
+    """Revenue, load factor and cancellation rate per route and departure day, by day then revenue"""
+    clauses, params = _analytics_filters(**filters)
+    return _analytics_query(f"""
+        SELECT f.departure_time::date AS day, o.code || ' → ' || d.code AS route,
+               COUNT(*) AS flights, {ANALYTICS_MEASURES}
+    """, clauses, params + [limit], " GROUP BY 1, o.code, d.code ORDER BY 1, revenue DESC, 2 LIMIT %s")
+
+
+def route_cancellation_rates(limit=50, **filters):
+    """Routes with the highest share of cancelled tickets in the window"""
+    clauses, params = _analytics_filters(**filters)
+    return _analytics_query(f"""
+        SELECT o.code || ' → ' || d.code AS route, COUNT(*) AS flights,
+               SUM(fi.booked_seats + fi.cancelled_seats) AS tickets,
+               SUM(fi.cancelled_seats) AS cancelled_seats,
+               ROUND(100.0 * SUM(fi.cancelled_seats) / NULLIF(SUM(fi.booked_seats + fi.cancelled_seats), 0), 1)
+                   AS cancellation_rate
+    """, clauses, params + [limit],
+        " GROUP BY o.code, d.code ORDER BY cancellation_rate DESC NULLS LAST, 1 LIMIT %s")
+
+
+# ------------------- Diagnostics -------------------
+def diagnostics_report():
+    """Query latency histograms, slow queries, pool, cache, replica and change feed stats, as a JSON-ready dict"""
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "queries": query_stats.report(),
+        "pools": pool_stats(),
+        "caches": cache_stats(),
+        "flight_graph": flight_graph.stats(),
+        "replica": replica_stats(),
+        "change_feed": change_feed.stats(),
+    }
+
+
+def reset_query_stats():
+    query_stats.reset()
@@ -0,0 +1,342 @@
+"""Headless HTTP/JSON booking API for partners and the mobile app.
+
+Runs next to the Streamlit UI on the same databases and connection pools:
+
+    python api_server.py [--host 127.0.0.1] [--port 8600] [--verbose]
+
+Endpoints (JSON in and out; amounts are numbers, times ISO 8601):
+
+    GET   /health
+    POST  /login                 {"email", "password"} -> {"token", "passanger_id", "expires_at"}
+    GET   /flights               search_flights; query parameters origin, destination, depart_from,
+                                 depart_to (YYYY-MM-DD), min_free_seats, max_fare, sort, limit
+    POST  /tickets               {"flight_id", "seat_no" (optional)} -> book_flight
+    GET   /tickets               view_user_tickets
+    POST  /tickets/<id>/cancel   cancel_ticket
+    POST  /payments              {"ticket_id", "amount", "method"} -> make_payment; retries sending
+                                 the same Idempotency-Key header get the first answer
+    GET   /payments              view_user_payments
+
+/tickets and /payments need "Authorization: Bearer <token>" with a token
+from /login. Tokens are "passanger_id.expiry.signature", HMAC-signed with
+API_CONFIG["token_secret"], so the server keeps no sessions. Errors come
+back as {"error": message} with a matching status code.
+
+Every client connection gets its own thread and is kept alive (HTTP/1.1)
+until it has been idle for ``keep_alive_seconds``; database concurrency is
+bounded by the airline and auth pools. Responses of at least
+``gzip_min_bytes`` are gzipped for clients sending Accept-Encoding: gzip.
+"""
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import user_functions as user
+from authentication import verify_user_login
+from database import PoolTimeout, close_pools
+from db_config import API_CONFIG
+
+log = logging.getLogger("airline.api")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ------------------- Tokens -------------------
+def issue_token(secret, passanger_id, ttl_seconds):
+    """Signed bearer token for a passenger, valid for ``ttl_seconds``; returns (token, expires_at)"""
+    expires = int(time.time()) + ttl_seconds
+    claims = f"{passanger_id}.{expires}"
+    signature = hmac.new(secret, claims.encode(), hashlib.sha256).hexdigest()
+    return f"{claims}.{signature}", expires
+
+
+def token_passenger(secret, token):
+    """passanger_id of a valid, unexpired token, else None"""
+    try:
+        passanger_id, expires, signature = token.split(".")
+        expected = hmac.new(secret, f"{passanger_id}.{expires}".encode(), hashlib.sha256).hexdigest()
+        if hmac.compare_digest(signature.encode(), expected.encode()) and int(expires) > time.time():
+            return int(passanger_id)
+    except ValueError:
+        pass
+    return None
+
+
+def token_secret():
+    """API_CONFIG["token_secret"], else AIRLINE_API_SECRET, else a random key for this process"""
+    secret = API_CONFIG["token_secret"] or os.environ.get("AIRLINE_API_SECRET")
+    if secret:
+        return secret.encode()
+    print("⚠️ No API token secret configured - tokens will not survive a restart")
+    return secrets.token_bytes(32)
+
+
+# ------------------- Request Helpers -------------------
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _records(table):
+    columns, data = table
+    return [dict(zip(columns, row)) for row in data]
+
+
+def _message(text):
+    # The functions' messages are written for the Streamlit UI
+    return text.removeprefix("❌ ").strip()
+
+
+def _field(data, name, kind, required=True):
+    value = data.get(name)
+    if value is None or value == "":
+        if required:
+            raise ApiError(400, f"Missing '{name}'")
+        return None
+    try:
+        return date.fromisoformat(value) if kind is date else kind(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"Invalid '{name}'") from None
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server_version = "AirlineAPI/1.0"
+    timeout = API_CONFIG["keep_alive_seconds"]
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    # (method, path pattern, handler, needs a token)
+    ROUTES = [
+        ("GET", re.compile(r"/health"), "route_health", False),
+        ("POST", re.compile(r"/login"), "route_login", False),
+        ("GET", re.compile(r"/flights"), "route_search", False),
+        ("POST", re.compile(r"/tickets"), "route_book", True),
+        ("GET", re.compile(r"/tickets"), "route_tickets", True),
+        ("POST", re.compile(r"/tickets/(\d+)/cancel"), "route_cancel", True),
+        ("POST", re.compile(r"/payments"), "route_pay", True),
+        ("GET", re.compile(r"/payments"), "route_payments", True),
+    ]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        headers = {}
+        try:
+            body = self._read_body()
+            allowed = []
+            for route_method, pattern, handler, needs_token in self.ROUTES:
+                match = pattern.fullmatch(url.path)
+                if match and route_method == method:
+                    break
+                if match:
+                    allowed.append(route_method)
+            else:
+                if allowed:
+                    headers["Allow"] = ", ".join(allowed)
+                    raise ApiError(405, "Method not allowed")
+                raise ApiError(404, "Not found")
+            if needs_token:
+                self.passanger_id = self._authenticate()
+            status, payload = getattr(self, handler)(body, *match.groups())
+        except ApiError as e:
+            status, payload = e.status, {"error": e.message}
+            if e.status == 401:
+                headers["WWW-Authenticate"] = "Bearer"
+        except PoolTimeout:
+            status, payload = 503, {"error": "Server busy, please retry"}
+            headers["Retry-After"] = "1"
+        except Exception:
+            log.exception("%s %s failed", method, self.path)
+            status, payload = 500, {"error": "Internal server error"}
+        self._send(status, payload, headers)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding"):
+            self.close_connection = True
+            raise ApiError(411, "Content-Length required")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise ApiError(400, "Invalid Content-Length") from None
+        if length > API_CONFIG["max_body_bytes"]:
+            self.close_connection = True  # the unread body would be taken for the next request
+            raise ApiError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON") from None
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    def _authenticate(self):
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        passanger_id = token_passenger(self.server.token_secret, token.strip()) if scheme == "Bearer" else None
+        if passanger_id is None:
+            raise ApiError(401, "Missing or invalid token")
+        return passanger_id
+
+    def _send(self, status, payload, headers):
+        body = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+        gzipped = (len(body) >= API_CONFIG["gzip_min_bytes"]
+                   and "gzip" in self.headers.get("Accept-Encoding", ""))
+        if gzipped:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.info("%s %s", self.address_string(), format % args)
+
+    # ------------------- Routes -------------------
+    def route_health(self, body):
+        return 200, {"status": "ok"}
+
+    def route_login(self, body):
+        ok, passanger_id = verify_user_login(_field(body, "email", str), _field(body, "password", str))
+        if not ok:
+            raise ApiError(401, "Invalid email or password")
+        token, expires = issue_token(self.server.token_secret, passanger_id, API_CONFIG["token_ttl_seconds"])
+        return 200, {"token": token, "passanger_id": passanger_id,
+                     "expires_at": datetime.fromtimestamp(expires, timezone.utc)}
+
+    def route_search(self, body):
+        q = self.query
+        try:
+            table = user.search_flights(
+                origin=q.get("origin"), destination=q.get("destination"),
+                depart_from=_field(q, "depart_from", date, required=False),
+                depart_to=_field(q, "depart_to", date, required=False),
+                min_free_seats=_field(q, "min_free_seats", int, required=False) or 1,
+                max_fare=_field(q, "max_fare", float, required=False),
+                sort=q.get("sort", "departure"),
+                limit=_field(q, "limit", int, required=False) or 50)
+        except ValueError as e:
+            raise ApiError(400, str(e)) from None
+        return 200, {"flights": _records(table)}
+
+    def route_book(self, body):
+        ok, ticket_id, message = user.book_flight(self.passanger_id, _field(body, "flight_id", int),
+                                                  _field(body, "seat_no", str, required=False))
+        if ok:
+            return 201, {"ticket_id": ticket_id, "status": "pending", "message": message}
+        message = _message(message)
+        if message.startswith("Flight not found"):
+            raise ApiError(404, message)
+        if "does not exist on this aircraft" in message:
+            raise ApiError(400, message)
+        if message.startswith("Error:"):
+            raise RuntimeError(message)
+        raise ApiError(409, message)
+
+    def route_tickets(self, body):
+        return 200, {"tickets": _records(user.view_user_tickets(self.passanger_id))}
+
+    def route_cancel(self, body, ticket_id):
+        result = user.cancel_ticket(int(ticket_id), self.passanger_id)
+        if result == 0:
+            raise ApiError(404, "Ticket not found")
+        if result == -1:
+            raise ApiError(409, "Ticket is already cancelled")
+        return 200, {"ticket_id": int(ticket_id), "status": "cancelled"}
+
+    def route_pay(self, body):
+        ticket_id = _field(body, "ticket_id", int)
+        amount = _field(body, "amount", float)
+        method = _field(body, "method", str)
+        if method not in user.PAYMENT_METHODS:
+            raise ApiError(400, f"Unknown payment method, expected one of {', '.join(user.PAYMENT_METHODS)}")
+        idempotency_key = self.headers.get("Idempotency-Key")
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+            raise ApiError(400, "Idempotency-Key must be 1 to 255 characters")
+        ok, message = user.make_payment(ticket_id, amount, method, self.passanger_id, idempotency_key)
+        if ok:
+            return 201, {"ticket_id": ticket_id, "status": "confirmed", "message": message}
+        if message.startswith(("Ticket not found", "This ticket doesn't belong")):
+            raise ApiError(404, "Ticket not found")
+        if message.startswith("Payment amount"):
+            raise ApiError(400, message)
+        if message.startswith("Error:"):
+            raise RuntimeError(message)
+        raise ApiError(409, message)
+
+    def route_payments(self, body):
+        return 200, {"payments": _records(user.view_user_payments(self.passanger_id))}
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, secret):
+        super().__init__(address, ApiHandler)
+        self.token_secret = secret
+
+
+def serve(host, port, secret=None):
+    """Serve the API until interrupted"""
+    server = ApiServer((host, port), secret or token_secret())
+    print(f"✅ Airline API listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_pools()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Airline reservation HTTP/JSON API")
+    parser.add_argument("--host", default=API_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=API_CONFIG["port"])
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    from change_feed import start_change_feed
+    from migrations import bootstrap
+    bootstrap()
+    start_change_feed()  # evicts cached tickets, payments and seat maps changed by other processes
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
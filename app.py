@@ -1,482 +1,1028 @@
-import streamlit as st
-import pandas as pd
-from database import create_auth_database, initialize_single_admin
-from authentication import verify_admin, verify_user_login, register_user_credentials, check_email_exists
-from admin_functions import *
-from user_functions import *
-
-# Initialize databases
-create_auth_database()
-initialize_single_admin()
-
-# ------------------- Streamlit UI -------------------
-st.set_page_config(page_title="Airline Reservation System", layout="wide")
-
-# Initialize session state
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if 'user_type' not in st.session_state:
-    st.session_state.user_type = None
-if 'user_id' not in st.session_state:
-    st.session_state.user_id = None
-if 'user_email' not in st.session_state:
-    st.session_state.user_email = None
-if 'login_view' not in st.session_state:
-    st.session_state.login_view = 'user'
-
-#Login
-if not st.session_state.logged_in:
-    st.title("✈️ Airline Reservation System")
-    st.markdown("---")
-
-    # Toggle between Admin and User login
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("👤 User Login", use_container_width=True,
-                     type="primary" if st.session_state.login_view == 'user' else "secondary"):
-            st.session_state.login_view = 'user'
-            st.rerun()
-    with col2:
-        if st.button("🔐 Admin Login", use_container_width=True,
-                     type="primary" if st.session_state.login_view == 'admin' else "secondary"):
-            st.session_state.login_view = 'admin'
-            st.rerun()
-
-    st.markdown("---")
-
-    # ADMIN LOGIN
-    if st.session_state.login_view == 'admin':
-        st.subheader("🔐 Admin Login")
-
-        with st.form("admin_login_form"):
-            username = st.text_input("Username")
-            password = st.text_input("Password", type="password")
-            submitted = st.form_submit_button("Login as Admin")
-
-            if submitted:
-                if verify_admin(username, password):
-                    st.session_state.logged_in = True
-                    st.session_state.user_type = 'admin'
-                    st.success("✅ Admin login successful!")
-                    st.rerun()
-                else:
-                    st.error("❌ Invalid admin credentials")
-
-    # USER LOGIN/REGISTER
-    else:
-        tabs = st.tabs(["Login", "Register"])
-
-        # USER LOGIN
-        with tabs[0]:
-            st.subheader("👤 User Login")
-            with st.form("user_login_form"):
-                email = st.text_input("Email")
-                password = st.text_input("Password", type="password")
-                submitted = st.form_submit_button("Login")
-
-                if submitted:
-                    success, passanger_id = verify_user_login(email, password)
-                    if success:
-                        st.session_state.logged_in = True
-                        st.session_state.user_type = 'user'
-                        st.session_state.user_id = passanger_id
-                        st.session_state.user_email = email
-                        st.success("✅ Login successful!")
-                        st.rerun()
-                    else:
-                        st.error("❌ Invalid email or password")
-
-        # USER REGISTER
-        with tabs[1]:
-            st.subheader("📝 Register as New User")
-            with st.form("register_form"):
-                full_name = st.text_input("Full Name")
-                email = st.text_input("Email")
-                password = st.text_input("Password", type="password")
-                phone = st.text_input("Phone Number")
-                nationality = st.text_input("Nationality")
-                submitted = st.form_submit_button("Register")
-
-                if submitted and full_name and email and password:
-                    if check_email_exists(email):
-                        st.error("❌ Email already registered!")
-                    else:
-                        try:
-                            passanger_id = add_passenger(full_name, email, phone, nationality)
-                            if register_user_credentials(passanger_id, email, password):
-                                st.success(f"✅ Registered! Your Passenger ID: **{passanger_id}**")
-                                st.info("You can now login with your email and password")
-                            else:
-                                st.error("Registration failed!")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-# =================== LOGGED IN ===================
-else:
-    # Top bar with logout
-    col1, col2, col3 = st.columns([3, 1, 1])
-    with col1:
-        if st.session_state.user_type == 'admin':
-            st.title("✈️ Airline Reservation System - Admin Dashboard")
-        else:
-            st.title(f"✈️ Airline Reservation System - Welcome!")
-            st.caption(f"Passenger ID: {st.session_state.user_id} | Email: {st.session_state.user_email}")
-
-    with col2:
-        if st.button("Refresh"):
-            st.rerun()
-
-    with col3:
-        if st.button("Logout"):
-            st.session_state.logged_in = False
-            st.session_state.user_type = None
-            st.session_state.user_id = None
-            st.session_state.user_email = None
-            st.rerun()
-
-    st.markdown("---")
-
-    # =================== ADMIN DASHBOARD ===================
-    if st.session_state.user_type == 'admin':
-        tabs = st.tabs(["✈️ Aircrafts", "🏢 Airports", "🛫 Flights", "🎫 Tickets", "💳 Payments", "👥 Passengers"])
-
-        # MANAGE AIRCRAFTS
-        with tabs[0]:
-            st.subheader("Manage Aircrafts")
-            col1, col2 = st.columns([2, 1])
-
-            with col1:
-                st.write("#### Add Aircraft")
-                with st.form("add_aircraft_form"):
-                    model = st.text_input("Aircraft Model")
-                    manufacturer = st.text_input("Manufacturer")
-                    seat_capacity = st.number_input("Seat Capacity", min_value=1, value=150)
-                    if st.form_submit_button("➕ Add Aircraft") and model and manufacturer:
-                        try:
-                            add_aircraft(model, manufacturer, seat_capacity)
-                            st.success(f"✅ Aircraft '{model}' added!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            with col2:
-                st.write("#### Delete Aircraft")
-                with st.form("delete_aircraft_form"):
-                    model_del = st.text_input("Aircraft Model")
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_aircraft_by_model(model_del)
-                            if rows > 0:
-                                st.success(f"✅ Deleted {rows} aircraft(s)")
-                                st.rerun()
-                            else:
-                                st.warning("No aircraft found with that model")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            st.write("#### All Aircrafts")
-            columns, data = get_aircrafts()
-            if data:
-                st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
-
-        # MANAGE AIRPORTS
-        with tabs[1]:
-            st.subheader("Manage Airports")
-            col1, col2 = st.columns([2, 1])
-
-            with col1:
-                st.write("#### Add Airport")
-                with st.form("add_airport_form"):
-                    code = st.text_input("Airport Code (e.g., DEL)")
-                    name = st.text_input("Airport Name")
-                    city = st.text_input("City")
-                    country = st.text_input("Country")
-                    if st.form_submit_button("➕ Add Airport") and all([code, name, city, country]):
-                        try:
-                            add_airport(code.upper(), name, city, country)
-                            st.success(f"✅ Airport '{name}' added!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            with col2:
-                st.write("#### Delete Airport")
-                with st.form("delete_airport_form"):
-                    code_del = st.text_input("Airport Code")
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_airport_by_code(code_del.upper())
-                            if rows > 0:
-                                st.success(f"✅ Deleted {rows} airport(s)")
-                                st.rerun()
-                            else:
-                                st.warning("No airport found with that code")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            st.write("#### All Airports")
-            columns, data = get_airports()
-            if data:
-                st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
-
-        # MANAGE FLIGHTS
-        with tabs[2]:
-            st.subheader("Manage Flights")
-            col1, col2 = st.columns([2, 1])
-
-            with col1:
-                st.write("#### Add Flight")
-
-                with st.expander("📍 View Airports"):
-                    cols, data = get_airports()
-                    if data:
-                        st.dataframe(pd.DataFrame(data, columns=cols))
-
-                with st.expander("✈️ View Aircrafts"):
-                    cols, data = get_aircrafts()
-                    if data:
-                        st.dataframe(pd.DataFrame(data, columns=cols))
-
-                with st.form("add_flight_form"):
-                    flight_number = st.text_input("Flight Number (e.g., AI101)")
-                    origin_id = st.number_input("Origin Airport ID", min_value=1)
-                    dest_id = st.number_input("Destination Airport ID", min_value=1)
-                    dep_time = st.text_input("Departure (YYYY-MM-DD HH:MM:SS)")
-                    arr_time = st.text_input("Arrival (YYYY-MM-DD HH:MM:SS)")
-                    aircraft_id = st.number_input("Aircraft ID", min_value=1)
-                    fare = st.number_input("Fare (₹)", min_value=0.0, value=5000.0)
-
-                    if st.form_submit_button("➕ Add Flight") and flight_number:
-                        try:
-                            add_flight(flight_number, origin_id, dest_id, dep_time, arr_time, aircraft_id, fare)
-                            st.success(f"✅ Flight {flight_number} added!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            with col2:
-                st.write("#### Delete Flight")
-                with st.form("delete_flight_form"):
-                    flight_num_del = st.text_input("Flight Number")
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_flight_by_number(flight_num_del)
-                            if rows > 0:
-                                st.success(f"✅ Deleted flight {flight_num_del}")
-                                st.rerun()
-                            else:
-                                st.warning("No flight found with that number")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            st.write("#### All Flights (with Capacity)")
-            columns, data = view_flights()
-            if data:
-                df = pd.DataFrame(data, columns=columns)
-                # Add availability column
-                df['Available Seats'] = df['seat_capacity'] - df['booked_seats']
-                st.dataframe(df, use_container_width=True)
-
-        # MANAGE TICKETS
-        with tabs[3]:
-            st.subheader("Manage All Tickets")
-
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                with st.form("delete_ticket_form"):
-                    ticket_id = st.number_input("Ticket ID", min_value=1)
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_ticket_by_id(ticket_id)
-                            if rows > 0:
-                                st.success(f"✅ Deleted ticket {ticket_id}")
-                                st.rerun()
-                            else:
-                                st.warning("Ticket not found")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            columns, data = view_all_tickets()
-            if data:
-                st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
-            else:
-                st.info("No tickets in the system")
-
-        # MANAGE PAYMENTS
-        with tabs[4]:
-            st.subheader("Manage All Payments")
-
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                with st.form("delete_payment_form"):
-                    payment_id = st.number_input("Payment ID", min_value=1)
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_payment_by_id(payment_id)
-                            if rows > 0:
-                                st.success(f"✅ Deleted payment {payment_id}")
-                                st.rerun()
-                            else:
-                                st.warning("Payment not found")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            columns, data = view_all_payments()
-            if data:
-                st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
-            else:
-                st.info("No payments in the system")
-
-        # MANAGE PASSENGERS
-        with tabs[5]:
-            st.subheader("Manage All Passengers")
-
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                with st.form("delete_passenger_form"):
-                    email_del = st.text_input("Passenger Email")
-                    if st.form_submit_button("🗑️ Delete"):
-                        try:
-                            rows = delete_passenger_completely(email_del)
-                            if rows > 0:
-                                st.success(f"✅ Deleted passenger {email_del}")
-                                st.rerun()
-                            else:
-                                st.warning("Passenger not found")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-
-            columns, data = view_passengers()
-            if data:
-                st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
-            else:
-                st.info("No passengers registered")
-
-    # =================== USER DASHBOARD ===================
-    else:
-        tabs = st.tabs(["🛫 Available Flights", "🎫 Book Ticket", "📋 My Tickets", "💳 Make Payment", "💰 My Payments"])
-
-        # AVAILABLE FLIGHTS
-        with tabs[0]:
-            st.subheader("Available Flights")
-            columns, flights = get_available_flights()
-            if flights:
-                df = pd.DataFrame(flights, columns=columns)
-                # Add availability column
-                df['Available Seats'] = df['seat_capacity'] - df['booked_seats']
-                df['Status'] = df['Available Seats'].apply(
-                    lambda x: '🟢 Available' if x > 10
-                    else '🟡 Limited' if x > 0
-                    else '🔴 Full'
-                )
-                st.dataframe(df, use_container_width=True)
-            else:
-                st.info("No flights available")
-
-        # BOOK TICKET
-        with tabs[1]:
-            st.subheader("Book a Flight")
-
-            st.info("💡 Your booking will be **pending** until payment is completed")
-
-            with st.expander("📋 View Available Flights"):
-                columns, flights = get_available_flights()
-                if flights:
-                    df = pd.DataFrame(flights, columns=columns)
-                    df['Available Seats'] = df['seat_capacity'] - df['booked_seats']
-                    st.dataframe(df)
-
-            with st.form("book_flight_form"):
-                flight_id = st.number_input("Flight ID", min_value=1)
-                seat = st.text_input("Seat Number (e.g., 12A, 5C)")
-                if st.form_submit_button("🎫 Book Flight") and seat:
-                    success, ticket_id, message = book_flight(st.session_state.user_id, flight_id, seat.upper())
-                    if success:
-                        st.success(f"✅ {message}")
-                        st.info(f"Your Ticket ID: **{ticket_id}**")
-                        st.warning("⚠️ Please complete payment to confirm your booking!")
-                        st.rerun()
-                    else:
-                        st.error(message)
-
-        # MY TICKETS
-        with tabs[2]:
-            st.subheader("My Tickets")
-            columns, tickets = view_user_tickets(st.session_state.user_id)
-            if tickets:
-                df = pd.DataFrame(tickets, columns=columns)
-                st.dataframe(df, use_container_width=True)
-
-                st.markdown("---")
-                st.write("#### Cancel Ticket")
-                with st.form("cancel_ticket_form"):
-                    ticket_id = st.number_input("Ticket ID to Cancel", min_value=1)
-                    if st.form_submit_button("❌ Cancel Ticket"):
-                        try:
-                            result = cancel_ticket(ticket_id, st.session_state.user_id)
-
-                            if result > 0:
-                                st.success("✅ Ticket cancelled successfully!")
-                                st.rerun()
-                            elif result == -1:
-                                st.warning("⚠️ This ticket is already cancelled")
-                            else:
-                                st.error("❌ Ticket not found or doesn't belong to you")
-                        except Exception as e:
-                            st.error(f"❌ Error: {e}")
-            else:
-                st.info("You have no tickets yet. Book a flight to get started!")
-
-        # MAKE PAYMENT
-        with tabs[3]:
-            st.subheader("Make Payment")
-
-            st.info("💡 You must pay the exact flight fare to confirm your ticket")
-
-            with st.expander("📋 View My Tickets"):
-                columns, tickets = view_user_tickets(st.session_state.user_id)
-                if tickets:
-                    st.dataframe(pd.DataFrame(tickets, columns=columns))
-
-            with st.form("payment_form"):
-                ticket_id_input = st.number_input("Ticket ID", min_value=1, step=1)
-
-                # Automatically fetch and display fare
-                if ticket_id_input > 0:
-                    fare = get_ticket_fare(ticket_id_input)
-                    if fare:
-                        st.success(f"💰 Required Payment: ₹{fare:.2f}")
-                        # Pre-fill the amount with the correct fare
-                        amount = st.number_input("Amount (₹)",
-                                                 min_value=0.0,
-                                                 value=float(fare),
-                                                 step=0.01,
-                                                 help="Amount must match the flight fare exactly")
-                    else:
-                        st.warning("⚠️ Ticket not found or doesn't belong to you")
-                        amount = st.number_input("Amount (₹)", min_value=0.0, value=0.0, step=0.01)
-                else:
-                    amount = st.number_input("Amount (₹)", min_value=0.0, value=0.0, step=0.01)
-
-                method = st.selectbox("Payment Method",
-                                      ["credit_card", "upi", "debit_card", "netbanking", "cash"])
-
-                if st.form_submit_button("💳 Pay Now"):
-                    if amount <= 0:
-                        st.error("❌ Please enter a valid amount")
-                    else:
-                        success, message = make_payment(ticket_id_input, amount, method, st.session_state.user_id)
-                        if success:
-                            st.success(f"✅ {message}")
-                            st.balloons()
-                            st.rerun()
-                        else:
-                            st.error(f"❌ {message}")
-
-        with tabs[4]:
-            st.subheader("My Payment History")
-            columns, payments = view_user_payments(st.session_state.user_id)
-            if payments:
-                st.dataframe(pd.DataFrame(payments, columns=columns), use_container_width=True)
-            else:
-                st.info("No payment history yet")
+import functools
+import io
+import json
+import uuid
+import streamlit as st
+import pandas as pd
+from migrations import bootstrap
+from authentication import verify_admin, verify_user_login, register_passenger
+from admin_functions import *
+from user_functions import *
+from itinerary import search_itineraries
+from cache import analytics_cache
+import profiling
+from profiling import profile_rerun
+from database import WriteMark, bind_write_mark
+from change_feed import change_feed, start_change_feed
+from db_config import CHANGE_FEED_CONFIG
+
+
+# Initialize databases - once per process, not on every rerun
+@st.cache_resource
+def bootstrap_databases():
+    bootstrap()
+    start_change_feed()
+    return True
+
+
+bootstrap_databases()
+
+# ------------------- Streamlit UI -------------------
+st.set_page_config(page_title="Airline Reservation System", layout="wide")
+
+# Initialize session state
+if 'logged_in' not in st.session_state:
+    st.session_state.logged_in = False
+if 'user_type' not in st.session_state:
+    st.session_state.user_type = None
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = None
+if 'user_email' not in st.session_state:
+    st.session_state.user_email = None
+if 'login_view' not in st.session_state:
+    st.session_state.login_view = 'user'
+
+
+def bind_session_write_mark():
+    """Track this session's writes across reruns, which may run on other threads,
+    so reads routed to the replica always see them (see database.replica_connection)"""
+    bind_write_mark(st.session_state.setdefault('write_mark', WriteMark()))
+
+
+def fragment(func=None, *, run_every=None):
+    """st.fragment that binds the session's write mark and profiles the rerun itself -
+    fragment reruns skip the top and the bottom of the script"""
+    def wrap(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            bind_session_write_mark()
+            with profile_rerun(f"{st.session_state.user_type or 'login'}:{func.__name__}"):
+                return func(*args, **kwargs)
+        return st.fragment(run, run_every=run_every)
+    return wrap(func) if func else wrap
+
+
+# Live fragments rerun this often, fetching again only what the change feed saw change
+LIVE_REFRESH_SECONDS = CHANGE_FEED_CONFIG["live_refresh_seconds"]
+
+
+def fetch_live(key, topics, fetch, *args, **kwargs):
+    """``fetch(*args, **kwargs)``, reused by a live fragment's reruns until the change feed sees a
+    change to one of ``topics`` (see ChangeFeed.version) or the arguments change.
+
+    Every full rerun fetches again. While the feed is down the last result
+    stays until then - the top bar offers Refresh instead of polling.
+    """
+    version = change_feed.version(*topics)
+    call = (args, kwargs)
+    memo = st.session_state.get(f"{key}_live")
+    if (memo is None or memo[0] != st.session_state.full_run or memo[2] != call
+            or (change_feed.connected and memo[1] != version)):
+        memo = (st.session_state.full_run, version, call, fetch(*args, **kwargs))
+        st.session_state[f"{key}_live"] = memo
+    return memo[3]
+
+
+bind_session_write_mark()
+st.session_state.full_run = uuid.uuid4().hex
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_paged_table(key, fetch_page, empty_message, decorate=None, live=(), **filters):
+    """Show one keyset-paginated page of a listing with Previous/Next controls.
+
+    The start cursor of every visited page is kept in session state, so
+    Previous walks back without re-scanning. Changing a filter or the page
+    size starts again from the first page. Paging reruns only this fragment.
+    The page is fetched again when the change feed reports a change to one
+    of the ``live`` topics.
+    """
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages_key, filters_key = f"{key}_pages", f"{key}_filters"
+    if st.session_state.get(filters_key) != (filters, page_size):
+        st.session_state[pages_key] = [None]
+        st.session_state[filters_key] = (filters, page_size)
+    pages = st.session_state[pages_key]
+
+    columns, data, next_after_id = fetch_live(key, live, fetch_page, after_id=pages[-1], limit=page_size, **filters)
+    if data:
+        df = pd.DataFrame(data, columns=columns)
+        if decorate:
+            decorate(df)
+        st.dataframe(df, use_container_width=True)
+    else:
+        st.info(empty_message)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("⬅️ Previous", key=f"{key}_prev", disabled=len(pages) == 1, on_click=pages.pop)
+    with col_page:
+        st.caption(f"Page {len(pages)}")
+    with col_next:
+        st.button("Next ➡️", key=f"{key}_next", disabled=next_after_id is None,
+                  on_click=pages.append, args=(next_after_id,))
+
+
+def render_export(key, export, file_stem, **filters):
+    """Download button for a COPY export of a filtered listing, generated only when clicked"""
+    compress = st.checkbox("gzip", value=True, key=f"{key}_gzip")
+
+    def build():
+        buffer = io.BytesIO()
+        export(buffer, compress=compress, **filters)
+        return buffer
+
+    st.download_button("⬇️ Export CSV", build, key=f"{key}_download",
+                       file_name=f"{file_stem}.csv" + (".gz" if compress else ""),
+                       mime="application/gzip" if compress else "text/csv", on_click="ignore")
+
+
+def parse_ids(text):
+    """IDs from a comma- or space-separated list"""
+    ids = [int(part) for part in text.replace(",", " ").split()]
+    if not ids:
+        raise ValueError("Enter at least one ID")
+    return ids
+
+
+def report_outcomes(noun, outcomes, done):
+    """Summarise the {id: outcome} of a bulk call; reruns the app when every item succeeded"""
+    succeeded = [item_id for item_id, outcome in outcomes.items() if outcome == done]
+    if succeeded:
+        st.success(f"✅ {done.capitalize()} {len(succeeded)} {noun}(s)")
+    failed = {}
+    for item_id, outcome in outcomes.items():
+        if outcome != done:
+            failed.setdefault(outcome, []).append(str(item_id))
+    for outcome, item_ids in failed.items():
+        st.warning(f"⚠️ {outcome.capitalize()}: {', '.join(item_ids)}")
+    if succeeded and not failed:
+        st.rerun()
+
+
+def add_available_seats(df):
+    df['Available Seats'] = df['seat_capacity'] - df['booked_seats']
+
+
+def add_seat_status(df):
+    df['Status'] = df['available_seats'].apply(
+        lambda x: '🟢 Available' if x > 10
+        else '🟡 Limited' if x > 0
+        else '🔴 Full'
+    )
+
+
+def date_range(dates):
+    """(start, end) of a date_input range, with None for a missing end"""
+    return (tuple(dates) + (None, None))[:2]
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_flight_search(key, decorate=None):
+    """Route/date/fare search form and its results; changing a filter reruns only this fragment,
+    and so does a booking or schedule change"""
+    columns, airports = get_airports()
+    codes = [""] + sorted(row[columns.index('code')] for row in airports)
+    today = pd.Timestamp.now().date()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        origin = st.selectbox("From", codes, key=f"{key}_origin")
+        dates = st.date_input("Departure between", (today, today + pd.Timedelta(days=30)),
+                              min_value=today, key=f"{key}_dates")
+    with col2:
+        destination = st.selectbox("To", codes, key=f"{key}_destination")
+        min_seats = st.number_input("Minimum free seats", min_value=1, value=1, key=f"{key}_seats")
+    with col3:
+        max_fare = st.number_input("Max fare (₹, 0 = any)", min_value=0.0, value=0.0, step=500.0,
+                                   key=f"{key}_fare")
+        sort = st.selectbox("Sort by", list(FLIGHT_SORTS), key=f"{key}_sort")
+
+    depart_from, depart_to = date_range(dates)
+    columns, flights = fetch_live(key, ("tickets", "flights"), search_flights, origin or None, destination or None,
+                                  depart_from, depart_to, min_free_seats=min_seats, max_fare=max_fare or None,
+                                  sort=sort)
+    if not flights:
+        st.info("No flights match your search")
+        return
+    df = pd.DataFrame(flights, columns=columns)
+    if decorate:
+        decorate(df)
+    st.dataframe(df, use_container_width=True)
+
+
+AUTO_SEAT = "✨ Best available seat"
+
+
+def render_seat_map(seat_map):
+    """Seat grid of a flight: one row per seat row, aisles left blank"""
+    grid = [["" if cell is None else ("🟥" if cell[1] else "🟩") for cell in row] for row in seat_map.grid()]
+    header, aisle = [], ""
+    for cell in seat_map.grid()[0]:
+        if cell is None:
+            aisle += " "  # blank but unique column name per aisle
+            header.append(aisle)
+        else:
+            header.append(cell[0][-1])
+    st.dataframe(pd.DataFrame(grid, columns=header, index=range(1, seat_map.rows + 1)),
+                 use_container_width=True)
+    st.caption("🟩 free · 🟥 taken")
+
+
+@fragment
+def render_itinerary_search(key):
+    """Direct, one-stop and two-stop itineraries between two airports"""
+    columns, airports = get_airports()
+    codes = sorted(row[columns.index('code')] for row in airports)
+    if len(codes) < 2:
+        st.info("Not enough airports to search")
+        return
+    today = pd.Timestamp.now().date()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        origin = st.selectbox("From", codes, key=f"{key}_origin")
+        dates = st.date_input("First departure between", (today, today + pd.Timedelta(days=7)),
+                              min_value=today, key=f"{key}_dates")
+    with col2:
+        destination = st.selectbox("To", codes, index=1, key=f"{key}_destination")
+        max_stops = st.selectbox("Max stops", [0, 1, 2], index=2, key=f"{key}_stops")
+    with col3:
+        sort = st.selectbox("Sort by", ["time", "fare"], format_func=str.title, key=f"{key}_sort")
+        k = st.number_input("Results", min_value=1, max_value=50, value=10, key=f"{key}_k")
+
+    depart_from, depart_to = date_range(dates)
+    columns, itineraries = search_itineraries(origin, destination, depart_from, depart_to,
+                                              max_stops=max_stops, sort=sort, k=k)
+    if itineraries:
+        st.dataframe(pd.DataFrame(itineraries, columns=columns), use_container_width=True)
+        st.caption("Book each leg by its flight ID in the Book Ticket tab")
+    else:
+        st.info("No itineraries found")
+
+
+
+def render_bulk_import(key):
+    """Upload a CSV or Parquet file of airports, aircrafts or flights"""
+    table = st.selectbox("Import into", list(IMPORT_COLUMNS), index=2, format_func=str.title,
+                         key=f"{key}_table")
+    required, optional = IMPORT_COLUMNS[table]
+    st.caption(f"Columns: {', '.join(required)}"
+               + (f" (optional: {', '.join(optional)})" if optional else "")
+               + ". Existing rows with the same key are updated.")
+    upload = st.file_uploader("CSV or Parquet file", type=["csv", "parquet"], key=f"{key}_file")
+    dry_run = st.checkbox("Validate only (don't save)", key=f"{key}_dry_run")
+
+    if st.button("📥 Import", key=f"{key}_submit", disabled=upload is None):
+        try:
+            result = bulk_import(table, upload, dry_run=dry_run)
+        except Exception as e:
+            st.error(f"Error: {e}")
+            return
+        verb = "would be" if dry_run else "were"
+        st.success(f"✅ {result['rows']} row(s) read: {result['inserted']} {verb} added, "
+                   f"{result['updated']} updated, {result['unchanged']} unchanged")
+        if result['rejected']:
+            columns, rejects = result['rejects']
+            st.warning(f"⚠️ {result['rejected']} row(s) rejected"
+                       + (f" (first {len(rejects)} shown)" if len(rejects) < result['rejected'] else ""))
+            st.dataframe(pd.DataFrame(rejects, columns=columns), use_container_width=True)
+
+
+
+def render_analytics(key):
+    """Load factor, cancellation and revenue rollups for flights departing in a date window"""
+    today = pd.Timestamp.now().date()
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    dates = col1.date_input("Departure between", (today - pd.Timedelta(days=30), today + pd.Timedelta(days=30)),
+                            key=f"{key}_dates")
+    origin = col2.text_input("From", key=f"{key}_origin")
+    destination = col3.text_input("To", key=f"{key}_destination")
+    if col4.button("🔄 Refresh", key=f"{key}_refresh"):
+        analytics_cache.clear()
+
+    filters = dict(origin=origin.strip() or None, destination=destination.strip() or None)
+    filters["depart_from"], filters["depart_to"] = date_range(dates)
+
+    columns, rows = analytics_summary(**filters)
+    summary = dict(zip(columns, rows[0]))
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Flights", f"{summary['flights']:,}")
+    m2.metric("Load factor", f"{summary['load_factor'] or 0}%")
+    m3.metric("Cancellation rate", f"{summary['cancellation_rate'] or 0}%")
+    m4.metric("Revenue", f"₹{summary['revenue'] or 0:,.0f}")
+    if not summary['flights']:
+        st.info("No flights depart in this window")
+        return
+
+    columns, rows = daily_revenue(**filters)
+    daily = pd.DataFrame(rows, columns=columns).set_index('day')
+    st.markdown("**Revenue per departure day**")
+    st.line_chart(daily['revenue'].astype(float))
+
+    st.markdown("**Routes per day**")
+    columns, rows = route_daily_revenue(**filters)
+    st.dataframe(pd.DataFrame(rows, columns=columns), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Flights by load factor**")
+        columns, rows = flight_load_factors(**filters)
+        st.dataframe(pd.DataFrame(rows, columns=columns), use_container_width=True, hide_index=True)
+    with col2:
+        st.markdown("**Routes by cancellation rate**")
+        columns, rows = route_cancellation_rates(**filters)
+        st.dataframe(pd.DataFrame(rows, columns=columns), use_container_width=True, hide_index=True)
+
+
+
+def render_diagnostics(key):
+    """Per-statement query latencies, slow queries, connection pools and caches of this server process"""
+    report = diagnostics_report()
+    queries = report["queries"]
+    statements = pd.DataFrame(queries["statements"])
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Statements tracked", len(statements))
+    m2.metric("Calls", f"{int(statements['calls'].sum()) if len(statements) else 0:,}")
+    m3.metric("Time in database", f"{statements['total_ms'].sum() / 1000 if len(statements) else 0:,.1f}s")
+    m4.metric(f"Slow (≥ {queries['slow_query_ms']} ms)", len(queries["slow_queries"]))
+    st.caption(f"Since {queries['since']}, for this server process (all sessions)")
+
+    col1, col2 = st.columns(2)
+    if col1.button("🧹 Reset query stats", key=f"{key}_reset"):
+        reset_query_stats()
+        st.rerun()
+    col2.download_button("⬇️ Download JSON", json.dumps(report, indent=2, default=str),
+                         file_name="diagnostics.json", mime="application/json", key=f"{key}_download")
+
+    st.markdown("**Statements by total time**")
+    if len(statements):
+        st.dataframe(statements.drop(columns="histogram_ms"), use_container_width=True, hide_index=True)
+    else:
+        st.info("No queries recorded yet")
+
+    st.markdown("**Slow queries** (newest last)")
+    if queries["slow_queries"]:
+        st.dataframe(pd.DataFrame(queries["slow_queries"]), use_container_width=True, hide_index=True)
+    else:
+        st.info("No slow queries")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Connection pools**")
+        st.dataframe(pd.DataFrame(report["pools"].values()), use_container_width=True, hide_index=True)
+        replica = report["replica"]
+        if replica["enabled"]:
+            st.caption(f"Reads on the replica: {replica['replica']:,} | on the primary, replica behind: "
+                       f"{replica['primary_behind']:,}, unavailable: {replica['primary_unavailable']:,} | "
+                       f"replay checks: {replica['replay_checks']:,}")
+    with col2:
+        st.markdown("**Caches**")
+        st.dataframe(pd.DataFrame(report["caches"].values()), use_container_width=True, hide_index=True)
+        feed = report["change_feed"]
+        st.caption(f"Change feed {'listening' if feed['connected'] else '⚠️ not connected'}: "
+                   f"{feed['notifications']:,} notifications, {feed['reconnects']:,} reconnects")
+
+    render_seat_holds()
+    render_profiling(key)
+
+
+def render_seat_holds():
+    """Expired holds waiting to be cancelled and what each running hold_sweeper.py last reported"""
+    st.markdown("**Seat holds**")
+    backlog, oldest = hold_backlog()
+    m1, m2 = st.columns(2)
+    m1.metric("Expired holds not yet cancelled", f"{backlog:,}")
+    m2.metric("Oldest past expiry", f"{oldest:,.0f}s" if oldest is not None else "-")
+    columns, data = view_hold_sweepers()
+    if data:
+        st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True, hide_index=True)
+    else:
+        st.warning("⚠️ No hold sweeper running - start one with `python hold_sweeper.py`")
+
+
+def render_profiling(key):
+    """Rerun profiling toggle, the kept profiles and their flamegraph downloads"""
+    st.markdown("**Rerun profiling**")
+    enabled = st.toggle("Profile every rerun (all sessions)", value=profiling.is_enabled(), key=f"{key}_profile")
+    if enabled != profiling.is_enabled():
+        profiling.set_enabled(enabled)
+
+    profiles = profiling.recent_profiles()
+    if not profiles:
+        st.info("No profiles yet - turn profiling on and use the app")
+        return
+    st.dataframe(pd.DataFrame([profile.summary() for profile in profiles]), use_container_width=True,
+                 hide_index=True)
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("⬇️ Speedscope JSON", lambda: profiling.to_speedscope(profiles),
+                         file_name="reruns.speedscope.json", mime="application/json",
+                         key=f"{key}_speedscope", on_click="ignore")
+    col2.download_button("⬇️ Collapsed stacks", lambda: profiling.to_collapsed(profiles),
+                         file_name="reruns.collapsed.txt", mime="text/plain",
+                         key=f"{key}_collapsed", on_click="ignore")
+    if col3.button("🧹 Clear profiles", key=f"{key}_clear_profiles"):
+        profiling.clear_profiles()
+        st.rerun()
+
+
+def render_login():
+    """Admin login, or user login and registration"""
+    st.title("✈️ Airline Reservation System")
+    st.markdown("---")
+
+    # Toggle between Admin and User login
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("👤 User Login", use_container_width=True,
+                     type="primary" if st.session_state.login_view == 'user' else "secondary"):
+            st.session_state.login_view = 'user'
+            st.rerun()
+    with col2:
+        if st.button("🔐 Admin Login", use_container_width=True,
+                     type="primary" if st.session_state.login_view == 'admin' else "secondary"):
+            st.session_state.login_view = 'admin'
+            st.rerun()
+
+    st.markdown("---")
+
+    # ADMIN LOGIN
+    if st.session_state.login_view == 'admin':
+        st.subheader("🔐 Admin Login")
+
+        with st.form("admin_login_form"):
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+            submitted = st.form_submit_button("Login as Admin")
+
+            if submitted:
+                if verify_admin(username, password):
+                    st.session_state.logged_in = True
+                    st.session_state.user_type = 'admin'
+                    st.success("✅ Admin login successful!")
+                    st.rerun()
+                else:
+                    st.error("❌ Invalid admin credentials")
+
+    # USER LOGIN/REGISTER
+    else:
+        tabs = st.tabs(["Login", "Register"])
+
+        # USER LOGIN
+        with tabs[0]:
+            st.subheader("👤 User Login")
+            with st.form("user_login_form"):
+                email = st.text_input("Email")
+                password = st.text_input("Password", type="password")
+                submitted = st.form_submit_button("Login")
+
+                if submitted:
+                    success, passanger_id = verify_user_login(email, password)
+                    if success:
+                        st.session_state.logged_in = True
+                        st.session_state.user_type = 'user'
+                        st.session_state.user_id = passanger_id
+                        st.session_state.user_email = email
+                        st.success("✅ Login successful!")
+                        st.rerun()
+                    else:
+                        st.error("❌ Invalid email or password")
+
+        # USER REGISTER
+        with tabs[1]:
+            st.subheader("📝 Register as New User")
+            with st.form("register_form"):
+                full_name = st.text_input("Full Name")
+                email = st.text_input("Email")
+                password = st.text_input("Password", type="password")
+                phone = st.text_input("Phone Number")
+                nationality = st.text_input("Nationality")
+                submitted = st.form_submit_button("Register")
+
+                if submitted and full_name and email and password:
+                    try:
+                        passanger_id = register_passenger(full_name, email, phone, nationality, password)
+                        if passanger_id is None:
+                            st.error("❌ Email already registered!")
+                        else:
+                            st.success(f"✅ Registered! Your Passenger ID: **{passanger_id}**")
+                            st.info("You can now login with your email and password")
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+
+
+def render_top_bar():
+    """Title with the live update status (or a Refresh button) and Logout button"""
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        if st.session_state.user_type == 'admin':
+            st.title("✈️ Airline Reservation System - Admin Dashboard")
+        else:
+            st.title(f"✈️ Airline Reservation System - Welcome!")
+            st.caption(f"Passenger ID: {st.session_state.user_id} | Email: {st.session_state.user_email}")
+
+    with col2:
+        # Open views refresh themselves from the change feed; while it is down, by hand
+        if change_feed.connected:
+            st.caption("🟢 Live updates")
+        elif st.button("Refresh"):
+            st.rerun()
+
+    with col3:
+        if st.button("Logout"):
+            st.session_state.logged_in = False
+            st.session_state.user_type = None
+            st.session_state.user_id = None
+            st.session_state.user_email = None
+            st.rerun()
+
+    st.markdown("---")
+
+
+@fragment
+def render_aircraft_forms():
+    """Add and delete aircraft forms; a submit reruns only this fragment unless data changed"""
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.write("#### Add Aircraft")
+        with st.form("add_aircraft_form"):
+            model = st.text_input("Aircraft Model")
+            manufacturer = st.text_input("Manufacturer")
+            seat_capacity = st.number_input("Seat Capacity", min_value=1, value=150)
+            seats_per_row = st.number_input("Seats per Row", min_value=1, max_value=10, value=6)
+            if st.form_submit_button("➕ Add Aircraft") and model and manufacturer:
+                try:
+                    add_aircraft(model, manufacturer, seat_capacity, seats_per_row)
+                    st.success(f"✅ Aircraft '{model}' added!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+    with col2:
+        st.write("#### Delete Aircraft")
+        with st.form("delete_aircraft_form"):
+            model_del = st.text_input("Aircraft Model")
+            if st.form_submit_button("🗑️ Delete"):
+                try:
+                    rows = delete_aircraft_by_model(model_del)
+                    if rows > 0:
+                        st.success(f"✅ Deleted {rows} aircraft(s)")
+                        st.rerun()
+                    else:
+                        st.warning("No aircraft found with that model")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+
+
+def render_admin_aircrafts():
+    st.subheader("Manage Aircrafts")
+    render_aircraft_forms()
+
+    st.write("#### All Aircrafts")
+    columns, data = get_aircrafts()
+    if data:
+        st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
+
+
+@fragment
+def render_airport_forms():
+    """Add and delete airport forms; a submit reruns only this fragment unless data changed"""
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.write("#### Add Airport")
+        with st.form("add_airport_form"):
+            code = st.text_input("Airport Code (e.g., DEL)")
+            name = st.text_input("Airport Name")
+            city = st.text_input("City")
+            country = st.text_input("Country")
+            if st.form_submit_button("➕ Add Airport") and all([code, name, city, country]):
+                try:
+                    add_airport(code.upper(), name, city, country)
+                    st.success(f"✅ Airport '{name}' added!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+    with col2:
+        st.write("#### Delete Airport")
+        with st.form("delete_airport_form"):
+            code_del = st.text_input("Airport Code")
+            if st.form_submit_button("🗑️ Delete"):
+                try:
+                    rows = delete_airport_by_code(code_del.upper())
+                    if rows > 0:
+                        st.success(f"✅ Deleted {rows} airport(s)")
+                        st.rerun()
+                    else:
+                        st.warning("No airport found with that code")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+
+
+def render_admin_airports():
+    st.subheader("Manage Airports")
+    render_airport_forms()
+
+    st.write("#### All Airports")
+    columns, data = get_airports()
+    if data:
+        st.dataframe(pd.DataFrame(data, columns=columns), use_container_width=True)
+
+
+@fragment
+def render_flight_forms():
+    """Add and delete flight forms; a submit reruns only this fragment unless data changed"""
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        st.write("#### Add Flight")
+
+        with st.expander("📍 View Airports"):
+            cols, data = get_airports()
+            if data:
+                st.dataframe(pd.DataFrame(data, columns=cols))
+
+        with st.expander("✈️ View Aircrafts"):
+            cols, data = get_aircrafts()
+            if data:
+                st.dataframe(pd.DataFrame(data, columns=cols))
+
+        with st.form("add_flight_form"):
+            flight_number = st.text_input("Flight Number (e.g., AI101)")
+            origin_id = st.number_input("Origin Airport ID", min_value=1)
+            dest_id = st.number_input("Destination Airport ID", min_value=1)
+            dep_time = st.text_input("Departure (YYYY-MM-DD HH:MM:SS)")
+            arr_time = st.text_input("Arrival (YYYY-MM-DD HH:MM:SS)")
+            aircraft_id = st.number_input("Aircraft ID", min_value=1)
+            fare = st.number_input("Fare (₹)", min_value=0.0, value=5000.0)
+
+            if st.form_submit_button("➕ Add Flight") and flight_number:
+                try:
+                    add_flight(flight_number, origin_id, dest_id, dep_time, arr_time, aircraft_id, fare)
+                    st.success(f"✅ Flight {flight_number} added!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+    with col2:
+        st.write("#### Delete Flight")
+        with st.form("delete_flight_form"):
+            flight_num_del = st.text_input("Flight Number")
+            if st.form_submit_button("🗑️ Delete"):
+                try:
+                    rows = delete_flight_by_number(flight_num_del)
+                    if rows > 0:
+                        st.success(f"✅ Deleted flight {flight_num_del}")
+                        st.rerun()
+                    else:
+                        st.warning("No flight found with that number")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+
+
+def render_admin_flights():
+    st.subheader("Manage Flights")
+    render_flight_forms()
+
+    with st.expander("📥 Bulk Import"):
+        render_bulk_import("flights_import")
+
+    st.write("#### All Flights (with Capacity)")
+    if st.button("🔄 Reconcile Seat Counts"):
+        checked, corrected = reconcile_flight_inventory()
+        st.success(f"✅ Checked {checked} flight(s), corrected {corrected}")
+    flight_filter = st.text_input("Filter by Flight Number", key="flights_filter_number")
+    render_paged_table("admin_flights", view_flights_page, "No flights found",
+                       decorate=add_available_seats, live=("flights", "tickets"),
+                       flight_number=flight_filter.strip() or None)
+
+
+@fragment
+def render_delete_ticket_form():
+    """Delete or cancel tickets by ID in one batch; a submit reruns only this fragment unless data changed"""
+    with st.form("delete_ticket_form"):
+        ids = st.text_input("Ticket IDs", placeholder="e.g. 12, 15, 40")
+        action = st.radio("Action", ["Delete", "Cancel"], horizontal=True)
+        if st.form_submit_button("🗑️ Apply"):
+            try:
+                ticket_ids = parse_ids(ids)
+                if action == "Delete":
+                    report_outcomes("ticket", delete_tickets_bulk(ticket_ids), "deleted")
+                else:
+                    report_outcomes("ticket", cancel_tickets_bulk(ticket_ids), "cancelled")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+
+def render_admin_tickets():
+    st.subheader("Manage All Tickets")
+
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        render_delete_ticket_form()
+
+    with col1:
+        f1, f2, f3, f4 = st.columns(4)
+        ticket_status = f1.selectbox("Status", ["All", "pending", "confirmed", "cancelled"],
+                                     key="tickets_filter_status")
+        ticket_email = f2.text_input("Passenger Email", key="tickets_filter_email")
+        ticket_flight = f3.text_input("Flight Number", key="tickets_filter_flight")
+        ticket_dates = f4.date_input("Departure between", (), key="tickets_filter_dates")
+
+    ticket_filters = dict(status=None if ticket_status == "All" else ticket_status,
+                          email=ticket_email.strip() or None,
+                          flight_number=ticket_flight.strip() or None)
+    ticket_filters["depart_from"], ticket_filters["depart_to"] = date_range(ticket_dates)
+    render_paged_table("admin_tickets", view_all_tickets_page, "No tickets in the system",
+                       live=("tickets",), **ticket_filters)
+    render_export("tickets_export", export_all_tickets, "tickets", **ticket_filters)
+
+
+@fragment
+def render_delete_payment_form():
+    """Delete payments by ID in one batch; a submit reruns only this fragment unless data changed"""
+    with st.form("delete_payment_form"):
+        ids = st.text_input("Payment IDs", placeholder="e.g. 7, 9")
+        if st.form_submit_button("🗑️ Delete"):
+            try:
+                report_outcomes("payment", delete_payments_bulk(parse_ids(ids)), "deleted")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+
+def render_admin_payments():
+    st.subheader("Manage All Payments")
+
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        render_delete_payment_form()
+
+    with col1:
+        f1, f2, f3 = st.columns(3)
+        payment_method = f1.selectbox("Method", ["All", *PAYMENT_METHODS], key="payments_filter_method")
+        payment_email = f2.text_input("Passenger Email", key="payments_filter_email")
+        payment_dates = f3.date_input("Paid between", (), key="payments_filter_dates")
+
+    payment_filters = dict(method=None if payment_method == "All" else payment_method,
+                           email=payment_email.strip() or None)
+    payment_filters["paid_from"], payment_filters["paid_to"] = date_range(payment_dates)
+    render_paged_table("admin_payments", view_all_payments_page, "No payments in the system",
+                       live=("payments",), **payment_filters)
+    render_export("payments_export", export_all_payments, "payments", **payment_filters)
+
+
+@fragment
+def render_delete_passenger_form():
+    """Delete passenger form; a submit reruns only this fragment unless data changed"""
+    with st.form("delete_passenger_form"):
+        email_del = st.text_input("Passenger Email")
+        if st.form_submit_button("🗑️ Delete"):
+            try:
+                rows = delete_passenger_completely(email_del)
+                if rows > 0:
+                    st.success(f"✅ Deleted passenger {email_del}")
+                    st.rerun()
+                else:
+                    st.warning("Passenger not found")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+
+def render_admin_passengers():
+    st.subheader("Manage All Passengers")
+
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        render_delete_passenger_form()
+
+    with col1:
+        passenger_search = st.text_input("Search by Name or Email", key="passengers_filter_search")
+
+    render_paged_table("admin_passengers", view_passengers_page, "No passengers registered",
+                       search=passenger_search.strip() or None)
+
+
+def render_admin_analytics():
+    st.subheader("Analytics")
+    render_analytics("admin_analytics")
+
+
+def render_admin_diagnostics():
+    st.subheader("Diagnostics")
+    render_diagnostics("admin_diagnostics")
+
+
+def render_user_flights():
+    st.subheader("Available Flights")
+    render_flight_search("flight_search", decorate=add_seat_status)
+
+    with st.expander("🔀 Connecting Flights"):
+        render_itinerary_search("itinerary_search")
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_booking_form():
+    """Flight picker, seat map and booking form; picking a flight or a booking on it reruns only this fragment"""
+    flight_id = st.number_input("Flight ID", min_value=1, key="book_flight_id")
+    seat_map = fetch_live("book_seat_map", [("flight", flight_id)], get_seat_map, flight_id)
+    if seat_map is None:
+        st.warning("No flight with that ID")
+        return
+
+    with st.expander(f"💺 Seat Map ({seat_map.seat_capacity - seat_map.taken_count()} free)"):
+        render_seat_map(seat_map)
+
+    with st.form("book_flight_form"):
+        seat = st.selectbox("Seat", [AUTO_SEAT] + seat_map.free_seats())
+        if st.form_submit_button("🎫 Book Flight"):
+            success, ticket_id, message = book_flight(st.session_state.user_id, flight_id,
+                                                      None if seat == AUTO_SEAT else seat)
+            if success:
+                st.success(f"✅ {message}")
+                st.info(f"Your Ticket ID: **{ticket_id}**")
+                st.warning("⚠️ Please complete payment to confirm your booking!")
+                st.rerun()
+            else:
+                st.error(message)
+
+
+def render_user_booking():
+    st.subheader("Book a Flight")
+
+    st.info("💡 Your booking will be **pending** until payment is completed")
+
+    with st.expander("📋 Find a Flight"):
+        render_flight_search("book_search")
+
+    render_booking_form()
+
+
+@fragment
+def render_cancel_form():
+    """Cancel ticket form; a submit reruns only this fragment unless data changed"""
+    with st.form("cancel_ticket_form"):
+        ticket_id = st.number_input("Ticket ID to Cancel", min_value=1)
+        if st.form_submit_button("❌ Cancel Ticket"):
+            try:
+                result = cancel_ticket(ticket_id, st.session_state.user_id)
+
+                if result > 0:
+                    st.success("✅ Ticket cancelled successfully!")
+                    st.rerun()
+                elif result == -1:
+                    st.warning("⚠️ This ticket is already cancelled")
+                else:
+                    st.error("❌ Ticket not found or doesn't belong to you")
+            except Exception as e:
+                st.error(f"❌ Error: {e}")
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_ticket_table():
+    """The passenger's tickets; reruns on its own when the change feed reports a change to them"""
+    passanger_id = st.session_state.user_id
+    columns, tickets = fetch_live("my_tickets", [("passenger", passanger_id)], view_user_tickets, passanger_id)
+    if tickets:
+        st.dataframe(pd.DataFrame(tickets, columns=columns), use_container_width=True)
+    else:
+        st.info("You have no tickets yet. Book a flight to get started!")
+
+
+def render_user_tickets():
+    st.subheader("My Tickets")
+    render_ticket_table()
+
+    if view_user_tickets(st.session_state.user_id)[1]:
+        st.markdown("---")
+        st.write("#### Cancel Ticket")
+        render_cancel_form()
+
+
+@fragment
+def render_payment_form(pending):
+    """Pay for one of ``pending`` (ticket dicts with their fare).
+
+    The fare comes from the ticket list the section already loaded, and
+    fragment reruns reuse that list, so picking a ticket costs no queries.
+    """
+    if not pending:
+        st.info("No tickets awaiting payment")
+        return
+    by_id = {ticket['ticket_id']: ticket for ticket in pending}
+    ticket_id = st.selectbox(
+        "Ticket", list(by_id), key="payment_ticket",
+        format_func=lambda t: f"#{t} · {by_id[t]['flight_number']} "
+                              f"({by_id[t]['origin']} → {by_id[t]['destination']})")
+    fare = by_id[ticket_id]['fare']
+    st.success(f"💰 Required Payment: ₹{fare:.2f}")
+
+    with st.form("payment_form"):
+        # Pre-fill the amount with the correct fare
+        amount = st.number_input("Amount (₹)",
+                                 min_value=0.0,
+                                 value=float(fare),
+                                 step=0.01,
+                                 help="Amount must match the flight fare exactly",
+                                 key=f"payment_amount_{ticket_id}")
+        method = st.selectbox("Payment Method", PAYMENT_METHODS)
+
+        if st.form_submit_button("💳 Pay Now"):
+            if amount <= 0:
+                st.error("❌ Please enter a valid amount")
+            else:
+                # One key per ticket and session, so a double click or a rerun
+                # resubmitting the form cannot pay twice
+                idempotency_key = st.session_state.setdefault(f"payment_key_{ticket_id}", uuid.uuid4().hex)
+                success, message = make_payment(ticket_id, amount, method, st.session_state.user_id,
+                                                idempotency_key)
+                if success:
+                    st.success(f"✅ {message}")
+                    st.balloons()
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+
+
+def render_user_payment():
+    st.subheader("Make Payment")
+
+    st.info("💡 You must pay the exact flight fare to confirm your ticket")
+
+    # One fetch serves both the ticket table and the payment form
+    columns, tickets = view_user_tickets(st.session_state.user_id)
+    with st.expander("📋 View My Tickets"):
+        if tickets:
+            st.dataframe(pd.DataFrame(tickets, columns=columns))
+
+    pending = [dict(zip(columns, row)) for row in tickets if row[columns.index('status')] == 'pending']
+    render_payment_form(pending)
+
+
+@fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_payment_history():
+    """The passenger's payments; reruns on its own when the change feed reports a change to them"""
+    passanger_id = st.session_state.user_id
+    columns, payments = fetch_live("my_payments", [("passenger", passanger_id)], view_user_payments, passanger_id)
+    if payments:
+        st.dataframe(pd.DataFrame(payments, columns=columns), use_container_width=True)
+    else:
+        st.info("No payment history yet")
+
+
+def render_user_payments():
+    st.subheader("My Payment History")
+    render_payment_history()
+
+
+def render_sections(key, sections):
+    """Tab-like section picker that renders only the chosen section.
+
+    st.tabs runs every tab body on every rerun, so each interaction used
+    to query the data of all tabs; here the hidden sections cost nothing.
+    """
+    choice = st.segmented_control("Section", list(sections), default=next(iter(sections)),
+                                  required=True, key=key, label_visibility="collapsed")
+    sections[choice]()
+
+
+ADMIN_SECTIONS = {
+    "✈️ Aircrafts": render_admin_aircrafts,
+    "🏢 Airports": render_admin_airports,
+    "🛫 Flights": render_admin_flights,
+    "🎫 Tickets": render_admin_tickets,
+    "💳 Payments": render_admin_payments,
+    "👥 Passengers": render_admin_passengers,
+    "📊 Analytics": render_admin_analytics,
+    "🩺 Diagnostics": render_admin_diagnostics,
+}
+
+USER_SECTIONS = {
+    "🛫 Available Flights": render_user_flights,
+    "🎫 Book Ticket": render_user_booking,
+    "📋 My Tickets": render_user_tickets,
+    "💳 Make Payment": render_user_payment,
+    "💰 My Payments": render_user_payments,
+}
+
+
+def main():
+    if not st.session_state.logged_in:
+        render_login()
+    else:
+        render_top_bar()
+        if st.session_state.user_type == 'admin':
+            render_sections("admin_section", ADMIN_SECTIONS)
+        else:
+            render_sections("user_section", USER_SECTIONS)
+
+
+with profile_rerun(st.session_state.user_type or "login"):
+    main()
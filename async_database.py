@@ -0,0 +1,185 @@
+"""asyncio connection pools for front ends that don't run under Streamlit.
+
+The async counterpart of database.py's pools, built on psycopg 3 and
+psycopg_pool (pip install "psycopg[binary,pool]"), which are only needed
+when this module is imported. psycopg 3 takes the same %s / %(name)s
+placeholders as psycopg2, so async_user_functions.py runs the very SQL
+constants of user_functions.py. Every statement and commit is recorded
+in database.query_stats alongside the sync ones.
+
+    async with airline_connection() as conn, conn.cursor() as cur:
+        await cur.execute(...)
+
+Pools belong to the event loop they were opened on; call close_pools()
+before that loop ends.
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+
+try:
+    import psycopg
+    from psycopg import errors
+    from psycopg.pq import TransactionStatus
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    raise ImportError('async_database needs psycopg 3 (pip install "psycopg[binary,pool]")') from None
+
+from database import query_stats
+from db_config import AIRLINE_DB_CONFIG, AUTH_DB_CONFIG, ASYNC_AIRLINE_POOL_CONFIG, ASYNC_AUTH_POOL_CONFIG
+
+
+class InstrumentedAsyncCursor(psycopg.AsyncCursor):
+    """Async cursor that records every statement's latency and row count in query_stats"""
+
+    async def _timed(self, run, query, params):
+        if not query_stats.enabled:
+            return await run
+        started = time.perf_counter()
+        error = True
+        try:
+            result = await run
+            error = False
+            return result
+        finally:
+            query_stats.record(query, params, (time.perf_counter() - started) * 1000, self.rowcount, error)
+
+    async def execute(self, query, params=None, **kwargs):
+        return await self._timed(super().execute(query, params, **kwargs), query, params)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        return await self._timed(super().executemany(query, params_seq, **kwargs), query, ())
+
+
+class InstrumentedAsyncConnection(psycopg.AsyncConnection):
+    """Async connection whose cursors are InstrumentedAsyncCursors and whose commits are timed too"""
+
+    async def commit(self):
+        if not query_stats.enabled:
+            return await super().commit()
+        started = time.perf_counter()
+        error = True
+        try:
+            result = await super().commit()
+            error = False
+            return result
+        finally:
+            query_stats.record("COMMIT", (), (time.perf_counter() - started) * 1000, 0, error)
+
+
+def _connect_kwargs(db_config):
+    # psycopg2's "database" is libpq's "dbname"
+    kwargs = {("dbname" if key == "database" else key): value for key, value in db_config.items()}
+    return {**kwargs, "cursor_factory": InstrumentedAsyncCursor}
+
+
+_pools = {}
+_pools_lock = None
+
+_POOL_SETTINGS = {
+    "airline": (AIRLINE_DB_CONFIG, ASYNC_AIRLINE_POOL_CONFIG),
+    "auth": (AUTH_DB_CONFIG, ASYNC_AUTH_POOL_CONFIG),
+}
+
+
+def _lock():
+    global _pools_lock
+    if _pools_lock is None:
+        _pools_lock = asyncio.Lock()
+    return _pools_lock
+
+
+async def _open_pool(name, db_config, pool_config):
+    pool = AsyncConnectionPool(kwargs=_connect_kwargs(db_config), connection_class=InstrumentedAsyncConnection,
+                               name=f"async-{name}", open=False, **pool_config)
+    await pool.open()
+    return pool
+
+
+async def get_pool(name):
+    """Return the pool for 'airline' or 'auth', opening it on first use"""
+    pool = _pools.get(name)
+    if pool is None:
+        async with _lock():
+            pool = _pools.get(name)
+            if pool is None:
+                db_config, pool_config = _POOL_SETTINGS[name]
+                pool = _pools[name] = await _open_pool(name, db_config, pool_config)
+    return pool
+
+
+async def configure_pool(name, db_config, **pool_config):
+    """Replace the 'airline' or 'auth' pool, e.g. to point a benchmark at a scratch database"""
+    async with _lock():
+        old = _pools.pop(name, None)
+        if old is not None:
+            await old.close()
+        pool_config = {**_POOL_SETTINGS[name][1], **pool_config}
+        _pools[name] = await _open_pool(name, db_config, pool_config)
+    return _pools[name]
+
+
+@asynccontextmanager
+async def _connection(name, autocommit):
+    # Like database.ConnectionPool: whatever the caller didn't commit is rolled back
+    pool = await get_pool(name)
+    conn = await pool.getconn()
+    try:
+        if conn.autocommit != autocommit:
+            await conn.set_autocommit(autocommit)
+        yield conn
+    finally:
+        if conn.info.transaction_status in (TransactionStatus.INTRANS, TransactionStatus.INERROR):
+            try:
+                await conn.rollback()
+            except psycopg.Error:
+                pass  # putconn() replaces broken connections
+        await pool.putconn(conn)
+
+
+def airline_connection(autocommit=False):
+    """Pooled async connection to the airline database - use as an async context manager.
+
+    autocommit=True suits single-statement reads: they skip the BEGIN and
+    ROLLBACK round trips a transaction would add.
+    """
+    return _connection("airline", autocommit)
+
+
+def auth_connection(autocommit=False):
+    """Pooled async connection to the auth database - use as an async context manager"""
+    return _connection("auth", autocommit)
+
+
+def pool_stats():
+    """psycopg_pool stats for every pool opened in this process, keyed by pool name"""
+    return {name: pool.get_stats() for name, pool in list(_pools.items())}
+
+
+async def close_pools():
+    global _pools_lock
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
+    _pools_lock = None
+
+
+# ------------------- Transaction Retries -------------------
+RETRYABLE_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected)
+
+
+async def run_in_transaction(conn, work, max_attempts=5, base_delay=0.005, max_delay=0.2):
+    """Await ``work(cur)`` in a transaction and commit it - database.run_in_transaction for async connections"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            async with conn.cursor() as cur:
+                result = await work(cur)
+            await conn.commit()
+            return result
+        except RETRYABLE_ERRORS:
+            await conn.rollback()
+            if attempt == max_attempts:
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, delay))
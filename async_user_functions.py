@@ -0,0 +1,143 @@
+"""asyncio versions of the passenger-facing functions, for an API front end.
+
+Same statements, checks, messages and return values as their namesakes in
+user_functions.py (and authentication.verify_user_login), awaited on
+async_database's pools instead of blocking a thread per request. The
+single-statement reads run in autocommit, without a transaction around
+them. Needs psycopg 3 - see async_database.py.
+"""
+from async_database import airline_connection, auth_connection, errors, run_in_transaction
+from authentication import USER_LOGIN_SQL, login_result
+from inventory import ENSURE_INVENTORY_SQL, record_ticket_changes_async
+from seatmap import normalise_seat_label
+from user_functions import (BOOK_SEAT_SQL, CANCEL_TICKET_SQL, LOCK_USER_TICKET_SQL, PAY_TICKET_SQL,
+                            PAYMENT_BY_KEY_SQL, PAYMENT_CONFIRMED, SEAT_CLAIM_ATTEMPTS, SEAT_STATE_SQL,
+                            USER_PAYMENTS_SQL, USER_TICKETS_SQL, booking_message, next_seat_claim,
+                            pay_ticket_params, seat_map_of, unpaid_result)
+
+
+async def _fetch_table(sql, params):
+    async with airline_connection(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(sql, params)
+        columns = [desc[0] for desc in cur.description]
+        data = await cur.fetchall()
+    return columns, data
+
+
+async def get_seat_map(flight_id):
+    """Seat layout and occupancy of a flight as a SeatMap, or None if the flight doesn't exist"""
+    async with airline_connection(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(SEAT_STATE_SQL, (flight_id,))
+        result = await cur.fetchone()
+    return seat_map_of(result)
+
+
+async def book_flight(passanger_id, flight_id, seat_no=None):
+    """Book a flight - status is 'pending' until payment (see user_functions.book_flight)"""
+    requested = normalise_seat_label(seat_no) if seat_no else None
+
+    async with airline_connection() as conn:
+        async def attempt(cur):
+            label = requested
+            for _ in range(SEAT_CLAIM_ATTEMPTS):
+                result = None
+                if label:
+                    await cur.execute(BOOK_SEAT_SQL, {"passanger_id": passanger_id, "flight_id": flight_id,
+                                                      "seat_no": label})
+                    result = await cur.fetchone()
+                if result:
+                    break
+
+                await cur.execute(SEAT_STATE_SQL, (flight_id,))
+                next_label, error = next_seat_claim(await cur.fetchone(), seat_no, label)
+                if error:
+                    return False, None, error
+                if next_label is None:
+                    await cur.execute(ENSURE_INVENTORY_SQL, {"flight_id": flight_id})
+                else:
+                    label = next_label
+            else:
+                return False, None, "❌ Could not reserve a seat right now, please try again"
+
+            ticket_id, seat_capacity, booked_seats = result
+            if ticket_id is None:
+                await conn.rollback()  # give the claimed seat back
+                return False, None, "❌ This seat is already booked for this flight!"
+            return True, ticket_id, booking_message(label, seat_capacity, booked_seats)
+
+        try:
+            return await run_in_transaction(conn, attempt)
+        except Exception as e:
+            await conn.rollback()
+            return False, None, f"❌ Error: {str(e)}"
+
+
+async def cancel_ticket(ticket_id, passanger_id):
+    """1 if cancelled, 0 if not found or not the passenger's, -1 if already cancelled"""
+    async with airline_connection() as conn, conn.cursor() as cur:
+        try:
+            await cur.execute(LOCK_USER_TICKET_SQL, (ticket_id, passanger_id))
+            result = await cur.fetchone()
+            if not result:
+                return 0
+            if result[0] == 'cancelled':
+                return -1
+
+            await cur.execute(CANCEL_TICKET_SQL, (ticket_id, passanger_id))
+            rows_affected = cur.rowcount
+            await record_ticket_changes_async(cur, [(flight_id, result[0], 'cancelled', seat)
+                                                    for flight_id, seat in await cur.fetchall()])
+            await conn.commit()
+            return rows_affected
+
+        except Exception:
+            await conn.rollback()
+            raise
+
+
+async def view_user_tickets(passanger_id):
+    """Get all tickets for a passenger as (columns, data)"""
+    return await _fetch_table(USER_TICKETS_SQL, (passanger_id,))
+
+
+async def make_payment(ticket_id, amount, method, passanger_id, idempotency_key=None):
+    """Make payment and confirm the ticket - MUST PAY EXACT FARE"""
+    async with airline_connection() as conn, conn.cursor() as cur:
+        try:
+            await cur.execute(PAY_TICKET_SQL, pay_ticket_params(ticket_id, amount, method, passanger_id,
+                                                                idempotency_key))
+            ticket = await cur.fetchone()
+            if ticket and ticket[4] is not None:
+                _, _, flight_fare, flight_id, _, _ = ticket
+                await record_ticket_changes_async(cur, [(flight_id, 'pending', 'confirmed')],
+                                                  payments=[(flight_id, flight_fare, 1)])
+                await conn.commit()
+                return True, PAYMENT_CONFIRMED
+            await conn.rollback()
+
+        except errors.UniqueViolation:
+            await conn.rollback()
+            ticket = ('confirmed', passanger_id, amount)
+        except Exception as e:
+            await conn.rollback()
+            return False, f"Error: {str(e)}"
+
+        earlier = None
+        if idempotency_key is not None:
+            await cur.execute(PAYMENT_BY_KEY_SQL, (idempotency_key,))
+            earlier = await cur.fetchone()
+        return unpaid_result(ticket, earlier, amount, ticket_id, passanger_id)
+
+
+async def view_user_payments(passanger_id):
+    """Get all payments for a passenger as (columns, data)"""
+    return await _fetch_table(USER_PAYMENTS_SQL, (passanger_id,))
+
+
+async def verify_user_login(email, password):
+    """(True, passanger_id) for matching credentials, (False, None) otherwise"""
+    async with auth_connection(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(USER_LOGIN_SQL, (email,))
+        result = await cur.fetchone()
+
+    return login_result(result, password)
@@ -1,68 +1,111 @@
-from database import get_auth_connection, get_airline_connection, hash_password
-
-def verify_admin(username, password):
-    conn = get_auth_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT password_hash FROM admin_user WHERE username = %s
-    """, (username,))
-
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    if result:
-        return result[0] == hash_password(password)
-    return False
-
-def register_user_credentials(passanger_id, email, password):
-    conn = get_auth_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            INSERT INTO user_credentials (passanger_id, email, password_hash)
-            VALUES (%s, %s, %s)
-        """, (passanger_id, email, hash_password(password)))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        return False
-
-
-def verify_user_login(email, password):
-    conn = get_auth_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT passanger_id, password_hash 
-        FROM user_credentials 
-        WHERE email = %s
-    """, (email,))
-
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    if result and result[1] == hash_password(password):
-        return True, result[0]  # Return passenger_id
-    return False, None
-
-
-def check_email_exists(email):
-    """Check if email already exists in auth database"""
-    conn = get_auth_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT 1 FROM user_credentials WHERE email = %s", (email,))
-    result = cur.fetchone()
-
-    cur.close()
-    conn.close()
-    return result is not None
+from psycopg2 import errors
+from database import TwoPhaseCommit, auth_connection, hash_password
+
+def verify_admin(username, password):
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT password_hash FROM admin_user WHERE username = %s
+        """, (username,))
+
+        result = cur.fetchone()
+
+    if result:
+        return result[0] == hash_password(password)
+    return False
+
+INSERT_CREDENTIALS_SQL = """
+    INSERT INTO user_credentials (passanger_id, email, password_hash)
+    VALUES (%(passanger_id)s, %(email)s, %(password_hash)s)
+"""
+
+
+def register_user_credentials(passanger_id, email, password):
+    with auth_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute(INSERT_CREDENTIALS_SQL, {"passanger_id": passanger_id, "email": email,
+                                                 "password_hash": hash_password(password)})
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
+
+
+REGISTER_PASSENGER_SQL = """
+    INSERT INTO passangers (full_name, email, phone, nationality)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (email) DO NOTHING
+    RETURNING passanger_id
+"""
+
+
+# Credentials in the way of a new passenger's: same email or same passanger_id
+CONFLICTING_CREDENTIALS_SQL = """
+    SELECT user_cred_id, passanger_id
+    FROM user_credentials
+    WHERE email = %(email)s OR passanger_id = %(passanger_id)s
+"""
+
+
+def register_passenger(full_name, email, phone, nationality, password):
+    """Create a passenger and their login as one atomic change to both databases.
+
+    One round trip per database for the work, one more each to commit (see
+    database.TwoPhaseCommit). Returns the new passanger_id, or None if the
+    email is already registered.
+
+    Credentials left without a passenger (registered before the two
+    databases changed together, or by hand) are replaced in the same
+    transaction rather than blocking the email for good.
+    """
+    with TwoPhaseCommit() as tpc:
+        row = tpc.airline_execute(REGISTER_PASSENGER_SQL, (full_name, email, phone, nationality)).fetchone()
+        if row is None:
+            return None
+        params = {"passanger_id": row[0], "email": email, "password_hash": hash_password(password)}
+        try:
+            tpc.prepare_auth(INSERT_CREDENTIALS_SQL, params)
+        except errors.UniqueViolation:
+            conflicts = tpc.auth_execute(CONFLICTING_CREDENTIALS_SQL, params).fetchall()
+            others = [passanger_id for _, passanger_id in conflicts if passanger_id != row[0]]
+            tpc.airline_execute("SELECT passanger_id FROM passangers WHERE passanger_id = ANY(%s)", (others,))
+            if tpc.airline.fetchone():
+                return None  # the email's login belongs to another passenger
+            try:
+                tpc.prepare_auth("DELETE FROM user_credentials WHERE user_cred_id = ANY(%(orphans)s); "
+                                 + INSERT_CREDENTIALS_SQL, {**params, "orphans": [cred_id for cred_id, _ in conflicts]})
+            except errors.UniqueViolation:
+                return None  # another login for the email showed up meanwhile
+        tpc.commit()
+    return row[0]
+
+
+USER_LOGIN_SQL = """
+    SELECT passanger_id, password_hash
+    FROM user_credentials
+    WHERE email = %s
+"""
+
+
+def login_result(credentials, password):
+    """verify_user_login's answer for the USER_LOGIN_SQL row ``credentials``"""
+    if credentials and credentials[1] == hash_password(password):
+        return True, credentials[0]  # Return passenger_id
+    return False, None
+
+
+def verify_user_login(email, password):
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute(USER_LOGIN_SQL, (email,))
+        result = cur.fetchone()
+
+    return login_result(result, password)
+
+
+def check_email_exists(email):
+    """Check if email already exists in auth database"""
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM user_credentials WHERE email = %s", (email,))
+        result = cur.fetchone()
+
+    return result is not None
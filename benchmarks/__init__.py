@@ -0,0 +1,5 @@
+"""Load, stress and timing scripts for the airline reservation system.
+
+Run modules from the repository root, e.g. ``python -m benchmarks.booking_stress``.
+They talk to the databases configured in db_config.py.
+"""
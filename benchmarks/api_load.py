@@ -0,0 +1,217 @@
+"""Load test of the HTTP/JSON API (api_server.py).
+
+Starts the API in a subprocess against a scratch database, logs in a
+sample of passengers through POST /login, then has --clients threads
+replay a randomised request mix over kept-alive connections (or a new
+connection per request with --no-keep-alive), asking for gzip unless
+--no-gzip:
+
+    search         GET /flights (random sort, half of them from a random origin)
+    tickets        GET /tickets
+    payments       GET /payments
+    book_and_pay   POST /tickets, then POST /payments
+    book_and_cancel  POST /tickets, then POST /tickets/<id>/cancel
+    login          POST /login
+
+Bookings go to throwaway flights (see benchmarks.async_load.setup) that
+are deleted afterwards, together with their tickets and payments.
+Reported are requests/sec over all HTTP requests and latency percentiles
+per endpoint.
+
+    python -m benchmarks.datagen --scale 100k
+    python -m benchmarks.api_load --suffix suite_100k --requests 20000 --clients 32
+"""
+import argparse
+import gzip
+import http.client
+import json
+import random
+import secrets
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+# Share of scenarios of each kind; book_* send two requests each
+MIX = {"search": 0.30, "tickets": 0.25, "payments": 0.15, "book_and_pay": 0.15, "book_and_cancel": 0.10,
+       "login": 0.05}
+SORTS = ["departure", "fare", "duration", "seats"]
+
+
+def serve(args):
+    """--serve: run the API on the scratch databases until interrupted"""
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix), minconn=args.connections, maxconn=args.connections)
+    import api_server
+    api_server.serve("127.0.0.1", 0, secret=secrets.token_bytes(32))
+
+
+def start_server(args):
+    """API subprocess on a free port; returns (process, port)"""
+    process = subprocess.Popen([sys.executable, "-u", "-m", "benchmarks.api_load", "--serve",
+                                "--suffix", args.suffix, "--connections", str(args.connections)],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if "listening on" not in line:
+        process.kill()
+        raise RuntimeError(f"API server did not start: {line.strip()}")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+class Client:
+    """One HTTP connection (or one per request without keep-alive) recording latencies per endpoint"""
+
+    def __init__(self, port, keep_alive, accept_gzip, latencies, errors):
+        self.port = port
+        self.keep_alive = keep_alive
+        self.headers = {"Content-Type": "application/json"}
+        if accept_gzip:
+            self.headers["Accept-Encoding"] = "gzip"
+        self.latencies = latencies
+        self.errors = errors
+        self.conn = None
+
+    def call(self, method, path, body=None, token=None, endpoint=None, expect=(200, 201)):
+        """Decoded JSON response, or None if the request failed"""
+        endpoint = endpoint or f"{method} {path.split('?')[0]}"
+        headers = dict(self.headers, Authorization=f"Bearer {token}") if token else self.headers
+        if not self.keep_alive:
+            headers = dict(headers, Connection="close")
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            if response.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            payload = json.loads(data)
+            if not self.keep_alive or response.will_close:
+                self.conn.close()
+                self.conn = None
+            ok = response.status in expect
+        except (OSError, http.client.HTTPException, ValueError):
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            payload, ok = None, False
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[endpoint] += 1
+        return payload if ok else None
+
+
+def make_scenarios(count, users, origins, flight_ids, seed):
+    """``count`` (kind, user index, argument) scenarios drawn from MIX"""
+    rng = random.Random(seed)
+    scenarios = []
+    for kind in rng.choices(list(MIX), weights=list(MIX.values()), k=count):
+        user = rng.randrange(len(users))
+        if kind == "search":
+            argument = f"/flights?limit=50&sort={rng.choice(SORTS)}"
+            if rng.random() < 0.5:
+                argument += f"&origin={rng.choice(origins)}"
+        elif kind.startswith("book"):
+            argument = rng.choice(flight_ids)
+        else:
+            argument = None
+        scenarios.append((kind, user, argument))
+    return scenarios
+
+
+def run_scenario(client, kind, user, argument, users, tokens):
+    from benchmarks.async_load import FARE
+    from benchmarks.datagen import PASSWORD
+
+    token = tokens[user]
+    if kind == "search":
+        client.call("GET", argument)
+    elif kind == "tickets":
+        client.call("GET", "/tickets", token=token)
+    elif kind == "payments":
+        client.call("GET", "/payments", token=token)
+    elif kind == "login":
+        client.call("POST", "/login", {"email": users[user][1], "password": PASSWORD})
+    else:
+        booked = client.call("POST", "/tickets", {"flight_id": argument}, token)
+        if booked is None:
+            return
+        if kind == "book_and_pay":
+            client.call("POST", "/payments", {"ticket_id": booked["ticket_id"], "amount": FARE, "method": "upi"},
+                        token)
+        else:
+            client.call("POST", f"/tickets/{booked['ticket_id']}/cancel", token=token,
+                        endpoint="POST /tickets/<id>/cancel")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--requests", type=int, default=20000, help="scenarios to run (book_* are two requests)")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--connections", type=int, default=20, help="database connections per server pool")
+    parser.add_argument("--users", type=int, default=500, help="passengers logged in for the run")
+    parser.add_argument("--flights", type=int, default=50, help="throwaway flights taking the bookings")
+    parser.add_argument("--no-keep-alive", dest="keep_alive", action="store_false",
+                        help="open a new connection for every request")
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="don't ask for gzipped responses")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args)
+
+    from benchmarks.async_load import sample_passengers, setup, teardown
+    from benchmarks.datagen import PASSWORD
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix))
+
+    tag = "AP" + uuid.uuid4().hex[:6].upper()
+    bookings = args.requests * (MIX["book_and_pay"] + MIX["book_and_cancel"])
+    fixtures = setup(tag, args.flights, int(2 * bookings / args.flights) + 20)
+    process, port = start_server(args)
+    try:
+        latencies, errors = defaultdict(list), defaultdict(int)
+        warmup = Client(port, True, args.gzip, defaultdict(list), defaultdict(int))
+        users = sample_passengers(args.users, args.seed)
+        tokens = [warmup.call("POST", "/login", {"email": email, "password": PASSWORD})["token"]
+                  for _, email in users]
+        origins = sorted({flight["origin_code"] for flight in warmup.call("GET", "/flights?limit=500")["flights"]})
+        scenarios = make_scenarios(args.requests, users, origins or ["XXX"], fixtures[2], args.seed)
+
+        def work(share):
+            client = Client(port, args.keep_alive, args.gzip, latencies, errors)
+            for scenario in share:
+                run_scenario(client, *scenario, users, tokens)
+
+        threads = [threading.Thread(target=work, args=(scenarios[k::args.clients],)) for k in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        total = sum(len(samples) for samples in latencies.values())
+        print(f"{total:,} requests from {args.clients} clients in {wall:.2f}s: {total / wall:,.0f} req/s "
+              f"(keep-alive {'on' if args.keep_alive else 'off'}, gzip {'on' if args.gzip else 'off'}, "
+              f"{args.connections} DB connections)")
+        print(f"{'endpoint':28} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for endpoint, samples in sorted(latencies.items()):
+            cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+            print(f"{endpoint:28} {len(samples):>9,} {cuts[49]:>8.1f} {cuts[94]:>8.1f} {cuts[98]:>8.1f} "
+                  f"{errors[endpoint]:>7,}")
+        return 1 if any(errors.values()) else 0
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait()
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,263 @@
+"""Load test of the asyncio data-access layer against the blocking one.
+
+The same randomised request mix runs twice against a scratch database:
+once through user_functions on a thread pool (one blocking request per
+thread) and once through async_user_functions as asyncio tasks on one
+thread, with thousands of requests in flight. Both paths get the same
+number of database connections, so the difference is what each can keep
+queued and overlapped per process. A request is one of
+
+    login          authentication.verify_user_login
+    tickets        view_user_tickets
+    payments       view_user_payments
+    seat_map       get_seat_map
+    book_and_pay   book_flight (auto-assigned seat), a simulated payment
+                   gateway call of --gateway-ms, then make_payment
+
+for a random passenger with credentials; bookings go to throwaway flights
+that are deleted afterwards, together with their tickets and payments.
+Reported per path are requests/sec, latency percentiles, failed requests
+and statements per request (from database.query_stats). With a gateway
+delay the sync path is bounded by --threads requests per delay, while
+the async one keeps serving other requests during it.
+
+    python -m benchmarks.datagen --scale 100k
+    python -m benchmarks.async_load --suffix suite_100k --requests 20000 --concurrency 2000
+    python -m benchmarks.async_load --suffix suite_100k --gateway-ms 50
+
+Needs psycopg 3 (pip install "psycopg[binary,pool]").
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Share of requests of each kind
+MIX = {"login": 0.20, "tickets": 0.30, "payments": 0.15, "seat_map": 0.20, "book_and_pay": 0.15}
+FARE = 100
+
+
+def setup(tag, flights, seats):
+    """Throwaway aircraft, route and ``flights`` flights of ``seats`` seats.
+    Returns (aircraft_id, airport_ids, flight_ids)"""
+    from database import airline_connection
+    from inventory import ensure_inventory_row
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO aircrafts (model, manufacturer, seat_capacity, seats_per_row)
+            VALUES (%s, 'Load', %s, 10) RETURNING aircraft_id
+        """, (f"LOAD-{tag}", seats))
+        aircraft_id = cur.fetchone()[0]
+        airport_ids = []
+        for suffix in ("O", "D"):
+            cur.execute("""
+                INSERT INTO airports (code, name, city, country)
+                VALUES (%s, %s, 'Load', 'Load') RETURNING airport_id
+            """, (f"L{tag}{suffix}", f"Load {tag} {suffix}"))
+            airport_ids.append(cur.fetchone()[0])
+        flight_ids = []
+        for k in range(flights):
+            departure = datetime(2099, 3, 1) + timedelta(hours=k)
+            cur.execute("""
+                INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id,
+                                     departure_time, arrival_time, aircraft_id, fare)
+                VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING flight_id
+            """, (f"{tag}L{k}", *airport_ids, departure, departure + timedelta(hours=2), aircraft_id, FARE))
+            flight_ids.append(cur.fetchone()[0])
+            ensure_inventory_row(cur, flight_ids[-1])
+        conn.commit()
+    return aircraft_id, airport_ids, flight_ids
+
+
+def sample_passengers(count, seed):
+    """Up to ``count`` random (passanger_id, email) pairs with login credentials"""
+    from database import auth_connection
+
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (seed / 2 ** 31,))
+        cur.execute("SELECT passanger_id, email FROM user_credentials ORDER BY random() LIMIT %s", (count,))
+        return cur.fetchall()
+
+
+def make_requests(count, passengers, flight_ids, seed):
+    """``count`` (kind, args) requests drawn from MIX"""
+    from benchmarks.datagen import PASSWORD
+
+    rng = random.Random(seed)
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    requests = []
+    for kind in kinds:
+        passanger_id, email = rng.choice(passengers)
+        if kind == "login":
+            args = (email, PASSWORD)
+        elif kind == "seat_map":
+            args = (rng.choice(flight_ids),)
+        elif kind == "book_and_pay":
+            args = (passanger_id, rng.choice(flight_ids))
+        else:
+            args = (passanger_id,)
+        requests.append((kind, args))
+    return requests
+
+
+def sync_request(kind, args, gateway_ms):
+    """Serve one request through the blocking functions; True if it succeeded"""
+    import user_functions as user
+    from authentication import verify_user_login
+
+    if kind == "login":
+        return verify_user_login(*args)[0]
+    if kind == "tickets":
+        return user.view_user_tickets(*args) is not None
+    if kind == "payments":
+        return user.view_user_payments(*args) is not None
+    if kind == "seat_map":
+        return user.get_seat_map(*args) is not None
+    passanger_id, flight_id = args
+    booked, ticket_id, _ = user.book_flight(passanger_id, flight_id)
+    if not booked:
+        return False
+    time.sleep(gateway_ms / 1000)
+    return user.make_payment(ticket_id, FARE, "upi", passanger_id)[0]
+
+
+async def async_request(kind, args, gateway_ms):
+    """Serve one request through async_user_functions; True if it succeeded"""
+    import async_user_functions as user
+
+    if kind == "login":
+        return (await user.verify_user_login(*args))[0]
+    if kind == "tickets":
+        return await user.view_user_tickets(*args) is not None
+    if kind == "payments":
+        return await user.view_user_payments(*args) is not None
+    if kind == "seat_map":
+        return await user.get_seat_map(*args) is not None
+    passanger_id, flight_id = args
+    booked, ticket_id, _ = await user.book_flight(passanger_id, flight_id)
+    if not booked:
+        return False
+    await asyncio.sleep(gateway_ms / 1000)
+    return (await user.make_payment(ticket_id, FARE, "upi", passanger_id))[0]
+
+
+def run_sync(requests, threads, gateway_ms):
+    """(wall seconds, [(latency ms, ok)], peak in flight) serving ``requests`` on ``threads`` threads"""
+    def serve(request):
+        started = time.perf_counter()
+        try:
+            ok = sync_request(*request, gateway_ms)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(serve, requests))
+    return time.perf_counter() - started, results, min(threads, len(requests))
+
+
+async def run_async(requests, concurrency, gateway_ms, airline_config, auth_config, connections):
+    """(wall seconds, [(latency ms, ok)], peak in flight) serving ``requests`` as tasks, ``concurrency`` at a time"""
+    import async_database
+
+    pools = [await async_database.configure_pool(name, config, min_size=connections, max_size=connections)
+             for name, config in (("airline", airline_config), ("auth", auth_config))]
+    for pool in pools:
+        await pool.wait()
+
+    gate = asyncio.Semaphore(concurrency)
+    in_flight = peak = 0
+
+    async def serve(request):
+        nonlocal in_flight, peak
+        async with gate:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            started = time.perf_counter()
+            try:
+                ok = await async_request(*request, gateway_ms)
+            except Exception:
+                ok = False
+            in_flight -= 1
+            return (time.perf_counter() - started) * 1000, ok
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(serve(request) for request in requests))
+        return time.perf_counter() - started, results, peak
+    finally:
+        await async_database.close_pools()
+
+
+def summarise(mode, wall, results, peak, statements):
+    latencies = sorted(ms for ms, _ in results)
+    cuts = statistics.quantiles(latencies, n=100)
+    failed = sum(not ok for _, ok in results)
+    print(f"{mode:6} {peak:>9,} {len(results):>9,} {wall:>7.2f}s {len(results) / wall:>9,.0f} "
+          f"{cuts[49]:>8.1f} {cuts[94]:>8.1f} {cuts[98]:>8.1f} {failed:>7,} {statements / len(results):>10.2f}")
+    return len(results) / wall
+
+
+def teardown(tag, fixtures):
+    from database import airline_connection
+
+    aircraft_id, airport_ids, _ = fixtures
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_number LIKE %s", (tag + "%",))
+        cur.execute("DELETE FROM airports WHERE airport_id = ANY(%s)", (airport_ids,))
+        cur.execute("DELETE FROM aircrafts WHERE aircraft_id = %s", (aircraft_id,))
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per path")
+    parser.add_argument("--concurrency", type=int, default=2000, help="async requests in flight at once")
+    parser.add_argument("--threads", type=int, default=64, help="threads serving the sync path")
+    parser.add_argument("--connections", type=int, default=20, help="database connections per pool, both paths")
+    parser.add_argument("--gateway-ms", type=float, default=0, help="simulated payment gateway delay per booking")
+    parser.add_argument("--flights", type=int, default=50, help="throwaway flights taking the bookings")
+    parser.add_argument("--passengers", type=int, default=5000, help="passengers sampled for the requests")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    airline_config, auth_config = scratch_configs(args.suffix)
+    use_scratch_databases(airline_config, auth_config, minconn=args.connections, maxconn=args.connections)
+    from database import query_stats
+
+    tag = "AL" + uuid.uuid4().hex[:6].upper()
+    bookings = args.requests * MIX["book_and_pay"]
+    # Both paths replay the same bookings; leave the busiest flight twice its share per path
+    seats = int(4 * bookings / args.flights) + 20
+    fixtures = setup(tag, args.flights, seats)
+    try:
+        passengers = sample_passengers(args.passengers, args.seed)
+        requests = make_requests(args.requests, passengers, fixtures[2], args.seed)
+        print(f"{args.requests:,} requests per path, {args.connections} connections per pool, "
+              f"gateway {args.gateway_ms:g} ms, mix {', '.join(f'{kind} {share:.0%}' for kind, share in MIX.items())}")
+        print(f"{'path':6} {'in flight':>9} {'requests':>9} {'wall':>8} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7} {'stmts/req':>10}")
+
+        query_stats.reset()
+        sync_rate = summarise("sync", *run_sync(requests, args.threads, args.gateway_ms),
+                              sum(entry["calls"] for entry in query_stats.snapshot()))
+        query_stats.reset()
+        async_rate = summarise("async", *asyncio.run(run_async(requests, args.concurrency, args.gateway_ms,
+                                                               airline_config, auth_config, args.connections)),
+                               sum(entry["calls"] for entry in query_stats.snapshot()))
+        print(f"async/sync throughput: {async_rate / sync_rate:.2f}x")
+        return 0
+    finally:
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,198 @@
+"""Multi-process stress test for book_flight.
+
+Creates a throwaway aircraft, route and flight, then has many concurrent
+bookers (processes x threads) hammer that one flight with random seat
+requests and auto-assigned seats. Afterwards it checks that the flight
+was never oversold, that no seat was sold twice and that flight_inventory
+(counters and seat bitmap) agrees with tickets, and reports bookings/sec.
+
+    python -m benchmarks.booking_stress --processes 8 --threads 25 --capacity 150
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+def setup(capacity, passengers):
+    from database import airline_connection
+
+    tag = uuid.uuid4().hex[:8].upper()
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO aircrafts (model, manufacturer, seat_capacity)
+            VALUES (%s, 'Stress', %s) RETURNING aircraft_id
+        """, (f"STRESS-{tag}", capacity))
+        aircraft_id = cur.fetchone()[0]
+        airport_ids = []
+        for suffix in ("O", "D"):
+            cur.execute("""
+                INSERT INTO airports (code, name, city, country)
+                VALUES (%s, %s, 'Stress', 'Stress') RETURNING airport_id
+            """, (f"S{tag}{suffix}", f"Stress {tag} {suffix}"))
+            airport_ids.append(cur.fetchone()[0])
+        cur.execute("""
+            WITH new_flight AS (
+                INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id,
+                                     departure_time, arrival_time, aircraft_id, fare)
+                VALUES (%s, %s, %s, NOW() + INTERVAL '30 days', NOW() + INTERVAL '30 days 2 hours', %s, 100)
+                RETURNING flight_id
+            )
+            INSERT INTO flight_inventory (flight_id) SELECT flight_id FROM new_flight
+            RETURNING flight_id
+        """, (f"ST{tag}", airport_ids[0], airport_ids[1], aircraft_id))
+        flight_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO passangers (full_name, email, phone, nationality)
+            SELECT 'Stress ' || n, 'stress-' || %s || '-' || n || '@example.com', '0', 'XX'
+            FROM generate_series(1, %s) AS n
+            RETURNING passanger_id
+        """, (tag.lower(), passengers))
+        passanger_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    return tag, aircraft_id, airport_ids, flight_id, passanger_ids
+
+
+def teardown(tag, aircraft_id, airport_ids, flight_id, passanger_ids):
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_id = %s", (flight_id,))
+        cur.execute("DELETE FROM passangers WHERE passanger_id = ANY(%s)", (passanger_ids,))
+        cur.execute("DELETE FROM airports WHERE airport_id = ANY(%s)", (airport_ids,))
+        cur.execute("DELETE FROM aircrafts WHERE aircraft_id = %s", (aircraft_id,))
+        conn.commit()
+
+
+def seat_label(n):
+    return f"{n // 6 + 1}{'ABCDEF'[n % 6]}"
+
+
+def worker(flight_id, passanger_ids, seat_space, auto_share, attempts, threads, start_event, results):
+    from user_functions import book_flight
+
+    counts = Counter()
+    lock = threading.Lock()
+
+    def booker(seed):
+        rng = random.Random(seed)
+        local = Counter()
+        for _ in range(attempts):
+            seat = None if rng.random() < auto_share else seat_label(rng.randrange(seat_space))
+            ok, _, message = book_flight(rng.choice(passanger_ids), flight_id, seat)
+            if ok:
+                local["booked" if seat else "booked_auto"] += 1
+            elif "full" in message:
+                local["full"] += 1
+            elif "already booked" in message:
+                local["seat_taken"] += 1
+            elif "does not exist" in message:
+                local["no_such_seat"] += 1
+            else:
+                local["error"] += 1
+                local["error: " + message[:80]] += 1
+        with lock:
+            counts.update(local)
+
+    start_event.wait()
+    pool = [threading.Thread(target=booker, args=(random.random(),)) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put(dict(counts))
+
+
+def verify(flight_id):
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.seat_capacity,
+                   (SELECT COUNT(*) FROM tickets t WHERE t.flight_id = f.flight_id AND t.status != 'cancelled'),
+                   (SELECT COUNT(*) - COUNT(DISTINCT seat_no) FROM tickets t WHERE t.flight_id = f.flight_id),
+                   fi.booked_seats,
+                   bit_count(fi.seat_bitmap)
+            FROM flights f
+            JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+            JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+            WHERE f.flight_id = %s
+        """, (flight_id,))
+        return cur.fetchone()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=25, help="concurrent bookers per process")
+    parser.add_argument("--attempts", type=int, default=4, help="booking attempts per booker")
+    parser.add_argument("--capacity", type=int, default=150)
+    parser.add_argument("--seat-space", type=int, default=None,
+                        help="number of distinct seat labels requested (default: capacity)")
+    parser.add_argument("--auto", type=float, default=0.3,
+                        help="share of bookings that ask for the best available seat")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data")
+    args = parser.parse_args(argv)
+
+    seat_space = args.seat_space or args.capacity
+    bookers = args.processes * args.threads
+    fixture = setup(args.capacity, min(bookers, 1000))
+    flight_id, passanger_ids = fixture[3], fixture[4]
+    print(f"Flight {flight_id}: capacity {args.capacity}, {bookers} concurrent bookers, "
+          f"{bookers * args.attempts} attempts over {seat_space} seat labels")
+
+    ctx = multiprocessing.get_context("spawn")
+    start_event = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(flight_id, passanger_ids, seat_space, args.auto, args.attempts,
+                                              args.threads, start_event, results))
+             for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)  # let workers import and reach the start line
+
+    started = time.perf_counter()
+    start_event.set()
+    totals = Counter()
+    for _ in procs:
+        totals.update(results.get())
+    elapsed = time.perf_counter() - started
+    for p in procs:
+        p.join()
+
+    capacity, booked, duplicate_seats, inventory_booked, bitmap_seats = verify(flight_id)
+    attempts = sum(v for k, v in totals.items() if not k.startswith("error: "))
+    print(f"Outcomes: {dict(totals)}")
+    print(f"Elapsed {elapsed:.2f}s - {attempts / elapsed:.0f} attempts/sec, "
+          f"{(totals['booked'] + totals['booked_auto']) / elapsed:.0f} bookings/sec")
+    print(f"Booked {booked}/{capacity} (inventory says {inventory_booked}, seat bitmap {bitmap_seats}), "
+          f"duplicate seats: {duplicate_seats}")
+
+    failures = []
+    if booked > capacity:
+        failures.append(f"oversold: {booked} > {capacity}")
+    if duplicate_seats:
+        failures.append(f"{duplicate_seats} seat(s) sold twice")
+    if inventory_booked != booked:
+        failures.append(f"inventory drift: {inventory_booked} != {booked}")
+    if bitmap_seats != booked:
+        failures.append(f"seat bitmap drift: {bitmap_seats} != {booked}")
+    if totals["booked"] + totals["booked_auto"] != booked:
+        failures.append(f"reported bookings {totals['booked'] + totals['booked_auto']} != tickets {booked}")
+
+    if not args.keep:
+        teardown(*fixture)
+
+    if failures:
+        print("❌ " + "; ".join(failures))
+        return 1
+    print("✅ No overselling")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
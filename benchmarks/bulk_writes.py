@@ -0,0 +1,196 @@
+"""Per-row write functions against their batched counterparts.
+
+For every batch size N, each operation runs once through the per-row
+function called N times and once through the bulk function given all N
+items, each on a throwaway flight of its own with N tickets (half of them
+paid). Reported are the wall time, items/sec, the statements sent to the
+server (from database.query_stats) and the speed-up:
+
+    add_flight            x N  vs  add_flights_bulk
+    cancel_ticket         x N  vs  cancel_tickets_bulk
+    delete_payment_by_id  x N  vs  delete_payments_bulk
+    delete_ticket_by_id   x N  vs  delete_tickets_bulk
+
+Afterwards the seat counters and revenue of the flights used are checked
+against their tickets and payments, and everything created is removed.
+
+    python -m benchmarks.datagen --scale 100k
+    python -m benchmarks.bulk_writes --suffix suite_100k --sizes 10,100,1000
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+
+PER_ROW, BULK = "per-row", "bulk"
+
+
+def setup(tag, capacity):
+    """Aircraft big enough for the largest batch, a route and a passenger"""
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO aircrafts (model, manufacturer, seat_capacity, seats_per_row)
+            VALUES (%s, 'Bulk', %s, 10) RETURNING aircraft_id
+        """, (f"BULK-{tag}", capacity))
+        aircraft_id = cur.fetchone()[0]
+        airport_ids = []
+        for suffix in ("O", "D"):
+            cur.execute("""
+                INSERT INTO airports (code, name, city, country)
+                VALUES (%s, %s, 'Bulk', 'Bulk') RETURNING airport_id
+            """, (f"B{tag}{suffix}", f"Bulk {tag} {suffix}"))
+            airport_ids.append(cur.fetchone()[0])
+        cur.execute("""
+            INSERT INTO passangers (full_name, email, phone, nationality)
+            VALUES ('Bulk Passenger', %s, '0', 'XX') RETURNING passanger_id
+        """, (f"bulk-{tag.lower()}@example.com",))
+        passanger_id = cur.fetchone()[0]
+        conn.commit()
+    return aircraft_id, airport_ids, passanger_id
+
+
+def flight_with_tickets(tag, run, fixtures, tickets):
+    """New flight holding ``tickets`` tickets, the first half confirmed and paid.
+    Returns (flight_id, ticket_ids, payment_ids)"""
+    from database import airline_connection
+    from inventory import ensure_inventory_row
+
+    aircraft_id, (origin, destination), passanger_id = fixtures
+    departure = datetime(2099, 6, 1) + timedelta(hours=run)
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO flights (flight_number, origin_airport_id, destination_airport_id,
+                                 departure_time, arrival_time, aircraft_id, fare)
+            VALUES (%s, %s, %s, %s, %s, %s, 100) RETURNING flight_id
+        """, (f"{tag}T{run}", origin, destination, departure, departure + timedelta(hours=2), aircraft_id))
+        flight_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO tickets (passanger_id, flight_id, seat_no, status)
+            SELECT %s, %s, (n / 10 + 1) || chr(65 + n %% 10),
+                   CASE WHEN n < %s / 2 THEN 'confirmed' ELSE 'pending' END
+            FROM generate_series(0, %s - 1) AS n
+            RETURNING ticket_id
+        """, (passanger_id, flight_id, tickets, tickets))
+        ticket_ids = [ticket_id for (ticket_id,) in cur.fetchall()]
+        cur.execute("""
+            INSERT INTO payments (ticket_id, amount, method, status)
+            SELECT ticket_id, 100, 'upi', 'success' FROM tickets
+            WHERE flight_id = %s AND status = 'confirmed'
+            RETURNING payment_id
+        """, (flight_id,))
+        payment_ids = [payment_id for (payment_id,) in cur.fetchall()]
+        ensure_inventory_row(cur, flight_id)
+        conn.commit()
+    return flight_id, ticket_ids, payment_ids
+
+
+def operations(tag, fixtures):
+    """(name, per_row(item), bulk(items), items(size, tickets, payments, run))"""
+    import admin_functions as admin
+    import user_functions as user
+
+    aircraft_id, (origin, destination), passanger_id = fixtures
+
+    def new_flights(size, tickets, payments, run):
+        departure = datetime(2099, 1, 1) + timedelta(days=run)
+        return [(f"{tag}F{run}-{k}", origin, destination, departure + timedelta(minutes=k),
+                 departure + timedelta(minutes=k + 120), aircraft_id, 100) for k in range(size)]
+
+    return [
+        ("add_flight", lambda flight: admin.add_flight(*flight), admin.add_flights_bulk, new_flights),
+        ("cancel_ticket", lambda ticket_id: user.cancel_ticket(ticket_id, passanger_id),
+         lambda ticket_ids: user.cancel_tickets_bulk(ticket_ids, passanger_id),
+         lambda size, tickets, payments, run: tickets),
+        ("delete_payment_by_id", admin.delete_payment_by_id, admin.delete_payments_bulk,
+         lambda size, tickets, payments, run: payments),
+        ("delete_ticket_by_id", admin.delete_ticket_by_id, admin.delete_tickets_bulk,
+         lambda size, tickets, payments, run: tickets),
+    ]
+
+
+def check_inventory(flight_ids):
+    """Flights among ``flight_ids`` whose counters or revenue disagree with their tickets and payments"""
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT fi.flight_id
+            FROM flight_inventory fi
+            LEFT JOIN LATERAL (
+                SELECT COUNT(*) FILTER (WHERE t.status != 'cancelled') AS booked,
+                       COUNT(*) FILTER (WHERE t.status = 'cancelled') AS cancelled,
+                       COALESCE(SUM(p.amount), 0) AS revenue
+                FROM tickets t
+                LEFT JOIN payments p ON p.ticket_id = t.ticket_id AND p.status = 'success'
+                WHERE t.flight_id = fi.flight_id
+            ) actual ON TRUE
+            WHERE fi.flight_id = ANY(%s)
+              AND (fi.booked_seats, fi.cancelled_seats, fi.revenue)
+                  IS DISTINCT FROM (actual.booked, actual.cancelled, actual.revenue)
+        """, (flight_ids,))
+        return [flight_id for (flight_id,) in cur.fetchall()]
+
+
+def teardown(tag, fixtures):
+    from database import airline_connection
+
+    aircraft_id, airport_ids, passanger_id = fixtures
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_number LIKE %s", (tag + "%",))
+        cur.execute("DELETE FROM passangers WHERE passanger_id = %s", (passanger_id,))
+        cur.execute("DELETE FROM airports WHERE airport_id = ANY(%s)", (airport_ids,))
+        cur.execute("DELETE FROM aircrafts WHERE aircraft_id = %s", (aircraft_id,))
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated batch sizes")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix))
+    from database import query_stats
+
+    tag = "BW" + uuid.uuid4().hex[:6].upper()
+    fixtures = setup(tag, max(sizes))
+    flight_ids, run = [], 0
+    try:
+        print(f"{'operation':22} {'items':>6} {'per-row':>10} {'bulk':>10} {'speed-up':>9} "
+              f"{'bulk items/s':>13} {'statements':>14}")
+        for size in sizes:
+            for name, per_row, bulk, items in operations(tag, fixtures):
+                timings, statements = {}, {}
+                for mode in (PER_ROW, BULK):
+                    run += 1
+                    flight_id, ticket_ids, payment_ids = flight_with_tickets(tag, run, fixtures, size)
+                    flight_ids.append(flight_id)
+                    batch = items(size, ticket_ids, payment_ids, run)
+                    query_stats.reset()
+                    started = time.perf_counter()
+                    if mode == PER_ROW:
+                        for item in batch:
+                            per_row(item)
+                    else:
+                        bulk(batch)
+                    timings[mode] = time.perf_counter() - started
+                    statements[mode] = sum(entry["calls"] for entry in query_stats.snapshot())
+                print(f"{name:22} {len(batch):>6} {timings[PER_ROW] * 1000:>8.1f}ms {timings[BULK] * 1000:>8.1f}ms "
+                      f"{timings[PER_ROW] / timings[BULK]:>8.1f}x {len(batch) / timings[BULK]:>13,.0f} "
+                      f"{statements[PER_ROW]:>7}/{statements[BULK]:<6}")
+        mismatched = check_inventory(flight_ids)
+        if mismatched:
+            print(f"❌ flight_inventory disagrees with tickets for flights {mismatched}")
+            return 1
+        print(f"✅ flight_inventory matches tickets and payments on all {len(flight_ids)} flights")
+        return 0
+    finally:
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
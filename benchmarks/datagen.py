@@ -0,0 +1,197 @@
+"""Deterministic synthetic data for the airline schema, bulk-loaded with COPY.
+
+Rows are generated lazily and streamed straight into COPY ... FROM STDIN,
+so memory stays flat regardless of scale. The same ``seed`` and ticket
+count always produce the same data, which keeps plans and timings
+comparable across runs and commits.
+
+    python -m benchmarks.datagen --scale 100k
+    python -m benchmarks.datagen --tickets 250000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from database import IteratorFile, hash_password
+from inventory import rebuild_inventory
+
+MANUFACTURERS = ["Airbus", "Boeing", "Embraer", "ATR", "Bombardier", "Comac"]
+COUNTRIES = ["IN", "US", "GB", "DE", "FR", "AE", "SG", "JP", "AU", "CA"]
+PAYMENT_METHODS = ["credit_card", "upi", "debit_card", "netbanking", "cash"]
+SEAT_LETTERS = "ABCDEF"
+
+# Ticket counts of the standard data sets, for comparable runs across commits
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Every synthetic passenger can log in as passenger<N>@example.com with this password
+PASSWORD = "bench-password"
+
+# Ticket status mix; every confirmed ticket gets exactly one successful payment
+STATUS_WEIGHTS = {"confirmed": 60, "pending": 25, "cancelled": 15}
+
+
+def copy_rows(cur, table, columns, rows):
+    """Stream an iterable of tuples into table via COPY (values must not contain commas)"""
+    lines = (",".join("" if v is None else str(v) for v in row) + "\n" for row in rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    IteratorFile(lines), size=1 << 16)
+
+
+def airport_code(n):
+    letters = ""
+    for _ in range(3):
+        n, r = divmod(n, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+def seat_label(n):
+    return f"{n // len(SEAT_LETTERS) + 1}{SEAT_LETTERS[n % len(SEAT_LETTERS)]}"
+
+
+def plan_sizes(tickets):
+    """Row counts for every table at a given ticket count"""
+    avg_load = 0.6 * 190  # ~60% of an average aircraft
+    return {
+        "airports": min(400, max(20, int(tickets ** 0.5 / 2))),
+        "aircrafts": 12,
+        "flights": max(10, int(tickets / avg_load * 1.5)),
+        "passangers": max(10, tickets // 3),
+        "tickets": tickets,
+    }
+
+
+def load(conn, tickets, seed=42, epoch=None):
+    """Truncate the airline tables and load a synthetic data set of ``tickets`` tickets.
+
+    Flights are spread from 30 days before ``epoch`` (default: now) to 180
+    days after it, so both past and bookable future flights exist. Returns
+    the number of rows loaded per table.
+    """
+    rng = random.Random(seed)
+    sizes = plan_sizes(tickets)
+    epoch = (epoch or datetime.now()).replace(minute=0, second=0, microsecond=0)
+    counts = dict(sizes)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            TRUNCATE payments, tickets, flight_inventory, flights, passangers, airports, aircrafts
+            RESTART IDENTITY CASCADE
+        """)
+
+        copy_rows(cur, "airports", ["airport_id", "code", "name", "city", "country"],
+                  ((i, airport_code(i), f"Airport {airport_code(i)}", f"City {i}", rng.choice(COUNTRIES))
+                   for i in range(1, sizes["airports"] + 1)))
+
+        capacities = [rng.choice([72, 120, 150, 180, 186, 220, 240, 300]) for _ in range(sizes["aircrafts"])]
+        copy_rows(cur, "aircrafts", ["aircraft_id", "model", "manufacturer", "seat_capacity"],
+                  ((i + 1, f"MODEL-{i + 1}", rng.choice(MANUFACTURERS), cap)
+                   for i, cap in enumerate(capacities)))
+
+        flight_capacity = []
+
+        def flights():
+            for flight_id in range(1, sizes["flights"] + 1):
+                origin = rng.randint(1, sizes["airports"])
+                destination = rng.randint(1, sizes["airports"] - 1)
+                if destination >= origin:
+                    destination += 1
+                aircraft = rng.randint(1, sizes["aircrafts"])
+                departure = epoch + timedelta(hours=rng.randint(-30 * 24, 180 * 24))
+                arrival = departure + timedelta(minutes=rng.randint(45, 14 * 60))
+                fare = rng.randint(20, 400) * 25
+                flight_capacity.append(capacities[aircraft - 1])
+                yield (flight_id, f"SY{flight_id}", origin, destination,
+                       departure.isoformat(sep=" "), arrival.isoformat(sep=" "), aircraft, fare)
+
+        copy_rows(cur, "flights", ["flight_id", "flight_number", "origin_airport_id", "destination_airport_id",
+                                   "departure_time", "arrival_time", "aircraft_id", "fare"], flights())
+
+        copy_rows(cur, "passangers", ["passanger_id", "full_name", "email", "phone", "nationality"],
+                  ((i, f"Passenger {i}", f"passenger{i}@example.com", f"9{i:09d}", rng.choice(COUNTRIES))
+                   for i in range(1, sizes["passangers"] + 1)))
+
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+
+        def ticket_rows():
+            ticket_id = 0
+            flight_index = 0
+            while ticket_id < tickets:
+                if flight_index == len(flight_capacity):
+                    raise RuntimeError("Not enough flights for the requested ticket count")
+                capacity = flight_capacity[flight_index]
+                booked = rng.randint(int(capacity * 0.3), int(capacity * 0.9))
+                for seat in range(min(booked, tickets - ticket_id)):
+                    ticket_id += 1
+                    yield (ticket_id, rng.randint(1, sizes["passangers"]), flight_index + 1,
+                           seat_label(seat), rng.choices(statuses, weights)[0])
+                flight_index += 1
+
+        copy_rows(cur, "tickets", ["ticket_id", "passanger_id", "flight_id", "seat_no", "status"], ticket_rows())
+
+        # Payments are derived server-side from confirmed tickets, so nothing
+        # per-ticket has to be remembered on this side
+        cur.execute("""
+            INSERT INTO payments (ticket_id, amount, method, status, payment_time)
+            SELECT t.ticket_id, f.fare,
+                   (%s::text[])[1 + t.ticket_id %% %s],
+                   'success',
+                   f.departure_time - make_interval(hours => 2 + ((t.ticket_id::bigint * 7919) %% 1440)::int)
+            FROM tickets t
+            JOIN flights f ON f.flight_id = t.flight_id
+            WHERE t.status = 'confirmed'
+            ORDER BY t.ticket_id
+        """, (PAYMENT_METHODS, len(PAYMENT_METHODS)))
+        counts["payments"] = cur.rowcount
+
+        for table, key in [("airports", "airport_id"), ("aircrafts", "aircraft_id"), ("flights", "flight_id"),
+                           ("passangers", "passanger_id"), ("tickets", "ticket_id")]:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                        f"GREATEST((SELECT MAX({key}) FROM {table}), 1))")
+
+        rebuild_inventory(cur)
+        cur.execute("ANALYZE")
+    conn.commit()
+    return counts
+
+
+def load_credentials(conn, passengers):
+    """Replace user_credentials with a login for each of ``passengers`` synthetic passengers"""
+    password_hash = hash_password(PASSWORD)
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE user_credentials RESTART IDENTITY")
+        copy_rows(cur, "user_credentials", ["passanger_id", "email", "password_hash"],
+                  ((i, f"passenger{i}@example.com", password_hash) for i in range(1, passengers + 1)))
+        cur.execute("ANALYZE user_credentials")
+    conn.commit()
+    return passengers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load synthetic data into a scratch airline database")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--scale", choices=SCALES, help="standard data set size")
+    size.add_argument("--tickets", type=int, help="ticket count (default 100000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    args = parser.parse_args(argv)
+    tickets = SCALES[args.scale] if args.scale else args.tickets or 100_000
+
+    from benchmarks.scratch import create_scratch_databases, connect
+    airline_config, auth_config = create_scratch_databases(args.suffix)
+    conn = connect(airline_config)
+    try:
+        counts = load(conn, tickets, seed=args.seed)
+    finally:
+        conn.close()
+    conn = connect(auth_config)
+    try:
+        counts["user_credentials"] = load_credentials(conn, counts["passangers"])
+    finally:
+        conn.close()
+    print(f"✅ Loaded into {airline_config['database']} and {auth_config['database']}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Seat hold expiry: hold_sweeper.HoldSweeper against concurrent payments.
+
+For each --batch-size, --holds pending tickets are booked through
+book_flight on throwaway flights (see benchmarks.async_load.setup) and
+all but a --fresh share are backdated past the hold TTL. Then --sweepers
+sweepers expire them while --threads threads try to pay for a --paid
+share of the expired holds at the same time, as passengers finishing
+checkout just after their hold ran out would.
+
+Reported per batch size are expired/sec, the payment outcomes and their
+latency, and the consistency check: every expired hold cancelled and
+none paid for, swept yet or not, fresh holds untouched, and
+flight_inventory counters and seat bitmaps matching the tickets.
+
+    python -m benchmarks.hold_sweep --suffix suite_100k --holds 20000 --batch-sizes 100,500,2000
+"""
+import argparse
+import logging
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Long enough that the scratch dataset's own pending tickets are never due;
+# the benchmark's holds are backdated twice as far. Set as HOLD_CONFIG's
+# ttl_minutes for the run, so the sweepers and make_payment agree on it
+TTL_MINUTES = 5 * 365 * 24 * 60
+
+
+def book_holds(flight_ids, passengers, holds, threads, seed):
+    """``holds`` pending tickets spread over the flights; returns [(ticket_id, passanger_id)]"""
+    from user_functions import book_flight
+
+    rng = random.Random(seed)
+    requests = [(rng.choice(passengers)[0], flight_ids[n % len(flight_ids)]) for n in range(holds)]
+
+    def book(args):
+        ok, ticket_id, message = book_flight(*args)
+        if not ok:
+            raise RuntimeError(message)
+        return ticket_id, args[0]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(book, requests))
+
+
+def backdate(ticket_ids):
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE tickets SET booked_at = NOW() - make_interval(mins => %s) WHERE ticket_id = ANY(%s)",
+                    (2 * TTL_MINUTES, ticket_ids))
+        conn.commit()
+
+
+def pay_all(tickets, threads):
+    """Pay for ``tickets`` concurrently; returns ([latency ms], {outcome: count})"""
+    from benchmarks.async_load import FARE
+    from user_functions import HOLD_EXPIRED, make_payment
+
+    outcomes = {"paid": 0, "expired": 0, "failed": 0}
+
+    def pay(ticket):
+        started = time.perf_counter()
+        ok, message = make_payment(ticket[0], FARE, "upi", ticket[1])
+        expired = message in (HOLD_EXPIRED, "Cannot pay for a cancelled ticket!")
+        outcome = "paid" if ok else "expired" if expired else "failed"
+        outcomes[outcome] += 1
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(pay, tickets)), outcomes
+
+
+def inventory_mismatches(flight_ids):
+    """Flights among ``flight_ids`` whose flight_inventory counters, revenue or seat bitmap disagree
+    with their tickets and payments"""
+    from database import airline_connection
+    from inventory import COUNTS_SELECT, REVENUE_CTE, SEAT_BITMAPS_CTE
+
+    flight_filter = "AND f.flight_id = ANY(%(flights)s)"
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            WITH {SEAT_BITMAPS_CTE.format(flight_filter=flight_filter)},
+                 {REVENUE_CTE.format(flight_filter=flight_filter)},
+                 counts AS ({COUNTS_SELECT.format(flight_filter=flight_filter)})
+            SELECT COUNT(*)
+            FROM counts c
+            JOIN bitmaps b ON b.flight_id = c.flight_id
+            LEFT JOIN revenue r ON r.flight_id = c.flight_id
+            JOIN flight_inventory fi ON fi.flight_id = c.flight_id
+            WHERE (fi.booked_seats, fi.pending_seats, fi.confirmed_seats, fi.cancelled_seats, fi.seat_bitmap,
+                   fi.revenue, fi.paid_tickets)
+                  IS DISTINCT FROM (c.booked_seats, c.pending_seats, c.confirmed_seats, c.cancelled_seats,
+                                    b.seat_bitmap, COALESCE(r.revenue, 0), COALESCE(r.paid_tickets, 0))
+        """, {"flights": flight_ids})
+        return cur.fetchone()[0]
+
+
+def consistency(flight_ids, expired_ids, fresh_ids):
+    """(expired holds still pending, paid and cancelled, fresh holds touched, flights with wrong counters)"""
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) FILTER (WHERE t.status = 'pending'),
+                   COUNT(*) FILTER (WHERE t.status = 'cancelled'
+                                      AND EXISTS (SELECT 1 FROM payments p
+                                                  WHERE p.ticket_id = t.ticket_id AND p.status = 'success'))
+            FROM tickets t WHERE t.ticket_id = ANY(%s)
+        """, (expired_ids,))
+        still_pending, paid_and_cancelled = cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM tickets WHERE ticket_id = ANY(%s) AND status != 'pending'", (fresh_ids,))
+        fresh_touched = cur.fetchone()[0]
+    return still_pending, paid_and_cancelled, fresh_touched, inventory_mismatches(flight_ids)
+
+
+def run(batch_size, args, passengers):
+    """One batch size on its own flights; returns True if consistent"""
+    from benchmarks.async_load import setup, teardown
+    from hold_sweeper import HoldSweeper
+
+    tag = "HS" + uuid.uuid4().hex[:6].upper()
+    fixtures = setup(tag, args.flights, args.holds // args.flights + 10)
+    try:
+        holds = book_holds(fixtures[2], passengers, args.holds, args.threads, args.seed)
+        rng = random.Random(args.seed)
+        rng.shuffle(holds)
+        fresh = holds[:int(len(holds) * args.fresh)]
+        expired = holds[len(fresh):]
+        backdate([ticket_id for ticket_id, _ in expired])
+        payers = rng.sample(expired, int(len(expired) * args.paid))
+
+        sweepers = [HoldSweeper(batch_size, name=f"{tag}-{k}") for k in range(args.sweepers)]
+        threads = [threading.Thread(target=sweeper.sweep) for sweeper in sweepers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        latencies, outcomes = pay_all(payers, args.threads)
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        expired_total = sum(sweeper.expired_total for sweeper in sweepers)
+        checks = consistency(fixtures[2], [t for t, _ in expired], [t for t, _ in fresh])
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"{batch_size:>6,} {wall:>7.2f}s {expired_total:>8,} {expired_total / wall:>10,.0f} "
+              f"{outcomes['paid']:>6,} {outcomes['expired']:>8,} {outcomes['failed']:>7,} {cuts[49]:>8.1f} "
+              f"{cuts[98]:>8.1f} " + " ".join(f"{value:>{width},}" for value, width in zip(checks, (8, 10, 6, 9))))
+        # Every expired hold is cancelled by a sweeper; paying for one is refused even before that
+        return (expired_total == len(expired) and not any(checks)
+                and not outcomes["paid"] and not outcomes["failed"])
+    finally:
+        teardown(tag, fixtures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--holds", type=int, default=5000, help="pending tickets booked per batch size")
+    parser.add_argument("--batch-sizes", default="100,500,2000", help="comma-separated sweeper batch sizes")
+    parser.add_argument("--fresh", type=float, default=0.2, help="share of holds that have not expired")
+    parser.add_argument("--paid", type=float, default=0.2,
+                        help="share of expired holds someone tries to pay for during the sweep")
+    parser.add_argument("--sweepers", type=int, default=2, help="concurrent sweepers")
+    parser.add_argument("--threads", type=int, default=16, help="booking and paying threads")
+    parser.add_argument("--flights", type=int, default=50, help="throwaway flights taking the holds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.async_load import sample_passengers
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    from db_config import HOLD_CONFIG
+    HOLD_CONFIG["ttl_minutes"] = TTL_MINUTES
+    use_scratch_databases(*scratch_configs(args.suffix), minconn=args.threads + args.sweepers,
+                          maxconn=args.threads + args.sweepers)
+    passengers = sample_passengers(500, args.seed)
+    logging.getLogger("airline.slow_queries").setLevel(logging.ERROR)  # lock waits are part of the test
+
+    print(f"{args.holds:,} holds ({args.fresh:.0%} fresh), {args.sweepers} sweeper(s), "
+          f"payments for {args.paid:.0%} of expired holds on {args.threads} threads meanwhile")
+    print(f"{'batch':>6} {'wall':>8} {'expired':>8} {'expired/s':>10} {'paid':>6} {'refused':>8} {'failed':>7} "
+          f"{'pay p50':>8} {'pay p99':>8} {'pending':>8} {'paid+cxl':>10} {'fresh':>6} {'counters':>9}")
+    consistent = [run(int(size), args, passengers) for size in args.batch_sizes.split(",")]
+    return 0 if all(consistent) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
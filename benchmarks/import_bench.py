@@ -0,0 +1,93 @@
+"""Throughput of bulk_import against one add_flight call per row.
+
+Generates a flights CSV over the airports and aircraft of a scratch
+database filled by benchmarks.datagen, then loads it with bulk_import
+(COPY into staging, set-based validation and upsert) and loads a sample
+of the same rows through add_flight for comparison. The imported flights
+are deleted again afterwards.
+
+    python -m benchmarks.datagen --tickets 2000000
+    python -m benchmarks.import_bench --flights 100000
+"""
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+PREFIX = "IMPB"
+
+
+def flights_csv(airports, models, flights, rng, bad_every=0):
+    """CSV bytes of ``flights`` random flights; every ``bad_every``-th row has an unknown airport"""
+    start = datetime(2099, 1, 1)
+    lines = ["flight_number,origin_code,destination_code,departure_time,arrival_time,aircraft_model,fare"]
+    for n in range(flights):
+        origin, destination = rng.sample(airports, 2)
+        if bad_every and n % bad_every == 0:
+            destination = "???"
+        departure = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        arrival = departure + timedelta(minutes=rng.randint(45, 14 * 60))
+        lines.append(f"{PREFIX}{n},{origin},{destination},{departure:%Y-%m-%d %H:%M},{arrival:%Y-%m-%d %H:%M},"
+                     f"{rng.choice(models)},{rng.randint(20, 400) * 25}")
+    return "\n".join(lines).encode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import benchmark")
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--flights", type=int, default=50_000)
+    parser.add_argument("--sample", type=int, default=500, help="rows loaded through add_flight")
+    parser.add_argument("--bad-every", type=int, default=100, help="make every Nth row invalid (0: none)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix))
+
+    from admin_functions import add_flight, bulk_import, get_aircrafts, get_airports
+    from database import airline_connection
+
+    columns, rows = get_airports()
+    airports = [row[columns.index("code")] for row in rows]
+    airport_ids = [row[columns.index("airport_id")] for row in rows]
+    columns, rows = get_aircrafts()
+    models = [row[columns.index("model")] for row in rows]
+    aircraft_ids = [row[columns.index("aircraft_id")] for row in rows]
+    data = flights_csv(airports, models, args.flights, rng, args.bad_every)
+
+    def cleanup():
+        with airline_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM flights WHERE flight_number LIKE %s", (PREFIX + "%",))
+            conn.commit()
+
+    cleanup()
+    try:
+        started = time.perf_counter()
+        result = bulk_import("flights", io.BytesIO(data))
+        elapsed = time.perf_counter() - started
+        print(f"bulk_import: {result['rows']} rows in {elapsed:.2f}s ({result['rows'] / elapsed:,.0f} rows/s) - "
+              f"{result['inserted']} added, {result['rejected']} rejected")
+
+        started = time.perf_counter()
+        again = bulk_import("flights", io.BytesIO(data))
+        elapsed = time.perf_counter() - started
+        print(f"re-import:   {again['rows']} rows in {elapsed:.2f}s ({again['rows'] / elapsed:,.0f} rows/s) - "
+              f"{again['unchanged']} unchanged")
+
+        started = time.perf_counter()
+        for n in range(args.sample):
+            origin, destination = rng.sample(airport_ids, 2)
+            departure = datetime(2098, 1, 1) + timedelta(minutes=n)
+            add_flight(f"{PREFIX}S{n}", origin, destination, departure, departure + timedelta(hours=2),
+                       rng.choice(aircraft_ids), 1000)
+        elapsed = time.perf_counter() - started
+        print(f"add_flight:  {args.sample} rows in {elapsed:.2f}s ({args.sample / elapsed:,.0f} rows/s)")
+    finally:
+        cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""Latency of connecting-itinerary search on a synthetic data set.
+
+Loads the flight graph from a scratch database filled by benchmarks.datagen,
+then runs random origin/destination searches and reports graph load time
+and search latency percentiles. Each search is cross-checked against a
+brute-force enumeration of the same graph with --verify.
+
+    python -m benchmarks.datagen --tickets 2000000
+    python -m benchmarks.itinerary_bench --searches 500
+    python -m benchmarks.itinerary_bench --dense 40 --verify
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+def brute_force(graph, origin_id, destination_id, depart_from, depart_to, min_layover, max_layover, k):
+    """Every itinerary with up to two stops, by nested loops over all flights - for --verify only"""
+    flights = list(graph._flights.values())
+    by_origin = {}
+    for leg in flights:
+        by_origin.setdefault(leg.origin_id, []).append(leg)
+
+    found = []
+
+    def walk(legs):
+        last = legs[-1]
+        if last.destination_id == destination_id:
+            found.append(legs)
+            return
+        if len(legs) == 3:
+            return
+        for leg in by_origin.get(last.destination_id, []):
+            if (min_layover <= leg.departure - last.arrival <= max_layover
+                    and leg.destination_id not in {l.origin_id for l in legs}):
+                walk(legs + [leg])
+
+    for leg in by_origin.get(origin_id, []):
+        if depart_from <= leg.departure <= depart_to:
+            walk([leg])
+    found.sort(key=lambda legs: (legs[-1].arrival - legs[0].departure, sum(l.fare for l in legs)))
+    return found[:k]
+
+
+def dense_graph(graph, airports, flights, rng):
+    """Fill graph with a random in-memory network (no database), denser than datagen's"""
+    now = datetime.now().replace(second=0, microsecond=0)
+    rows = []
+    for flight_id in range(1, flights + 1):
+        origin, destination = rng.sample(range(1, airports + 1), 2)
+        departure = now + timedelta(minutes=rng.randint(60, 180 * 24 * 60))
+        rows.append((flight_id, f"SY{flight_id}", origin, destination, departure,
+                     departure + timedelta(minutes=rng.randint(45, 14 * 60)), rng.randint(20, 400) * 25))
+    graph.load([(i, f"A{i:02d}") for i in range(1, airports + 1)], rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Connecting-itinerary search benchmark")
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--days", type=int, default=3, help="first-departure window")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verify", action="store_true", help="compare with brute force")
+    parser.add_argument("--dense", type=int, metavar="AIRPORTS",
+                        help="search a random in-memory network of AIRPORTS airports instead of the database")
+    parser.add_argument("--flights", type=int, default=30_000, help="flights in the --dense network")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    if not args.dense:
+        from benchmarks.scratch import scratch_configs, use_scratch_databases
+        use_scratch_databases(*scratch_configs(args.suffix))
+
+    from db_config import ITINERARY_CONFIG
+    from itinerary import flight_graph, search_itineraries
+
+    started = time.perf_counter()
+    if args.dense:
+        dense_graph(flight_graph, args.dense, args.flights, rng)
+    else:
+        flight_graph.load_from_database()
+    load_ms = (time.perf_counter() - started) * 1000
+    stats = flight_graph.stats()
+    print(f"Graph: {stats['flights']} flights, {stats['routes']} routes, "
+          f"{stats['airports']} airports loaded in {load_ms:.0f} ms")
+
+    codes = sorted(flight_graph._airport_ids)
+    min_layover = timedelta(minutes=ITINERARY_CONFIG["min_layover_minutes"])
+    max_layover = timedelta(minutes=ITINERARY_CONFIG["max_layover_minutes"])
+    timings, found, mismatches = [], 0, 0
+    for _ in range(args.searches):
+        origin, destination = rng.sample(codes, 2)
+        depart_from = datetime.now() + timedelta(days=rng.randint(0, 150))
+        depart_to = depart_from + timedelta(days=args.days)
+        sort = rng.choice(["time", "fare"])
+
+        started = time.perf_counter()
+        if args.dense:
+            # No database behind the dense network, so no seat check
+            data = flight_graph.connections(flight_graph.airport_id(origin), flight_graph.airport_id(destination),
+                                            depart_from, depart_to, 2, min_layover, max_layover, sort=sort)
+        else:
+            _, data = search_itineraries(origin, destination, depart_from, depart_to, sort=sort)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += bool(data)
+
+        if args.verify:
+            expected = flight_graph.connections(flight_graph.airport_id(origin), flight_graph.airport_id(destination),
+                                                depart_from, depart_to, 2, min_layover, max_layover, k=10)
+            brute = brute_force(flight_graph, flight_graph.airport_id(origin),
+                                flight_graph.airport_id(destination), depart_from, depart_to,
+                                min_layover, max_layover, k=10)
+            key = lambda legs: (legs[-1].arrival - legs[0].departure, sum(l.fare for l in legs))
+            if [key(legs) for legs in expected] != [key(legs) for legs in brute]:
+                mismatches += 1
+
+    timings.sort()
+    pct = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+    print(f"{args.searches} searches, {found} with results: "
+          f"p50={pct(0.50):.2f}ms p95={pct(0.95):.2f}ms p99={pct(0.99):.2f}ms "
+          f"mean={statistics.mean(timings):.2f}ms")
+    if args.verify:
+        print("✅ Matches brute force" if not mismatches else f"❌ {mismatches} search(es) differ from brute force")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
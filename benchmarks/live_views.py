@@ -0,0 +1,198 @@
+"""Live dashboards under booking load: polling against the change feed.
+
+--dashboards open "My Tickets" views (one passenger each) refresh every
+--tick seconds for --seconds while --bookers threads book and pay for
+seats on throwaway flights (see benchmarks.async_load.setup) for
+--passengers passengers, the watched ones among them. Two passes:
+
+  polling  every tick runs the tickets query, as the Refresh button did;
+  feed     every tick compares change_feed.version() for the passenger
+           and only then calls view_user_tickets (cached, evicted by the
+           feed) - what app.py's live fragments do.
+
+Reported per pass are bookings/sec, the queries the dashboards issued,
+how long after a commit its notification was applied (p50/p99, from a
+probe thread updating a ticket of its own every 50 ms), and the
+dashboards whose last view disagrees with the database at the end, which
+must be 0. A last pass books with the notification triggers disabled,
+to show what they cost the writers.
+
+    python -m benchmarks.live_views --suffix suite_100k --dashboards 50 --bookers 8
+"""
+import argparse
+import logging
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def book(passengers, flight_ids, stop, seed):
+    """Book and pay until ``stop``; returns the number of bookings"""
+    from benchmarks.async_load import FARE
+    from user_functions import book_flight, make_payment
+
+    rng = random.Random(seed)
+    bookings = 0
+    while not stop.is_set():
+        passanger_id = rng.choice(passengers)
+        ok, ticket_id, _ = book_flight(passanger_id, rng.choice(flight_ids))
+        if ok:
+            bookings += 1
+            make_payment(ticket_id, FARE, "upi", passanger_id, uuid.uuid4().hex)
+    return bookings
+
+
+def probe(passanger_id, flight_id, stop):
+    """Touch a ticket of ``passanger_id`` every 50 ms until ``stop``; returns commit-to-notification ms"""
+    from change_feed import change_feed
+    from database import airline_connection
+    from user_functions import book_flight
+
+    _, ticket_id, _ = book_flight(passanger_id, flight_id)
+    latencies = []
+    while not stop.wait(0.05):
+        topic = ("passenger", passanger_id)
+        before = change_feed.version(topic)
+        with airline_connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE tickets SET booked_at = booked_at WHERE ticket_id = %s", (ticket_id,))
+            conn.commit()
+        committed = time.perf_counter()
+        while change_feed.version(topic) == before and time.perf_counter() - committed < 5:
+            time.sleep(0.0002)
+        latencies.append((time.perf_counter() - committed) * 1000)
+    return latencies
+
+
+def poll_tickets(passanger_id):
+    """The tickets query the view ran on every refresh before the change feed"""
+    from database import airline_connection
+    from user_functions import USER_TICKETS_SQL
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute(USER_TICKETS_SQL, (passanger_id,))
+        return [desc[0] for desc in cur.description], cur.fetchall()
+
+
+def watch(mode, passanger_id, tick, stop):
+    """One dashboard refreshing until ``stop``; returns (refreshes, last view)"""
+    from change_feed import change_feed
+    from user_functions import view_user_tickets
+
+    refreshes, seen, view = 0, None, None
+    while True:
+        if mode == "polling":
+            view = poll_tickets(passanger_id)
+        else:
+            version = change_feed.version(("passenger", passanger_id))
+            if version != seen:
+                seen, view = version, view_user_tickets(passanger_id)
+        refreshes += 1
+        if stop.wait(tick):
+            return refreshes, view
+
+
+def run(mode, passengers, watched, prober, flight_ids, args):
+    """One pass; returns the number of dashboards left stale"""
+    from cache import view_cache
+    from database import airline_connection, query_stats
+
+    stop_booking, stop_watching = threading.Event(), threading.Event()
+    misses = view_cache.stats()["misses"]
+    query_stats.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.dashboards + args.bookers + 1) as pool:
+        dashboards = [pool.submit(watch, mode, passanger_id, args.tick, stop_watching) for passanger_id in watched]
+        bookers = [pool.submit(book, passengers, flight_ids, stop_booking, args.seed + k)
+                   for k in range(args.bookers)]
+        probing = pool.submit(probe, prober, flight_ids[0], stop_booking)
+        time.sleep(args.seconds)
+        stop_booking.set()
+        bookings = sum(future.result() for future in bookers)
+        latencies = probing.result()
+        wall = time.perf_counter() - started
+        time.sleep(2 * args.tick)  # every dashboard refreshes once more after the last booking
+        stop_watching.set()
+        views = [future.result() for future in dashboards]
+
+    if mode == "polling":
+        queries = sum(entry["calls"] for entry in query_stats.snapshot()
+                      if entry["function"].endswith(".poll_tickets"))
+    else:
+        queries = view_cache.stats()["misses"] - misses
+    stale = 0
+    with airline_connection() as conn, conn.cursor() as cur:
+        for passanger_id, (_, (columns, data)) in zip(watched, views):
+            cur.execute("SELECT COUNT(*) FROM tickets WHERE passanger_id = %s", (passanger_id,))
+            stale += cur.fetchone()[0] != len(data)
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{mode:10} {bookings / wall:>10,.0f} {sum(r for r, _ in views):>10,} {queries:>8,} "
+          f"{cuts[49]:>8.1f} {cuts[98]:>8.1f} {stale:>6,}")
+    return stale
+
+
+def triggers(enabled):
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        for table in ("tickets", "payments", "flights"):
+            cur.execute(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER USER")
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--dashboards", type=int, default=50, help="open ticket views")
+    parser.add_argument("--passengers", type=int, default=2000, help="passengers booking, the watched ones included")
+    parser.add_argument("--bookers", type=int, default=8, help="booking threads")
+    parser.add_argument("--seconds", type=float, default=10, help="length of each pass")
+    parser.add_argument("--tick", type=float, default=1, help="seconds between dashboard refreshes")
+    parser.add_argument("--flights", type=int, default=20, help="throwaway flights to book on")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.async_load import sample_passengers, setup, teardown
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    from change_feed import change_feed, start_change_feed
+    connections = args.bookers + args.dashboards + 1
+    use_scratch_databases(*scratch_configs(args.suffix), minconn=connections, maxconn=connections)
+    logging.getLogger("airline.slow_queries").setLevel(logging.ERROR)
+
+    tag = "CF" + uuid.uuid4().hex[:6].upper()
+    fixtures = setup(tag, args.flights, 2000)
+    start_change_feed()
+    try:
+        while not change_feed.connected:
+            time.sleep(0.05)
+        passengers = [passanger_id for passanger_id, _ in sample_passengers(args.passengers + 1, args.seed)]
+        prober, passengers = passengers[-1], passengers[:-1]
+        watched = passengers[:args.dashboards]
+        print(f"{args.dashboards} dashboards refreshing every {args.tick}s, {args.bookers} booking threads, "
+              f"{args.seconds}s per pass")
+        print(f"{'mode':10} {'bookings/s':>10} {'refreshes':>10} {'queries':>8} {'notify p50':>8} "
+              f"{'p99 ms':>8} {'stale':>6}")
+        stale = run("polling", passengers, watched, prober, fixtures[2], args)
+        stale += run("feed", passengers, watched, prober, fixtures[2], args)
+
+        stop = threading.Event()
+        triggers(enabled=False)
+        try:
+            threading.Timer(args.seconds, stop.set).start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.bookers) as pool:
+                bookings = sum(pool.map(lambda k: book(passengers, fixtures[2], stop, args.seed + k),
+                                        range(args.bookers)))
+            print(f"{'no triggers':10} {bookings / (time.perf_counter() - started):>10,.0f}")
+        finally:
+            triggers(enabled=True)
+        return 1 if stale else 0
+    finally:
+        change_feed.stop()
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
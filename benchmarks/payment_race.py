@@ -0,0 +1,125 @@
+"""Concurrent make_payment calls racing for the same tickets.
+
+--tickets pending tickets are booked on throwaway flights (see
+benchmarks.async_load.setup). Each then gets --submissions payments
+released at the same instant from as many threads: a --same-key share
+of them reuse one idempotency key, as a double click or a client retry
+would, the rest bring keys of their own, as a second browser tab would.
+
+Checked per ticket: exactly one successful payment, every submission
+with the winning key answered with success and every other one refused
+as already paid. Also checked: flight_inventory counters and revenue
+match the tickets and payments. Reported are payments/sec, latency
+percentiles and statements per call.
+
+    python -m benchmarks.payment_race --suffix suite_100k --tickets 2000 --submissions 4
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_submissions(holds, submissions, same_key):
+    """Per ticket, ``submissions`` (ticket_id, passanger_id, idempotency key) calls, grouped by ticket"""
+    shared = max(1, round(submissions * same_key))
+    calls = []
+    for ticket_id, passanger_id in holds:
+        first = uuid.uuid4().hex
+        calls += [(ticket_id, passanger_id, first if k < shared else uuid.uuid4().hex) for k in range(submissions)]
+    return calls
+
+
+def race(calls, submissions, threads):
+    """Run ``calls`` so each ticket's submissions start together; returns (wall, [(call, ok, message, ms)])"""
+    from benchmarks.async_load import FARE
+    from user_functions import make_payment
+
+    barriers = defaultdict(lambda: threading.Barrier(submissions, timeout=30))
+    lock = threading.Lock()
+
+    def submit(call):
+        with lock:
+            barrier = barriers[call[0]]
+        barrier.wait()
+        started = time.perf_counter()
+        ok, message = make_payment(call[0], FARE, "upi", call[1], call[2])
+        return call, ok, message, (time.perf_counter() - started) * 1000
+
+    # A multiple of ``submissions`` workers taking the grouped calls in order
+    # always has one incomplete group at most, so the barriers cannot deadlock
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, threads // submissions) * submissions) as pool:
+        results = list(pool.map(submit, calls))
+    return time.perf_counter() - started, results
+
+
+def check(results, ticket_ids):
+    """(tickets without exactly one payment, wrong answers)"""
+    from database import airline_connection
+
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT t.ticket_id, COUNT(p.payment_id), MIN(p.idempotency_key)
+            FROM tickets t
+            LEFT JOIN payments p ON p.ticket_id = t.ticket_id AND p.status = 'success'
+            WHERE t.ticket_id = ANY(%s)
+            GROUP BY t.ticket_id
+        """, (ticket_ids,))
+        payments = {ticket_id: (count, key) for ticket_id, count, key in cur.fetchall()}
+    unpaid_or_twice = sum(count != 1 for count, _ in payments.values())
+    wrong = 0
+    for (ticket_id, _, key), ok, message, _ in results:
+        winner = payments[ticket_id][1]
+        wrong += ok != (key == winner) or (not ok and message != "Payment already made for this ticket!")
+    return unpaid_or_twice, wrong
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--tickets", type=int, default=2000, help="pending tickets to pay for")
+    parser.add_argument("--submissions", type=int, default=4, help="concurrent payments per ticket")
+    parser.add_argument("--same-key", type=float, default=0.5,
+                        help="share of a ticket's submissions reusing one idempotency key")
+    parser.add_argument("--threads", type=int, default=32, help="paying threads")
+    parser.add_argument("--flights", type=int, default=50, help="throwaway flights taking the tickets")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.async_load import sample_passengers, setup, teardown
+    from benchmarks.hold_sweep import book_holds, inventory_mismatches
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix), minconn=args.threads, maxconn=args.threads)
+    from database import query_stats
+    logging.getLogger("airline.slow_queries").setLevel(logging.ERROR)  # lock waits are part of the test
+
+    tag = "PR" + uuid.uuid4().hex[:6].upper()
+    fixtures = setup(tag, args.flights, args.tickets // args.flights + 10)
+    try:
+        holds = book_holds(fixtures[2], sample_passengers(500, args.seed), args.tickets, args.threads, args.seed)
+        calls = make_submissions(holds, args.submissions, args.same_key)
+        query_stats.reset()
+        wall, results = race(calls, args.submissions, args.threads)
+        statements = sum(entry["calls"] for entry in query_stats.snapshot())
+
+        unpaid_or_twice, wrong = check(results, [ticket_id for ticket_id, _ in holds])
+        mismatches = inventory_mismatches(fixtures[2])
+        cuts = statistics.quantiles([ms for *_, ms in results], n=100)
+        print(f"{len(calls):,} payments for {len(holds):,} tickets ({args.submissions} at once per ticket, "
+              f"{args.same_key:.0%} sharing a key) in {wall:.2f}s: {len(calls) / wall:,.0f}/s, "
+              f"p50 {cuts[49]:.1f} ms, p95 {cuts[94]:.1f} ms, p99 {cuts[98]:.1f} ms, "
+              f"{statements / len(calls):.1f} statements per call")
+        print(f"succeeded {sum(ok for _, ok, _, _ in results):,}, tickets not paid exactly once "
+              f"{unpaid_or_twice:,}, wrong answers {wrong:,}, flights with wrong counters {mismatches:,}")
+        return 1 if unpaid_or_twice or wrong or mismatches else 0
+    finally:
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+"""Query-plan regression check for admin_functions.py and user_functions.py.
+
+Loads synthetic data into scratch databases, runs every public query
+function against them and captures EXPLAIN (ANALYZE, BUFFERS) for each
+statement it executes. Plans are compared with the stored baseline in
+plan_baseline.json; the run fails (exit code 1) when a statement
+
+  * picks up a sequential scan its baseline plan did not have,
+  * exceeds its baseline planner cost by more than --cost-tolerance, or
+  * touches more shared buffers than its baseline by more than --buffer-tolerance.
+
+Statements are keyed by function and normalised SQL, so a changed query
+is reported as such. After an intentional change, review the new plans
+and re-record with --update-baseline.
+
+    python -m benchmarks.plan_check
+    python -m benchmarks.plan_check --update-baseline
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+
+from psycopg2 import extensions
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "plan_baseline.json")
+PLANNABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+# database.TwoPhaseCommit sends BEGIN and COMMIT in the same string as its statements
+OPENING_BEGIN = re.compile(r"^\s*BEGIN\s*;", re.IGNORECASE)
+CLOSING_COMMIT = re.compile(r";\s*COMMIT\s*$", re.IGNORECASE)
+
+_capture = threading.local()
+
+
+class ExplainingCursor(extensions.cursor):
+    """Cursor that records EXPLAIN (ANALYZE, BUFFERS) for each statement before running it.
+
+    The EXPLAIN runs inside a savepoint (or, on an autocommit connection
+    outside a transaction, a transaction) that is rolled back straight
+    away, so data-modifying statements are not applied twice.
+    """
+
+    def execute(self, query, vars=None):
+        label = getattr(_capture, "label", None)
+        text = query.decode() if isinstance(query, bytes) else query
+        if isinstance(query, bytes) and vars is None:
+            # execute_batch sends pages of ';'-joined statements; they share a plan
+            text = text.split(";")[0]
+        begin = OPENING_BEGIN.match(text)
+        if label and begin:
+            super().execute("BEGIN")  # the savepoint needs the transaction open first
+            query = text = text[begin.end():]
+        if label and PLANNABLE.match(text) and text.strip() != "SELECT 1":
+            text = CLOSING_COMMIT.sub("", text)
+            outside = (self.connection.autocommit and self.connection.info.transaction_status
+                       == extensions.TRANSACTION_STATUS_IDLE)
+            super().execute("BEGIN" if outside else "SAVEPOINT plan_check")
+            super().execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + text, vars)
+            plan = self.fetchone()[0][0]
+            super().execute("ROLLBACK" if outside else "ROLLBACK TO SAVEPOINT plan_check")
+            _capture.plans.append((text, plan))
+        return super().execute(query, vars)
+
+
+def normalise(sql):
+    return " ".join(sql.split())
+
+
+def summarise(plan):
+    scans = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            scans.add(f"{node['Node Type']} on {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    root = plan["Plan"]
+    walk(root)
+    return {
+        "cost": root["Total Cost"],
+        "buffers": root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0),
+        "time_ms": round(plan.get("Execution Time", 0.0), 3),
+        "scans": sorted(scans),
+    }
+
+
+def run_scenario(label, fn):
+    from cache import analytics_cache, reference_cache
+
+    reference_cache.clear()
+    analytics_cache.clear()
+    _capture.label, _capture.plans = label, []
+    try:
+        fn()
+    finally:
+        _capture.label = None
+
+    statements = {}
+    for sql, plan in _capture.plans:
+        text = normalise(sql)
+        key = hashlib.sha1(text.encode()).hexdigest()[:12]
+        statements[key] = {"sql": text[:120], **summarise(plan)}
+    return statements
+
+
+def sample_ids(cur):
+    """Pick representative rows from the synthetic data for the scenarios to act on"""
+    from seatmap import SeatMap
+
+    ids = {}
+    cur.execute("""
+        SELECT t.passanger_id, p.email
+        FROM tickets t JOIN passangers p ON p.passanger_id = t.passanger_id
+        GROUP BY t.passanger_id, p.email
+        ORDER BY COUNT(*) DESC, t.passanger_id LIMIT 1
+    """)
+    ids["passanger_id"], ids["email"] = cur.fetchone()
+    cur.execute("""
+        SELECT t.ticket_id, t.passanger_id, f.fare FROM tickets t JOIN flights f ON f.flight_id = t.flight_id
+        WHERE t.status = 'pending' ORDER BY t.ticket_id LIMIT 1
+    """)
+    ids["pending_ticket"], ids["pending_owner"], ids["pending_fare"] = cur.fetchone()
+    cur.execute("SELECT ticket_id, passanger_id FROM tickets WHERE status = 'confirmed' ORDER BY ticket_id LIMIT 1")
+    ids["confirmed_ticket"], ids["confirmed_owner"] = cur.fetchone()
+    cur.execute("""
+        SELECT fi.flight_id FROM flight_inventory fi
+        JOIN flights f ON f.flight_id = fi.flight_id JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        WHERE fi.booked_seats < a.seat_capacity ORDER BY fi.flight_id LIMIT 1
+    """)
+    ids["open_flight"] = cur.fetchone()[0]
+    cur.execute("""
+        SELECT a.seat_capacity, a.seats_per_row, fi.seat_bitmap
+        FROM flight_inventory fi
+        JOIN flights f ON f.flight_id = fi.flight_id JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        WHERE fi.flight_id = %s
+    """, (ids["open_flight"],))
+    ids["open_seat"] = SeatMap(*cur.fetchone()).free_seats()[-1]
+    cur.execute("""
+        SELECT o.code, d.code FROM flights f
+        JOIN airports o ON o.airport_id = f.origin_airport_id
+        JOIN airports d ON d.airport_id = f.destination_airport_id
+        WHERE f.departure_time > NOW() ORDER BY f.flight_id LIMIT 1
+    """)
+    ids["route"] = cur.fetchone()
+    cur.execute("SELECT model FROM aircrafts ORDER BY aircraft_id LIMIT 1")
+    ids["model"] = cur.fetchone()[0]
+    cur.execute("SELECT CURRENT_DATE + 7, CURRENT_DATE + 14")
+    ids["window"] = cur.fetchone()
+    cur.execute("SELECT MAX(payment_id), MAX(ticket_id) FROM payments")
+    ids["last_payment"], ids["paid_ticket"] = cur.fetchone()
+    cur.execute("SELECT MAX(ticket_id) FROM tickets")
+    ids["last_ticket"] = cur.fetchone()[0]
+    cur.execute("SELECT MAX(passanger_id), MAX(flight_id) FROM passangers, flights")
+    ids["last_passanger"], ids["last_flight"] = cur.fetchone()
+    cur.execute("SELECT email FROM passangers WHERE passanger_id = %s", (ids["last_passanger"] // 2,))
+    ids["delete_email"] = cur.fetchone()[0]
+    return ids
+
+
+def import_file(ids, flights=20):
+    """A small flights CSV for bulk_import: new flights on a known route plus one bad row"""
+    origin, destination = ids["route"]
+    lines = ["flight_number,origin_code,destination_code,departure_time,arrival_time,aircraft_model,fare"]
+    lines += [f"PCB{n},{origin},{destination},2099-01-{n % 28 + 1:02d} 10:00,2099-01-{n % 28 + 1:02d} 12:00,"
+              f"{ids['model']},{100 + n}" for n in range(flights)]
+    lines.append(f"PCB-BAD,{origin},NOPE,2099-01-01 10:00,2099-01-01 12:00,{ids['model']},100")
+    return io.BytesIO("\n".join(lines).encode())
+
+
+def scenarios(ids):
+    import admin_functions as admin
+    import authentication as auth
+    import itinerary
+    import user_functions as user
+
+    return [
+        # Reads
+        ("get_aircrafts", admin.get_aircrafts),
+        ("get_airports", admin.get_airports),
+        ("get_flight_metadata", admin.get_flight_metadata),
+        ("view_flights", admin.view_flights),
+        ("view_flights_page", lambda: admin.view_flights_page(after_id=ids["last_flight"] // 2)),
+        ("view_passengers", admin.view_passengers),
+        ("view_passengers_page", lambda: admin.view_passengers_page(after_id=ids["last_passanger"] // 2)),
+        ("view_all_tickets", admin.view_all_tickets),
+        ("view_all_tickets_page", lambda: admin.view_all_tickets_page(after_id=ids["last_ticket"] // 2)),
+        ("view_all_tickets_page[email]", lambda: admin.view_all_tickets_page(email=ids["email"])),
+        ("view_all_payments", admin.view_all_payments),
+        ("view_all_payments_page", lambda: admin.view_all_payments_page(after_id=ids["last_payment"] // 2)),
+        ("get_available_flights", user.get_available_flights),
+        ("search_flights", user.search_flights),
+        ("search_flights[route]", lambda: user.search_flights(ids["route"][0], ids["route"][1], sort="fare")),
+        ("search_flights[window]", lambda: user.search_flights(depart_from=ids["window"][0],
+                                                               depart_to=ids["window"][1], max_fare=5000)),
+        ("search_itineraries", lambda: itinerary.search_itineraries(ids["route"][0], ids["route"][1],
+                                                                    ids["window"][0], ids["window"][1])),
+        ("view_user_tickets", lambda: user.view_user_tickets(ids["passanger_id"])),
+        ("view_user_payments", lambda: user.view_user_payments(ids["passanger_id"])),
+        ("get_seat_map", lambda: user.get_seat_map(ids["open_flight"])),
+        ("get_ticket_fare", lambda: user.get_ticket_fare(ids["pending_ticket"])),
+        ("analytics_summary", admin.analytics_summary),
+        ("daily_revenue[window]", lambda: admin.daily_revenue(depart_from=ids["window"][0],
+                                                              depart_to=ids["window"][1])),
+        ("route_daily_revenue[window]", lambda: admin.route_daily_revenue(depart_from=ids["window"][0],
+                                                                          depart_to=ids["window"][1])),
+        ("flight_load_factors", admin.flight_load_factors),
+        ("route_cancellation_rates[origin]", lambda: admin.route_cancellation_rates(origin=ids["route"][0])),
+        ("hold_backlog", admin.hold_backlog),
+        ("view_hold_sweepers", admin.view_hold_sweepers),
+        # Writes - each commits, so they run after the reads
+        ("add_passenger", lambda: user.add_passenger("Plan Check", "plan.check@example.com", "0", "XX")),
+        ("register_passenger", lambda: auth.register_passenger("Plan Check", "plan.register@example.com", "0", "XX",
+                                                               "plan-check")),
+        ("book_flight", lambda: user.book_flight(ids["passanger_id"], ids["open_flight"], ids["open_seat"])),
+        ("book_flight[auto]", lambda: user.book_flight(ids["passanger_id"], ids["open_flight"])),
+        ("make_payment", lambda: user.make_payment(ids["pending_ticket"], ids["pending_fare"], "upi",
+                                                   ids["pending_owner"], "plan-check-payment")),
+        ("make_payment[retry]", lambda: user.make_payment(ids["pending_ticket"], ids["pending_fare"], "upi",
+                                                          ids["pending_owner"], "plan-check-payment")),
+        ("cancel_ticket", lambda: user.cancel_ticket(ids["confirmed_ticket"], ids["confirmed_owner"])),
+        ("cancel_tickets_bulk",
+         lambda: user.cancel_tickets_bulk([ids["pending_ticket"], ids["confirmed_ticket"]])),
+        ("delete_payment_by_id", lambda: admin.delete_payment_by_id(ids["last_payment"])),
+        ("delete_payments_bulk",
+         lambda: admin.delete_payments_bulk([ids["last_payment"] - 1, ids["last_payment"] - 2])),
+        ("delete_ticket_by_id", lambda: admin.delete_ticket_by_id(ids["last_ticket"])),
+        ("delete_tickets_bulk",
+         lambda: admin.delete_tickets_bulk([ids["last_ticket"] - 1, ids["last_ticket"] - 2])),
+        ("add_aircraft", lambda: admin.add_aircraft("PLAN-CHECK", "Plan", 100)),
+        ("add_airport", lambda: admin.add_airport("ZZZ", "Plan Check", "Plan", "XX")),
+        ("add_flight", lambda: admin.add_flight("PC1", 1, 2, "2099-01-01 10:00", "2099-01-01 12:00", 1, 100)),
+        ("add_flights_bulk", lambda: admin.add_flights_bulk(
+            [("PC2", 1, 2, "2099-01-02 10:00", "2099-01-02 12:00", 1, 100),
+             ("PC3", 1, 2, "2099-01-03 10:00", "2099-01-03 12:00", 1, 100)])),
+        ("delete_flight_by_number", lambda: admin.delete_flight_by_number("PC1")),
+        ("bulk_import[flights]", lambda: admin.bulk_import("flights", import_file(ids))),
+        ("delete_airport_by_code", lambda: admin.delete_airport_by_code("ZZZ")),
+        ("delete_aircraft_by_model", lambda: admin.delete_aircraft_by_model("PLAN-CHECK")),
+        ("delete_passenger_completely", lambda: admin.delete_passenger_completely(ids["delete_email"])),
+        ("expire_pending_holds", lambda: admin.expire_pending_holds(batch_size=50, ttl_minutes=0)),
+        ("reconcile_flight_inventory", admin.reconcile_flight_inventory),
+    ]
+
+
+def compare(results, baseline, cost_tolerance, buffer_tolerance):
+    failures = []
+    for label, statements in results.items():
+        expected = baseline.get(label)
+        if expected is None:
+            failures.append(f"{label}: no baseline recorded")
+            continue
+        for key, got in statements.items():
+            base = expected.get(key)
+            if base is None:
+                failures.append(f"{label}: new or changed statement {got['sql'][:60]!r}")
+                continue
+            new_seq = [s for s in got["scans"] if s.startswith("Seq Scan") and s not in base["scans"]]
+            if new_seq:
+                failures.append(f"{label}: regressed to {', '.join(new_seq)}")
+            if got["cost"] > base["cost"] * cost_tolerance + 1:
+                failures.append(f"{label}: cost {got['cost']:.1f} > baseline {base['cost']:.1f}")
+            if got["buffers"] > base["buffers"] * buffer_tolerance + 8:
+                failures.append(f"{label}: buffers {got['buffers']} > baseline {base['buffers']}")
+        for key in expected.keys() - statements.keys():
+            failures.append(f"{label}: statement no longer executed {expected[key]['sql'][:60]!r}")
+    for label in baseline.keys() - results.keys():
+        failures.append(f"{label}: scenario missing")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query-plan regression check")
+    parser.add_argument("--tickets", type=int, default=20_000, help="synthetic data size")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--cost-tolerance", type=float, default=1.5)
+    parser.add_argument("--buffer-tolerance", type=float, default=1.5)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch databases")
+    args = parser.parse_args(argv)
+
+    from benchmarks.datagen import load
+    from benchmarks.scratch import (connect, create_scratch_databases, drop_scratch_databases,
+                                    use_scratch_databases)
+
+    airline_config, auth_config = create_scratch_databases("plancheck", fresh=True)
+    try:
+        conn = connect(airline_config)
+        try:
+            load(conn, args.tickets)
+            with conn.cursor() as cur:
+                ids = sample_ids(cur)
+            conn.commit()
+        finally:
+            conn.close()
+
+        use_scratch_databases({**airline_config, "cursor_factory": ExplainingCursor},
+                              {**auth_config, "cursor_factory": ExplainingCursor},
+                              minconn=0, maxconn=2)
+        results = {label: run_scenario(label, fn) for label, fn in scenarios(ids)}
+    finally:
+        if not args.keep:
+            drop_scratch_databases("plancheck")
+
+    for label, statements in results.items():
+        for got in statements.values():
+            print(f"{label:32} cost={got['cost']:>10.1f} buffers={got['buffers']:>6} "
+                  f"time={got['time_ms']:>8.2f}ms  {'; '.join(got['scans'])}")
+
+    if args.update_baseline:
+        # Timings are too noisy to compare - keep them out of the baseline
+        recorded = {label: {key: {k: v for k, v in got.items() if k != "time_ms"}
+                            for key, got in statements.items()}
+                    for label, statements in results.items()}
+        with open(args.baseline, "w") as f:
+            json.dump(recorded, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failures = compare(results, baseline, args.cost_tolerance, args.buffer_tolerance)
+    if failures:
+        print("\n❌ Plan regressions:\n  " + "\n  ".join(failures))
+        return 1
+    print(f"\n✅ {sum(len(s) for s in results.values())} statements within baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Concurrent registration load: two-phase register_passenger against the old flow.
+
+--registrations sign-ups run on --threads threads twice against a scratch
+database: first through the previous three-call flow (check_email_exists,
+add_passenger, register_user_credentials, each committing on its own),
+then through authentication.register_passenger, one transaction across
+both databases. A --duplicates share of the sign-ups reuse an email from
+earlier in the run, so concurrent sign-ups race for the same address.
+
+With --crash-rate, that share of sign-ups dies part-way, as a killed
+process would: the old flow between its airline and auth commits, the
+two-phase one after PREPARE TRANSACTION, either before or after the
+commit decision. A background thread runs recover_in_doubt() every
+--sweep-every seconds meanwhile, as a scheduled
+`python manage.py recover-transactions --min-age N` would: until it does,
+each in-doubt branch keeps one of the server's max_prepared_transactions
+slots and the row locks of its email.
+
+Reported per flow are sign-ups/sec, latency percentiles, statements per
+sign-up and the consistency check: passengers without credentials,
+credentials without a passenger, and transactions still prepared.
+
+    python -m benchmarks.registration_load --suffix suite_100k --registrations 5000 --threads 32
+    python -m benchmarks.registration_load --suffix suite_100k --crash-rate 0.02
+"""
+import argparse
+import logging
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Crash(Exception):
+    """A sign-up killed part-way by the benchmark"""
+
+
+def make_signups(tag, count, duplicates, crash_rate, seed):
+    """``count`` (email, crash point) sign-ups; crash point is None, "before" or "after" the decision"""
+    rng = random.Random(seed)
+    emails = []
+    signups = []
+    for n in range(count):
+        if emails and rng.random() < duplicates:
+            email = rng.choice(emails[-50:])  # recent, so likely still in flight
+        else:
+            email = f"{tag.lower()}.{n}@example.com"
+            emails.append(email)
+        crash = rng.choice(["before", "after"]) if rng.random() < crash_rate else None
+        signups.append((email, crash))
+    return signups
+
+
+def old_signup(email, crash):
+    """The registration flow app.py had before register_passenger; True if registered"""
+    from authentication import check_email_exists, register_user_credentials
+    from user_functions import add_passenger
+
+    if check_email_exists(email):
+        return False
+    passanger_id = add_passenger("Load Passenger", email, "0", "XX")
+    if crash:
+        raise Crash()
+    return register_user_credentials(passanger_id, email, "load-password")
+
+
+def tpc_signup(email, crash):
+    """register_passenger, optionally dying like a killed process; True if registered"""
+    from authentication import INSERT_CREDENTIALS_SQL, REGISTER_PASSENGER_SQL, register_passenger
+    from database import TwoPhaseCommit, hash_password
+
+    if not crash:
+        return register_passenger("Load Passenger", email, "0", "XX", "load-password") is not None
+    with TwoPhaseCommit() as tpc:
+        row = tpc.airline_execute(REGISTER_PASSENGER_SQL, ("Load Passenger", email, "0", "XX")).fetchone()
+        if row is None:
+            return False
+        tpc.prepare_auth(INSERT_CREDENTIALS_SQL, {"passanger_id": row[0], "email": email,
+                                                  "password_hash": hash_password("load-password")})
+        if crash == "after":
+            tpc.airline_execute("INSERT INTO tpc_decisions (gid) VALUES (%s); COMMIT", (tpc.gid,))
+        # The backends see their clients vanish: the airline branch is rolled
+        # back unless committed, the prepared auth branch stays in doubt
+        tpc._airline_conn.close()
+        tpc._auth_conn.close()
+        raise Crash()
+
+
+def sweep(interval, stop):
+    """Resolve in-doubt transactions older than ``interval`` every ``interval`` seconds until ``stop`` is set"""
+    from database import recover_in_doubt
+
+    while not stop.wait(interval):
+        recover_in_doubt(interval)
+
+
+def run(signup, signups, threads):
+    """(wall seconds, [latency ms], registered, crashed, failed)"""
+    outcomes = {"registered": 0, "crashed": 0, "failed": 0}
+
+    def serve(args):
+        started = time.perf_counter()
+        try:
+            outcome = "registered" if signup(*args) else None
+        except Crash:
+            outcome = "crashed"
+        except Exception:
+            outcome = "failed"
+        if outcome:
+            outcomes[outcome] += 1
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(serve, signups))
+    return time.perf_counter() - started, latencies, outcomes
+
+
+def consistency(tag):
+    """(passengers without credentials, credentials without passenger, prepared transactions) for the run"""
+    from database import TPC_GID_PREFIX, airline_connection, auth_connection
+
+    pattern = tag.lower() + ".%"
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT passanger_id, email FROM passangers WHERE email LIKE %s", (pattern,))
+        passengers = set(cur.fetchall())
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT passanger_id, email FROM user_credentials WHERE email LIKE %s", (pattern,))
+        credentials = set(cur.fetchall())
+        cur.execute("SELECT COUNT(*) FROM pg_prepared_xacts WHERE gid LIKE %s", (TPC_GID_PREFIX + "%",))
+        prepared = cur.fetchone()[0]
+    return len(passengers - credentials), len(credentials - passengers), prepared
+
+
+def teardown(tag):
+    from database import airline_connection, auth_connection
+
+    pattern = tag.lower() + ".%"
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM passangers WHERE email LIKE %s", (pattern,))
+        conn.commit()
+    with auth_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM user_credentials WHERE email LIKE %s", (pattern,))
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--registrations", type=int, default=5000, help="sign-ups per flow")
+    parser.add_argument("--threads", type=int, default=32, help="concurrent sign-ups")
+    parser.add_argument("--connections", type=int, default=20, help="database connections per pool")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of sign-ups reusing an email")
+    parser.add_argument("--crash-rate", type=float, default=0, help="share of sign-ups killed part-way")
+    parser.add_argument("--sweep-every", type=float, default=1, help="seconds between recovery sweeps")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    use_scratch_databases(*scratch_configs(args.suffix), minconn=args.connections, maxconn=args.connections)
+    from database import query_stats, recover_in_doubt
+    logging.getLogger("airline.tpc").setLevel(logging.ERROR)  # one line per simulated crash otherwise
+
+    print(f"{args.registrations:,} sign-ups per flow on {args.threads} threads, "
+          f"{args.duplicates:.0%} duplicate emails, {args.crash_rate:.0%} crashing")
+    print(f"{'flow':10} {'wall':>8} {'signups/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'stmts':>6} "
+          f"{'ok':>6} {'crashed':>8} {'failed':>7} {'orphan passengers':>18} {'orphan credentials':>19} "
+          f"{'in doubt':>9}")
+    inconsistent = False
+    for flow, signup in (("old", old_signup), ("two-phase", tpc_signup)):
+        tag = "RL" + uuid.uuid4().hex[:6].upper()
+        signups = make_signups(tag, args.registrations, args.duplicates, args.crash_rate, args.seed)
+        try:
+            stop = threading.Event()
+            sweeper = threading.Thread(target=sweep, args=(args.sweep_every, stop))
+            if flow == "two-phase":
+                sweeper.start()
+            query_stats.reset()
+            wall, latencies, outcomes = run(signup, signups, args.threads)
+            statements = sum(entry["calls"] for entry in query_stats.snapshot())
+            if flow == "two-phase":
+                stop.set()
+                sweeper.join()
+                recover_in_doubt(0)
+            orphan_passengers, orphan_credentials, prepared = consistency(tag)
+            cuts = statistics.quantiles(latencies, n=100)
+            print(f"{flow:10} {wall:>7.2f}s {len(signups) / wall:>10,.0f} {cuts[49]:>8.1f} {cuts[94]:>8.1f} "
+                  f"{cuts[98]:>8.1f} {statements / len(signups):>6.1f} {outcomes['registered']:>6,} "
+                  f"{outcomes['crashed']:>8,} {outcomes['failed']:>7,} {orphan_passengers:>18,} "
+                  f"{orphan_credentials:>19,} {prepared:>9,}")
+            inconsistent |= flow == "two-phase" and any((orphan_passengers, orphan_credentials, prepared))
+        finally:
+            teardown(tag)
+    return 1 if inconsistent else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""Read replica routing: browsing and booking sessions against a primary and its streaming replica.
+
+--sessions passenger sessions run concurrently, each doing --actions
+actions: mostly browsing (own tickets and payments, seat maps, a flight
+search), a --book share booking a seat on a throwaway flight (see
+benchmarks.async_load.setup) and paying for it. Right after each booking
+and payment the session reads its tickets, seat map and payments again
+and checks the change is there, as the UI does after every submit.
+
+The same workload runs with every read on the primary, then routed to the
+replica, then routed with replay paused on the replica (so it falls
+behind and session reads after a write must fall back to the primary).
+Reported per pass are actions/sec, latency percentiles, how reads were
+routed, checkouts per pool, and read-your-writes violations, which must
+be 0. Needs a streaming replica of the primary, e.g. one started with
+pg_basebackup -R; replay is paused with pg_wal_replay_pause(), so the
+replica user must be allowed to call it.
+
+    python -m benchmarks.replica_routing --suffix suite_100k --replica-host /tmp/pgreplica --replica-port 5433
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def session(passanger_id, flight_ids, args, seed):
+    """One passenger's actions; returns ([latency ms], read-your-writes violations)"""
+    from benchmarks.async_load import FARE
+    from database import WriteMark, bind_write_mark
+    from seatmap import normalise_seat_label
+    from user_functions import book_flight, get_seat_map, make_payment, search_flights, view_user_payments, \
+        view_user_tickets
+
+    bind_write_mark(WriteMark())  # pool threads are reused; each session starts with no writes
+    rng = random.Random(seed)
+    latencies, violations = [], 0
+    for _ in range(args.actions):
+        flight_id = rng.choice(flight_ids)
+        started = time.perf_counter()
+        if rng.random() < args.book:
+            ok, ticket_id, message = book_flight(passanger_id, flight_id)
+            if ok:
+                columns, data = view_user_tickets(passanger_id)
+                tickets = {row[0]: dict(zip(columns, row)) for row in data}
+                seat_map = get_seat_map(flight_id)
+                violations += ticket_id not in tickets or not seat_map.is_taken(
+                    seat_map.seat_index(normalise_seat_label(tickets[ticket_id]["seat_no"])))
+                ok, message = make_payment(ticket_id, FARE, "upi", passanger_id, uuid.uuid4().hex)
+                columns, data = view_user_payments(passanger_id)
+                violations += ok and ticket_id not in {row[columns.index("ticket_id")] for row in data}
+        else:
+            kind = rng.random()
+            if kind < 0.35:
+                view_user_tickets(passanger_id)
+            elif kind < 0.6:
+                view_user_payments(passanger_id)
+            elif kind < 0.85:
+                get_seat_map(flight_id)
+            else:
+                search_flights(args.origin, args.destination, limit=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, violations
+
+
+def set_replay(paused):
+    """Pause or resume WAL replay on the replica"""
+    from database import get_pool
+
+    with get_pool("airline_replica").connection() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT pg_wal_replay_{'pause' if paused else 'resume'}()")
+
+
+def run(label, passengers, flight_ids, args):
+    """One pass of every session; returns its read-your-writes violations"""
+    from database import pool_stats, replica_router, replica_stats
+
+    checkouts = {name: stats["checkouts"] for name, stats in pool_stats().items()}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        results = list(pool.map(lambda k: session(passengers[k % len(passengers)][0], flight_ids, args,
+                                                  args.seed + k), range(args.sessions)))
+    wall = time.perf_counter() - started
+    latencies = [ms for session_latencies, _ in results for ms in session_latencies]
+    violations = sum(v for _, v in results)
+    cuts = statistics.quantiles(latencies, n=100)
+    routed = replica_stats() if replica_router.enabled else {}
+    used = {name: stats["checkouts"] - checkouts.get(name, 0) for name, stats in pool_stats().items()}
+    print(f"{label:16} {wall:>7.2f}s {len(latencies) / wall:>9,.0f} {cuts[49]:>8.1f} {cuts[94]:>8.1f} "
+          f"{cuts[98]:>8.1f} {routed.get('replica', 0):>8,} {routed.get('primary_behind', 0):>7,} "
+          f"{routed.get('replay_checks', 0):>7,} {used.get('airline', 0):>9,} {used.get('airline_replica', 0):>9,} "
+          f"{violations:>5,}")
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suffix", default="bench", help="scratch database suffix")
+    parser.add_argument("--replica-host", default="localhost", help="replica host or socket directory")
+    parser.add_argument("--replica-port", type=int, default=5433)
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent passenger sessions")
+    parser.add_argument("--actions", type=int, default=200, help="actions per session")
+    parser.add_argument("--book", type=float, default=0.1, help="share of actions booking and paying")
+    parser.add_argument("--flights", type=int, default=20, help="throwaway flights to book on")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from benchmarks.async_load import sample_passengers, setup, teardown
+    from benchmarks.scratch import scratch_configs, use_scratch_databases
+    from database import configure_pool, replica_router
+    airline_config, auth_config = scratch_configs(args.suffix)
+    use_scratch_databases(airline_config, auth_config, minconn=args.sessions, maxconn=args.sessions)
+    configure_pool("airline_replica", {**airline_config, "host": args.replica_host, "port": args.replica_port},
+                   minconn=args.sessions, maxconn=args.sessions)
+
+    tag = "RR" + uuid.uuid4().hex[:6].upper()
+    fixtures = setup(tag, args.flights, args.sessions * args.actions * 3 * args.book // args.flights + 10)
+    args.origin, args.destination = f"L{tag}O", f"L{tag}D"
+    try:
+        passengers = sample_passengers(args.sessions, args.seed)
+        print(f"{args.sessions} sessions x {args.actions} actions, {args.book:.0%} booking and paying")
+        print(f"{'reads':16} {'wall':>8} {'actions/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'replica':>8} {'behind':>7} {'checks':>7} {'primary':>9} {'replica':>9} {'stale':>5}")
+        replica_router.reset(enabled=False)
+        violations = run("primary only", passengers, fixtures[2], args)
+        replica_router.reset(enabled=True)
+        violations += run("replica", passengers, fixtures[2], args)
+        replica_router.reset(enabled=True)
+        set_replay(paused=True)
+        try:
+            violations += run("replay paused", passengers, fixtures[2], args)
+        finally:
+            set_replay(paused=False)
+        return 1 if violations else 0
+    finally:
+        teardown(tag, fixtures)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
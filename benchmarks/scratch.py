@@ -0,0 +1,56 @@
+"""Throwaway copies of the airline and auth databases for benchmarks and plan checks.
+
+Scratch databases live on the same server as db_config.py points at, named
+``<database>_<suffix>``, and are migrated with the normal migration lists.
+The real databases are never touched.
+"""
+import psycopg2
+from psycopg2 import sql
+
+from database import configure_pool
+from db_config import AIRLINE_DB_CONFIG, AIRLINE_REPLICA_DB_CONFIG, AUTH_DB_CONFIG, POSTGRES_DEFAULT_CONFIG
+from migrations import apply_migrations, create_database_if_missing
+
+
+def scratch_configs(suffix):
+    return ({**AIRLINE_DB_CONFIG, "database": f"{AIRLINE_DB_CONFIG['database']}_{suffix}"},
+            {**AUTH_DB_CONFIG, "database": f"{AUTH_DB_CONFIG['database']}_{suffix}"})
+
+
+def connect(config, **kwargs):
+    return psycopg2.connect(**config, **kwargs)
+
+
+def drop_scratch_databases(suffix):
+    conn = psycopg2.connect(**POSTGRES_DEFAULT_CONFIG)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for config in scratch_configs(suffix):
+                cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)")
+                            .format(sql.Identifier(config["database"])))
+    finally:
+        conn.close()
+
+
+def create_scratch_databases(suffix, fresh=False):
+    """Create and migrate the scratch databases. Returns (airline_config, auth_config)"""
+    if fresh:
+        drop_scratch_databases(suffix)
+    airline_config, auth_config = scratch_configs(suffix)
+    for db, config in (("airline", airline_config), ("auth", auth_config)):
+        create_database_if_missing(config["database"])
+        apply_migrations(db, connect=lambda config=config: connect(config))
+    return airline_config, auth_config
+
+
+def use_scratch_databases(airline_config, auth_config, **pool_config):
+    """Point the process-wide pools (and so every app function) at the scratch databases.
+
+    A configured replica streams the whole primary, so it has the scratch databases too.
+    """
+    configure_pool("airline", airline_config, **pool_config)
+    configure_pool("auth", auth_config, **pool_config)
+    if AIRLINE_REPLICA_DB_CONFIG is not None:
+        configure_pool("airline_replica", {**AIRLINE_REPLICA_DB_CONFIG, "database": airline_config["database"]},
+                       **pool_config)
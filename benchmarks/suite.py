@@ -0,0 +1,519 @@
+"""Timed benchmark of every public function in admin_functions.py,
+user_functions.py and authentication.py.
+
+Each function is called repeatedly against a scratch database filled by
+benchmarks.datagen at one of its standard scales, and the latency
+percentiles and throughput are written as JSON, along with the
+per-statement breakdown recorded by database.query_stats, so runs can be
+compared across commits:
+
+    python -m benchmarks.suite --scale 100k --load --output before.json
+    python -m benchmarks.suite --scale 100k --output after.json --compare before.json
+
+Reads draw their arguments from the loaded data with a fixed seed. Writes
+create their own rows (flight numbers, models and emails starting with
+BENCH) and the matching delete benchmarks remove them again, so the data
+set is left as loaded apart from sequence values. Listings that return a
+whole table run only --full-iterations times (or not at all with
+--skip-full).
+"""
+import argparse
+import inspect
+import io
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.datagen import PASSWORD, SCALES, airport_code
+
+PREFIX = "BENCH"
+MODULES = ["admin_functions", "user_functions", "authentication"]
+
+# Public functions left out: a helper that runs on a caller's cursor, and the
+# reset that would wipe the statement stats this suite reports
+NOT_ENTRY_POINTS = {"record_deleted_tickets", "reset_query_stats",
+                    # No I/O - shared by the sync functions and async_user_functions
+                    "seat_map_of", "next_seat_claim", "booking_message", "payment_error", "unpaid_result",
+                    "pay_ticket_params", "login_result"}
+
+# Items per call of the *_bulk write benchmarks
+BULK_BATCH = 10
+
+# Benchmark kinds: reads and writes run --iterations times, full-table reads --full-iterations
+READ, WRITE, FULL = "read", "write", "full"
+
+
+def percentile(timings, p):
+    """Nearest-rank percentile of sorted timings"""
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def rows_of(result):
+    """Rows a call returned or touched, for rows/sec: listings count their rows, single-row calls count 1"""
+    if isinstance(result, tuple) and len(result) >= 2 and isinstance(result[1], list):
+        return len(result[1])  # (columns, data[, next_after_id])
+    if isinstance(result, dict) and "rows" in result:
+        return result["rows"]  # bulk_import
+    if isinstance(result, bool) or result is None:
+        return 1
+    if isinstance(result, int):
+        return result  # rowcount, rows exported, flights checked or bulk items
+    return 1
+
+
+def ok(result, message=None):
+    """Raise unless an app call reporting success (alone or as (success, ..., message)) succeeded"""
+    succeeded = result[0] if isinstance(result, tuple) else result
+    if not succeeded:
+        raise RuntimeError(message or result[-1])
+    return result
+
+
+def drain(batches):
+    """Consume an iter_* generator; returns the row count"""
+    return sum(len(rows) for _, rows in batches)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(dirty.stdout.strip())
+
+
+def sample_data(cur, rng, count):
+    """Pick ``count`` of each kind of row for the benchmarks to act on, reproducibly for a seed"""
+    from seatmap import SeatMap
+
+    def pick(sql, params=()):
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        return rng.sample(rows, min(count, len(rows)))
+
+    data = {}
+    for table, key in [("passangers", "passanger_id"), ("flights", "flight_id"),
+                       ("tickets", "ticket_id"), ("payments", "payment_id")]:
+        cur.execute(f"SELECT MAX({key}) FROM {table}")
+        data[f"max_{key}"] = cur.fetchone()[0]
+    cur.execute("""
+        SELECT DISTINCT p.passanger_id, p.email FROM tickets t
+        JOIN passangers p ON p.passanger_id = t.passanger_id
+        WHERE t.ticket_id = ANY(%s) ORDER BY p.passanger_id
+    """, (rng.sample(range(1, data["max_ticket_id"] + 1), min(count, data["max_ticket_id"])),))
+    data["passengers"] = cur.fetchall()
+    data["tickets"] = rng.sample(range(1, data["max_ticket_id"] + 1), min(count, data["max_ticket_id"]))
+    data["flights"] = pick("SELECT flight_id, flight_number FROM flights ORDER BY flight_id")
+    data["routes"] = pick("""
+        SELECT DISTINCT o.code, d.code FROM flights f
+        JOIN airports o ON o.airport_id = f.origin_airport_id
+        JOIN airports d ON d.airport_id = f.destination_airport_id
+        WHERE f.departure_time > NOW() ORDER BY 1, 2
+    """)
+
+    # Future flights with room: half for auto-assigned bookings, half with one
+    # free seat picked up front for book_flight[seat], so the two never collide
+    cur.execute("""
+        SELECT fi.flight_id, a.seat_capacity, a.seats_per_row, fi.seat_bitmap
+        FROM flight_inventory fi
+        JOIN flights f ON f.flight_id = fi.flight_id
+        JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        WHERE f.departure_time > NOW() + INTERVAL '1 day' AND fi.booked_seats < a.seat_capacity - 10
+        ORDER BY fi.flight_id
+    """)
+    open_flights = cur.fetchall()
+    rng.shuffle(open_flights)
+    half = min(count, len(open_flights) // 2)
+    data["open_flights"] = [flight_id for flight_id, *_ in open_flights[:half]]
+    seats = [[(flight_id, seat_no) for seat_no in rng.sample(free, len(free))]
+             for flight_id, free in ((flight_id, SeatMap(capacity, per_row, bitmap).free_seats())
+                                     for flight_id, capacity, per_row, bitmap in open_flights[half:2 * half])]
+    # Round-robin over the flights, so small data sets reuse a flight with another seat
+    data["open_seats"] = [flight[k] for k in range(max(map(len, seats), default=0))
+                          for flight in seats if k < len(flight)][:count]
+
+    cur.execute("SELECT airport_id, code FROM airports ORDER BY airport_id")
+    data["airports"] = cur.fetchall()
+    cur.execute("SELECT aircraft_id, model FROM aircrafts WHERE model NOT LIKE %s ORDER BY aircraft_id",
+                (PREFIX + "%",))
+    data["aircrafts"] = cur.fetchall()
+    return data
+
+
+def import_file(data, n, flights=100):
+    """CSV of ``flights`` new flights for bulk_import, numbered apart for each call ``n``"""
+    (_, origin), (_, destination) = data["airports"][:2]
+    model = data["aircrafts"][0][1]
+    lines = ["flight_number,origin_code,destination_code,departure_time,arrival_time,aircraft_model,fare"]
+    lines += [f"{PREFIX}I{n}-{k},{origin},{destination},2099-02-{k % 28 + 1:02d} 10:00,"
+              f"2099-02-{k % 28 + 1:02d} 12:00,{model},{100 + k}" for k in range(flights)]
+    return io.BytesIO("\n".join(lines).encode())
+
+
+def benchmarks(data, rng, state):
+    """(name, kind, call[, setup]) in run order. call(n) gets the iteration number, counting
+    warm-up runs from 0; the optional setup runs untimed before the first call.
+
+    Writes append what they created to ``state`` for the benchmarks that
+    clean it up further down the list.
+    """
+    import admin_functions as admin
+    import authentication as auth
+    import user_functions as user
+    from database import airline_connection
+
+    pick = rng.choice
+    today = date.today()
+    week = dict(depart_from=today, depart_to=today + timedelta(days=7))
+    paid_week = dict(paid_from=today - timedelta(days=7), paid_to=today)
+    airport_ids = [airport_id for airport_id, _ in data["airports"]]
+    aircraft_ids = [aircraft_id for aircraft_id, _ in data["aircrafts"]]
+
+    def add_flight(n):
+        origin, destination = rng.sample(airport_ids, 2)
+        departure = datetime(2099, 1, 1) + timedelta(minutes=n)
+        state["flights"].append(f"{PREFIX}{n}")
+        admin.add_flight(f"{PREFIX}{n}", origin, destination, departure, departure + timedelta(hours=2),
+                         pick(aircraft_ids), 1000)
+
+    def add_passenger(n):
+        email = f"{PREFIX.lower()}{n}@example.com"
+        passanger_id = user.add_passenger("Bench Passenger", email, "0", "XX")
+        state["passengers"].append((passanger_id, email))
+
+    def register_passenger(n):
+        email = f"{PREFIX.lower()}.registered{n}@example.com"
+        passanger_id = ok(auth.register_passenger("Bench Passenger", email, "0", "XX", PASSWORD), "email taken")
+        state["passengers"].append((passanger_id, email))
+
+    def book(n, seat=False):
+        passanger_id, _ = pick(data["passengers"])
+        flight_id, seat_no = data["open_seats"][n] if seat else (pick(data["open_flights"]), None)
+        _, ticket_id, _ = result = ok(user.book_flight(passanger_id, flight_id, seat_no))
+        state["booked"].append((ticket_id, passanger_id))
+        return result
+
+    def pay(n):
+        ticket_id, passanger_id = state["booked"][n]
+        state["paid"].append(ticket_id)
+        return ok(user.make_payment(ticket_id, user.get_ticket_fare(ticket_id), "upi", passanger_id,
+                                    f"{PREFIX}-pay-{n}"))
+
+    def pay_again(n):
+        # A client retry: same key, answered from the first payment
+        ticket_id, passanger_id = state["booked"][n]
+        return ok(user.make_payment(ticket_id, user.get_ticket_fare(ticket_id), "upi", passanger_id,
+                                    f"{PREFIX}-pay-{n}"))
+
+    def add_flights_bulk(n):
+        origin, destination = rng.sample(airport_ids, 2)
+        departure = datetime(2099, 3, 1) + timedelta(hours=n)
+        outcomes = admin.add_flights_bulk(
+            [(f"{PREFIX}B{n}-{k}", origin, destination, departure + timedelta(minutes=k),
+              departure + timedelta(minutes=k + 120), pick(aircraft_ids), 1000) for k in range(BULK_BATCH)])
+        state["bulk_flights"] += [flight_id for flight_id, error in outcomes if error is None]
+        return len(outcomes)
+
+    def book_batches():
+        # Untimed: BULK_BATCH bookings per batch spread over the empty flights
+        # add_flights_bulk created, the first half of each batch paid
+        flights = itertools.cycle(state["bulk_flights"])
+        for _ in range(len(data["tickets"])):
+            batch = []
+            for k in range(BULK_BATCH):
+                passanger_id, _ = pick(data["passengers"])
+                _, ticket_id, _ = ok(user.book_flight(passanger_id, next(flights)))
+                if k < BULK_BATCH // 2:
+                    ok(user.make_payment(ticket_id, user.get_ticket_fare(ticket_id), "upi", passanger_id))
+                batch.append(ticket_id)
+            state["batches"].append(batch)
+
+    def find_batch_payments():
+        with airline_connection() as conn, conn.cursor() as cur:
+            for batch in state["batches"]:
+                cur.execute("SELECT payment_id FROM payments WHERE ticket_id = ANY(%s)", (batch,))
+                state["batch_payments"].append([payment_id for (payment_id,) in cur.fetchall()])
+
+    def find_payments():
+        with airline_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT payment_id FROM payments WHERE ticket_id = ANY(%s)", (state["paid"],))
+            state["payments"] = [payment_id for (payment_id,) in cur.fetchall()]
+
+    def remaining(key):
+        # Pops the next created row to clean up, or None once all are gone
+        return state[key].pop() if state[key] else None
+
+    return [
+        # Reference data (cached process-wide, as the app sees it)
+        ("get_aircrafts", READ, lambda n: admin.get_aircrafts()),
+        ("get_airports", READ, lambda n: admin.get_airports()),
+        ("get_flight_metadata", READ, lambda n: admin.get_flight_metadata()),
+        # Admin listings
+        ("view_flights", FULL, lambda n: admin.view_flights()),
+        ("view_flights_page", READ,
+         lambda n: admin.view_flights_page(after_id=rng.randint(0, data["max_flight_id"]))),
+        ("view_flights_page[flight_number]", READ,
+         lambda n: admin.view_flights_page(flight_number=pick(data["flights"])[1])),
+        ("view_passengers", FULL, lambda n: admin.view_passengers()),
+        ("view_passengers_page", READ,
+         lambda n: admin.view_passengers_page(after_id=rng.randint(0, data["max_passanger_id"]))),
+        ("view_passengers_page[search]", READ,
+         lambda n: admin.view_passengers_page(search=pick(data["passengers"])[1])),
+        ("iter_passengers[nationality]", FULL, lambda n: drain(admin.iter_passengers(nationality="IN"))),
+        ("view_all_tickets", FULL, lambda n: admin.view_all_tickets()),
+        ("view_all_tickets_page", READ,
+         lambda n: admin.view_all_tickets_page(after_id=rng.randint(0, data["max_ticket_id"]))),
+        ("view_all_tickets_page[email]", READ,
+         lambda n: admin.view_all_tickets_page(email=pick(data["passengers"])[1])),
+        ("iter_all_tickets[week]", READ, lambda n: drain(admin.iter_all_tickets(**week))),
+        ("export_all_tickets[week]", READ, lambda n: admin.export_all_tickets(io.BytesIO(), **week)),
+        ("export_all_tickets", FULL, lambda n: admin.export_all_tickets(io.BytesIO(), compress=True)),
+        ("view_all_payments", FULL, lambda n: admin.view_all_payments()),
+        ("view_all_payments_page", READ,
+         lambda n: admin.view_all_payments_page(after_id=rng.randint(0, data["max_payment_id"]))),
+        ("iter_all_payments[week]", READ, lambda n: drain(admin.iter_all_payments(**paid_week))),
+        ("export_all_payments[week]", READ, lambda n: admin.export_all_payments(io.BytesIO(), **paid_week)),
+        # Analytics (cleared before every call, so each one queries)
+        ("analytics_summary[window]", READ, lambda n: admin.analytics_summary(**week)),
+        ("flight_load_factors[window]", READ, lambda n: admin.flight_load_factors(**week)),
+        ("daily_revenue[window]", READ, lambda n: admin.daily_revenue(**week)),
+        ("route_daily_revenue[window]", READ, lambda n: admin.route_daily_revenue(**week)),
+        ("route_cancellation_rates", READ, lambda n: admin.route_cancellation_rates()),
+        ("diagnostics_report", READ, lambda n: admin.diagnostics_report()),
+        ("hold_backlog", READ, lambda n: admin.hold_backlog()),
+        ("view_hold_sweepers", READ, lambda n: admin.view_hold_sweepers()),
+        # Passenger reads
+        ("get_available_flights", FULL, lambda n: user.get_available_flights()),
+        ("search_flights", READ, lambda n: user.search_flights()),
+        ("search_flights[route]", READ, lambda n: user.search_flights(*pick(data["routes"]), sort="fare")),
+        ("search_flights[window]", READ, lambda n: user.search_flights(max_fare=5000, **week)),
+        ("get_seat_map", READ, lambda n: user.get_seat_map(pick(data["flights"])[0])),
+        ("get_ticket_fare", READ, lambda n: user.get_ticket_fare(pick(data["tickets"]))),
+        ("view_user_tickets", READ, lambda n: user.view_user_tickets(pick(data["passengers"])[0])),
+        ("view_user_payments", READ, lambda n: user.view_user_payments(pick(data["passengers"])[0])),
+        # Authentication
+        ("verify_admin", READ, lambda n: auth.verify_admin("admin", "wrong-password")),
+        ("check_email_exists", READ, lambda n: auth.check_email_exists(pick(data["passengers"])[1])),
+        ("verify_user_login", READ, lambda n: auth.verify_user_login(pick(data["passengers"])[1], PASSWORD)),
+        # Writes, each followed further down by the benchmark that undoes it
+        ("add_aircraft", WRITE,
+         lambda n: state["aircrafts"].append(f"{PREFIX}-{n}") or admin.add_aircraft(f"{PREFIX}-{n}", "Bench", 180)),
+        ("add_airport", WRITE,
+         lambda n: state["airports"].append(airport_code(17575 - n)) or admin.add_airport(
+             airport_code(17575 - n), "Bench Airport", "Bench", "XX")),
+        ("add_flight", WRITE, add_flight),
+        ("add_flights_bulk", WRITE, add_flights_bulk),
+        ("bulk_import[flights]", WRITE, lambda n: admin.bulk_import("flights", import_file(data, n))),
+        ("add_passenger", WRITE, add_passenger),
+        ("register_user_credentials", WRITE,
+         lambda n: ok(auth.register_user_credentials(*state["passengers"][n], PASSWORD), "duplicate credentials")),
+        ("register_passenger", WRITE, register_passenger),
+        ("book_flight", WRITE, book),
+        ("book_flight[seat]", WRITE, lambda n: book(n, seat=True)),
+        ("make_payment", WRITE, pay),
+        ("make_payment[retry]", WRITE, pay_again),
+        ("cancel_ticket", WRITE, lambda n: user.cancel_ticket(*state["booked"][-1 - n])),
+        ("cancel_tickets_bulk", WRITE,
+         lambda n: len(user.cancel_tickets_bulk(state["batches"][n][BULK_BATCH // 2:])), book_batches),
+        # A sweep with nothing due, so the dataset's own pending tickets stay untouched
+        ("expire_pending_holds[idle]", WRITE, lambda n: admin.expire_pending_holds(ttl_minutes=10 ** 7)),
+        ("delete_payments_bulk", WRITE,
+         lambda n: len(admin.delete_payments_bulk(state["batch_payments"][n])), find_batch_payments),
+        ("delete_tickets_bulk", WRITE, lambda n: len(admin.delete_tickets_bulk(state["batches"][n]))),
+        ("delete_payment_by_id", WRITE, lambda n: admin.delete_payment_by_id(state["payments"][n]), find_payments),
+        ("delete_ticket_by_id", WRITE, lambda n: admin.delete_ticket_by_id(remaining("booked")[0])),
+        ("delete_flight_by_number", WRITE, lambda n: admin.delete_flight_by_number(remaining("flights"))),
+        ("delete_airport_by_code", WRITE, lambda n: admin.delete_airport_by_code(remaining("airports"))),
+        ("delete_aircraft_by_model", WRITE, lambda n: admin.delete_aircraft_by_model(remaining("aircrafts"))),
+        ("delete_passenger_completely", WRITE,
+         lambda n: admin.delete_passenger_completely(remaining("passengers")[1])),
+        ("reconcile_flight_inventory", FULL, lambda n: admin.reconcile_flight_inventory()[0]),
+    ]
+
+
+def uncovered(names):
+    """Public entry points of MODULES that no benchmark name starts with"""
+    import importlib
+
+    covered = {name.split("[")[0] for name in names}
+    missing = []
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name, fn in inspect.getmembers(module, inspect.isfunction):
+            if (fn.__module__ == module_name and not name.startswith("_")
+                    and name not in covered and name not in NOT_ENTRY_POINTS):
+                missing.append(f"{module_name}.{name}")
+    return missing
+
+
+def cleanup(state):
+    """Remove whatever the write benchmarks created and did not delete again (untimed)"""
+    import admin_functions as admin
+    from database import airline_connection
+
+    for ticket_id, _ in state["booked"]:
+        admin.delete_ticket_by_id(ticket_id)
+    for _, email in state["passengers"]:
+        admin.delete_passenger_completely(email)
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_number LIKE %s", (PREFIX + "%",))
+        conn.commit()
+    for code in state["airports"]:
+        admin.delete_airport_by_code(code)
+    for model in state["aircrafts"]:
+        admin.delete_aircraft_by_model(model)
+
+
+def run(call, iterations, warmup):
+    """Time ``iterations`` calls after ``warmup`` untimed ones"""
+    from cache import analytics_cache
+
+    timings, rows = [], 0
+    for n in range(warmup + iterations):
+        analytics_cache.clear()
+        started = time.perf_counter()
+        result = call(n)
+        elapsed = time.perf_counter() - started
+        if n >= warmup:
+            timings.append(elapsed * 1000)
+            rows += rows_of(result)
+    timings.sort()
+    total = sum(timings) / 1000
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "rows": rows,
+        "rows_per_sec": round(rows / total, 1) if total else None,
+    }
+
+
+def compare(results, previous, threshold):
+    """Print p50/p95 against an earlier run; returns the benchmarks slower than ``threshold`` x"""
+    slower = []
+    print(f"\n{'benchmark':36} {'p50 before':>11} {'p50 after':>10} {'ratio':>6} {'p95 ratio':>9}")
+    for name, got in results.items():
+        before = previous.get(name)
+        if not before or "p50_ms" not in got or "p50_ms" not in before:
+            continue
+        ratio = got["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        ratio95 = got["p95_ms"] / before["p95_ms"] if before["p95_ms"] else float("inf")
+        flag = " ⚠️" if ratio > threshold else ""
+        if flag:
+            slower.append(name)
+        print(f"{name:36} {before['p50_ms']:>9.2f}ms {got['p50_ms']:>8.2f}ms {ratio:>5.2f}x {ratio95:>8.2f}x{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Timed benchmark suite")
+    parser.add_argument("--scale", choices=SCALES, default="100k", help="data set size")
+    parser.add_argument("--load", action="store_true", help="(re)load the data set first")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--full-iterations", type=int, default=3, help="runs of whole-table listings")
+    parser.add_argument("--skip-full", action="store_true", help="skip whole-table listings")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio reported as slower")
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    from benchmarks.scratch import connect, create_scratch_databases, use_scratch_databases
+
+    suffix = f"suite_{args.scale}"
+    airline_config, auth_config = create_scratch_databases(suffix)
+    conn = connect(airline_config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT NOT EXISTS (SELECT 1 FROM tickets), current_setting('server_version')")
+            empty, server_version = cur.fetchone()
+        if args.load or empty:
+            from benchmarks.datagen import load, load_credentials
+            started = time.perf_counter()
+            counts = load(conn, SCALES[args.scale])
+            auth_conn = connect(auth_config)
+            try:
+                load_credentials(auth_conn, counts["passangers"])
+            finally:
+                auth_conn.close()
+            print(f"Loaded {args.scale} in {time.perf_counter() - started:.1f}s: {counts}", file=sys.stderr)
+        with conn.cursor() as cur:
+            data = sample_data(cur, rng, max(args.iterations + args.warmup, 50))
+        conn.commit()
+    finally:
+        conn.close()
+    use_scratch_databases(airline_config, auth_config)
+    from database import query_stats
+    query_stats.reset()
+
+    state = {"aircrafts": [], "airports": [], "flights": [], "passengers": [], "booked": [], "paid": [],
+             "bulk_flights": [], "batches": [], "batch_payments": []}
+    suite = benchmarks(data, rng, state)
+    results = {}
+    try:
+        for name, kind, call, *setup in suite:
+            if (args.only and args.only not in name) or (kind == FULL and args.skip_full):
+                continue
+            iterations, warmup = (args.full_iterations, 0) if kind == FULL else (args.iterations, args.warmup)
+            try:
+                for prepare in setup:
+                    prepare()
+                results[name] = run(call, iterations, warmup)
+            except Exception as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+            got = results[name]
+            print(f"{name:36} " + (f"p50={got['p50_ms']:>9.2f}ms p95={got['p95_ms']:>9.2f}ms "
+                                   f"p99={got['p99_ms']:>9.2f}ms {got['rows_per_sec'] or 0:>12,.0f} rows/s"
+                                   if "error" not in got else f"❌ {got['error']}"), file=sys.stderr)
+    finally:
+        cleanup(state)
+
+    commit, dirty = git_commit()
+    report = {
+        "meta": {
+            "commit": commit, "dirty": dirty, "scale": args.scale, "tickets": SCALES[args.scale],
+            "iterations": args.iterations, "warmup": args.warmup, "full_iterations": args.full_iterations,
+            "seed": args.seed, "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "postgres": server_version, "machine": platform.machine(),
+        },
+        "results": results,
+        "uncovered": uncovered(name for name, *_ in suite),
+        # Per-statement breakdown of the same run (see database.QueryStats)
+        "statements": query_stats.snapshot(),
+    }
+    if report["uncovered"]:
+        print(f"⚠️ Not benchmarked: {', '.join(report['uncovered'])}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    failed = [name for name, got in results.items() if "error" in got]
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        slower = compare(results, previous["results"], args.threshold)
+        print(f"\n{len(slower)} benchmark(s) slower than {args.threshold}x" if slower
+              else "\n✅ No benchmark slower than the earlier run")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from db_config import REFERENCE_CACHE_CONFIG, ANALYTICS_CACHE_CONFIG, VIEW_CACHE_CONFIG
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after ``ttl`` seconds.
+
+    One instance is shared by every Streamlit session in the process. Writers
+    call ``invalidate()`` after committing so readers never see data older
+    than their own change; the TTL only bounds staleness from writes made by
+    other processes (change_feed.py evicts those as they are notified). An
+    invalidation only discards loads of the keys it names, so a stream of
+    invalidations doesn't keep the rest of the cache from filling.
+    """
+
+    def __init__(self, name, maxsize=128, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._generation = 0
+        self._cleared_at = 0            # generation of the last clear()
+        self._invalidated_at = {}       # key -> generation of its last invalidation since then
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling ``loader()`` to fill it on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # Don't store a value that was loaded before an invalidation of it landed
+            if self._cleared_at <= generation and self._invalidated_at.get(key, 0) <= generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the given keys; with no keys this does nothing (use ``clear()``)"""
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            if len(self._invalidated_at) + len(keys) <= 4 * self.maxsize:
+                for key in keys:
+                    self._entries.pop(key, None)
+                    self._invalidated_at[key] = self._generation
+            else:
+                # Too many keys to remember: treat loads in flight as stale, keep the entries
+                for key in keys:
+                    self._entries.pop(key, None)
+                self._cleared_at = self._generation
+                self._invalidated_at.clear()
+
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._entries.clear()
+            self._cleared_at = self._generation
+            self._invalidated_at.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+# Airports, aircraft and flight metadata (no seat counts) - shared by all sessions
+reference_cache = TTLCache("reference", **REFERENCE_CACHE_CONFIG)
+
+# Analytics aggregates - expire by TTL, booking writes don't invalidate them
+analytics_cache = TTLCache("analytics", **ANALYTICS_CACHE_CONFIG)
+
+# Tickets and payments per passenger, seat maps per flight - evicted by the
+# change feed (see change_feed.cached_view) and by this process's writers
+view_cache = TTLCache("views", **VIEW_CACHE_CONFIG)
+
+_caches = [reference_cache, analytics_cache, view_cache]
+
+
+def register_cache(cache):
+    _caches.append(cache)
+    return cache
+
+
+def cache_stats():
+    """Hit/miss counters for every process-wide cache, keyed by cache name"""
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,201 @@
+"""Process-wide listener for the airline database's change notifications.
+
+Airline migration 11 makes every statement changing tickets, payments or
+flights NOTIFY the airline_changes channel with the flights and
+passengers it touched; since migration 13 deleting tickets also reports
+the payments deleted with them. One ChangeFeed thread per process
+LISTENs on a connection of its own and, per notification:
+
+  * evicts the view_cache entries of those flights and passengers (seat
+    maps, tickets, payments - a ticket change evicts its passenger's
+    payments too) - every other cached view stays;
+  * for flight changes, also drops the flight metadata, the connecting
+    flight graph, the analytics results and all cached views, as
+    schedules show up in every one of them;
+  * bumps the versions that live Streamlit fragments compare to decide
+    whether to fetch again (see app.py), so open dashboards refresh only
+    what changed instead of polling.
+
+cached_view() uses view_cache only while the feed is listening. Writers in
+this process evict what they changed themselves right after committing,
+so a session sees its own change before its notification arrives. When
+the listening connection drops, notifications sent meanwhile are lost:
+everything is evicted once it is back.
+"""
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+
+from cache import analytics_cache, reference_cache, view_cache
+from database import get_pool, note_primary_position, replica_router
+from db_config import CHANGE_FEED_CONFIG
+from itinerary import flight_graph
+from migrations import CHANGE_CHANNEL
+
+change_log = logging.getLogger("airline.change_feed")
+
+# Per-flight and per-passenger versions kept before they are all reset at once
+MAX_TRACKED = 100_000
+
+
+class ChangeFeed:
+    """The listening thread, its fan-out to the caches and the change versions"""
+
+    def __init__(self, reconnect_seconds):
+        self.reconnect_seconds = reconnect_seconds
+        self.connected = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._counter = 0        # one tick per change applied
+        self._changed = {}       # topic -> tick of its last change
+        self._everything = 0     # tick of the last change to unknown rows
+        self._notifications = 0
+        self._reconnects = 0
+
+    def start(self):
+        """Start listening in a daemon thread, once per process"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def version(self, *topics):
+        """Changes seen so far to any of ``topics``: "tickets", "payments", "flights",
+        ("flight", flight_id) or ("passenger", passanger_id). Compare two calls to tell
+        whether something changed in between."""
+        with self._lock:
+            return max([self._everything] + [self._changed.get(topic, 0) for topic in topics])
+
+    def apply(self, change):
+        """Evict and bump what one notification payload (a dict) says changed"""
+        table = change["table"]
+        flights, passengers = change.get("flights", []), change.get("passengers", [])
+        if change.get("all") or table == "flights":
+            view_cache.clear()
+        else:
+            keys = [(table, passanger_id) for passanger_id in passengers]
+            if table == "tickets":
+                # Deleting a ticket deletes its payments too, by cascade
+                keys += [("seat_map", flight_id) for flight_id in flights]
+                keys += [("payments", passanger_id) for passanger_id in passengers]
+            if keys:
+                view_cache.invalidate(*keys)
+        if table == "flights":
+            reference_cache.invalidate("flight_metadata")
+            analytics_cache.clear()
+            flight_graph.invalidate()
+
+        with self._lock:
+            self._counter += 1
+            self._changed[table] = self._counter
+            if change.get("all"):
+                self._everything = self._counter
+            for flight_id in flights:
+                self._changed[("flight", flight_id)] = self._counter
+            for passanger_id in passengers:
+                self._changed[("passenger", passanger_id)] = self._counter
+            if len(self._changed) > MAX_TRACKED:
+                self._changed.clear()
+                self._everything = self._counter
+
+    def _lost_changes(self):
+        """Evict everything: notifications may have been missed"""
+        for cache in (view_cache, analytics_cache):
+            cache.clear()
+        reference_cache.invalidate("flight_metadata")
+        flight_graph.invalidate()
+        with self._lock:
+            self._counter += 1
+            self._everything = self._counter
+
+    def _listen(self):
+        conn = psycopg2.connect(**get_pool("airline").db_config)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANGE_CHANNEL}")
+        return conn
+
+    def _drain(self, conn):
+        conn.poll()
+        notifies = list(conn.notifies)
+        conn.notifies.clear()
+        if not notifies:
+            return
+        if replica_router.enabled:
+            # Cached views are shared by all sessions: once evicted, reload them
+            # only from a replica that has replayed these changes
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_current_wal_lsn()")
+                note_primary_position(cur.fetchone()[0])
+        for notify in notifies:
+            try:
+                self.apply(json.loads(notify.payload))
+            except (ValueError, KeyError) as e:
+                change_log.warning("Ignoring malformed change notification %r: %s", notify.payload, e)
+            except Exception:
+                # A payload of the wrong shape must not kill the listener
+                change_log.exception("Ignoring change notification %r", notify.payload)
+        with self._lock:
+            self._notifications += len(notifies)
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._listen()
+                self._lost_changes()
+                self.connected = True
+                while not self._stop.is_set():
+                    # Wakes up now and then to notice stop()
+                    if select.select([conn], [], [], 1.0)[0]:
+                        self._drain(conn)
+            except psycopg2.Error as e:
+                self.connected = False
+                change_log.warning("Change feed disconnected, reconnecting in %ss: %s", self.reconnect_seconds, e)
+                self._reconnect()
+            except Exception:
+                # e.g. OSError from select(): still reconnect rather than stop caching for good
+                self.connected = False
+                change_log.exception("Change feed failed, reconnecting in %ss", self.reconnect_seconds)
+                self._reconnect()
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+    def _reconnect(self):
+        with self._lock:
+            self._reconnects += 1
+        self._stop.wait(self.reconnect_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {"connected": self.connected, "notifications": self._notifications,
+                    "changes": self._counter, "tracked": len(self._changed), "reconnects": self._reconnects}
+
+
+change_feed = ChangeFeed(CHANGE_FEED_CONFIG["reconnect_seconds"])
+
+
+def start_change_feed():
+    """Start this process's listener (idempotent); returns the feed"""
+    return change_feed.start()
+
+
+def cached_view(key, loader):
+    """``loader()`` through view_cache while the feed is listening, so other processes' changes
+    evict it; straight from the database otherwise"""
+    if not change_feed.connected:
+        return loader()
+    return view_cache.get_or_load(key, loader)
@@ -1,89 +1,1016 @@
-import psycopg2
-import hashlib
-from db_config import AIRLINE_DB_CONFIG, AUTH_DB_CONFIG, POSTGRES_DEFAULT_CONFIG
-
-
-def get_airline_connection():
-    return psycopg2.connect(**AIRLINE_DB_CONFIG)
-
-
-def get_auth_connection():
-    return psycopg2.connect(**AUTH_DB_CONFIG)
-
-def create_auth_database():
-    try:
-        # Connect to default postgres database
-        conn = psycopg2.connect(**POSTGRES_DEFAULT_CONFIG)
-        conn.autocommit = True
-        cur = conn.cursor()
-
-        # Create database if not exists
-        cur.execute("SELECT 1 FROM pg_database WHERE datname='airline_auth_db'")
-        if not cur.fetchone():
-            cur.execute("CREATE DATABASE airline_auth_db")
-            print("✅ Authentication database created")
-
-        cur.close()
-        conn.close()
-
-        # Create tables in auth database
-        conn = get_auth_connection()
-        cur = conn.cursor()
-
-        # Single admin table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS admin_user (
-                admin_id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        # User credentials table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_credentials (
-                user_cred_id SERIAL PRIMARY KEY,
-                passanger_id INTEGER UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-        """)
-
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("✅ Authentication tables created")
-
-    except Exception as e:
-        print(f"Error creating auth database: {e}")
-
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def initialize_single_admin():
-    conn = get_auth_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("DELETE FROM admin_user")
-
-        cur.execute("""
-            INSERT INTO admin_user (username, password_hash)
-            VALUES (%s, %s)
-        """, ("admin", hash_password("Rssb@1909")))
-
-        conn.commit()
-        print("✅ Single admin account initialized (username: admin, password: Rssb@1909)")
-    except Exception as e:
-        conn.rollback()
-        print(f"Error initializing admin: {e}")
-    finally:
-        cur.close()
-        conn.close()
-if __name__ == "__main__":
-    create_auth_database()
-    initialize_single_admin()
+import psycopg2
+import contextvars
+import gzip
+import hashlib
+import io
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from psycopg2 import errors, extensions
+from db_config import (AIRLINE_DB_CONFIG, AUTH_DB_CONFIG,
+                       AIRLINE_POOL_CONFIG, AUTH_POOL_CONFIG, QUERY_STATS_CONFIG, TPC_CONFIG,
+                       AIRLINE_REPLICA_DB_CONFIG, AIRLINE_REPLICA_POOL_CONFIG, REPLICA_CONFIG)
+
+
+def get_airline_connection():
+    return psycopg2.connect(**AIRLINE_DB_CONFIG)
+
+
+def get_auth_connection():
+    return psycopg2.connect(**AUTH_DB_CONFIG)
+
+
+# ------------------- Query Instrumentation -------------------
+slow_query_log = logging.getLogger("airline.slow_queries")
+
+# Upper bounds (ms) of the latency histogram buckets; slower statements land in a last, open bucket
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Modules whose statements are charged to the function that called into them
+# (as are private _functions, e.g. admin_functions._fetch_page)
+_HELPER_MODULES = {"database", "async_database", "inventory", "cache", "contextlib"}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"(\(\?(?:,\s*\?)*\))(?:,\s*\(\?(?:,\s*\?)*\))+")
+
+
+def statement_key(query, has_params):
+    """Whitespace-normalised SQL identifying a statement across calls.
+
+    Statements that arrive with values already inlined (execute_batch and
+    execute_values pages, COPY) have their literals replaced by ``?`` and
+    VALUES lists collapsed, so each page of a batch counts as the same
+    statement; execute_batch pages keep only their first statement.
+    """
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    if not has_params:
+        query = _VALUE_LISTS.sub(r"\1, ...", _LITERALS.sub("?", query.split(";")[0]))
+    return " ".join(query.split())
+
+
+def calling_function():
+    """``module.function`` of the nearest public caller outside psycopg and the helper modules"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _HELPER_MODULES and not module.startswith("psycopg"):
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name).split(".<locals>")[0]
+            if not name.startswith("_"):
+                return f"{module}.{name}"
+            fallback = fallback or f"{module}.{name}"
+        frame = frame.f_back
+    return fallback or "?"
+
+
+class QueryStats:
+    """Per-statement latency histograms, row counts and a slow-query log for this process.
+
+    Statements are keyed by calling function and statement_key(). Once
+    ``max_statements`` keys exist, further statements are counted under
+    their function with the statement ``<other>``. Statements taking at
+    least ``slow_query_ms`` are logged to the ``airline.slow_queries``
+    logger and kept (newest last) for slow_queries().
+    """
+
+    def __init__(self, enabled=True, slow_query_ms=250, log_parameters=True, max_statements=500,
+                 slow_log_size=100):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.log_parameters = log_parameters
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._keys = {}  # raw SQL text -> statement_key, for the app's parameterised queries
+        self._since = datetime.now()
+
+    def _key(self, query, has_params):
+        if not has_params:
+            return statement_key(query, has_params)
+        key = self._keys.get(query)
+        if key is None:
+            key = statement_key(query, has_params)
+            if len(self._keys) < 4 * self.max_statements:
+                self._keys[query] = key
+        return key
+
+    def record(self, query, params, elapsed_ms, rows, error=False):
+        caller = calling_function()
+        statement = self._key(query, params is not None)
+        bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if elapsed_ms <= bound),
+                      len(HISTOGRAM_BOUNDS_MS))
+        with self._lock:
+            entry = self._stats.get((caller, statement))
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    statement = "<other>"
+                entry = self._stats.setdefault((caller, statement), {
+                    "calls": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                })
+            entry["calls"] += 1
+            entry["errors"] += error
+            entry["rows"] += max(rows, 0)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][bucket] += 1
+
+        if elapsed_ms >= self.slow_query_ms:
+            text = query[:4000].decode(errors="replace") if isinstance(query, bytes) else query[:4000]
+            text = " ".join(text.split())[:2000]
+            shown = repr(params)[:500] if self.log_parameters and params is not None else None
+            with self._lock:
+                self._slow.append({"at": datetime.now().isoformat(timespec="seconds"), "function": caller,
+                                   "elapsed_ms": round(elapsed_ms, 2), "rows": rows, "sql": text,
+                                   "params": shown})
+            slow_query_log.warning("Slow query (%.1f ms, %s rows) in %s: %s%s", elapsed_ms, rows, caller,
+                                   text, f" -- params: {shown}" if shown else "")
+
+    @staticmethod
+    def _percentile(histogram, calls, max_ms, p):
+        # Upper bound of the bucket holding the p-th call, capped at the slowest call seen
+        rank, seen = p * calls, 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, histogram):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, max_ms), 3)
+        return round(max_ms, 3)
+
+    def snapshot(self, histograms=False):
+        """One dict per (function, statement), slowest total time first"""
+        with self._lock:
+            items = [(key, {**entry, "histogram": list(entry["histogram"])}) for key, entry in self._stats.items()]
+        rows = []
+        for (caller, statement), entry in items:
+            calls = entry["calls"]
+            row = {
+                "function": caller, "statement": statement, "calls": calls, "errors": entry["errors"],
+                "rows": entry["rows"], "total_ms": round(entry["total_ms"], 3),
+                "mean_ms": round(entry["total_ms"] / calls, 3),
+                "p50_ms": self._percentile(entry["histogram"], calls, entry["max_ms"], 0.50),
+                "p95_ms": self._percentile(entry["histogram"], calls, entry["max_ms"], 0.95),
+                "p99_ms": self._percentile(entry["histogram"], calls, entry["max_ms"], 0.99),
+                "max_ms": round(entry["max_ms"], 3),
+            }
+            if histograms:
+                labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+                row["histogram_ms"] = dict(zip(labels, entry["histogram"]))
+            rows.append(row)
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    def report(self):
+        """Everything recorded so far, JSON-serialisable"""
+        return {
+            "since": self._since.isoformat(timespec="seconds"),
+            "slow_query_ms": self.slow_query_ms,
+            "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+            "statements": self.snapshot(histograms=True),
+            "slow_queries": self.slow_queries(),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self._since = datetime.now()
+
+
+query_stats = QueryStats(**QUERY_STATS_CONFIG)
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor that records every statement's latency and row count in query_stats"""
+
+    def _timed(self, run, query, params):
+        if not query_stats.enabled:
+            return run()
+        started = time.perf_counter()
+        error = True
+        try:
+            result = run()
+            error = False
+            return result
+        finally:
+            query_stats.record(query, params, (time.perf_counter() - started) * 1000, self.rowcount, error)
+
+    def execute(self, query, vars=None):
+        result = self._timed(lambda: super(InstrumentedCursor, self).execute(query, vars), query, vars)
+        self.connection.saw_statement(query)
+        return result
+
+    def executemany(self, query, vars_list):
+        result = self._timed(lambda: super(InstrumentedCursor, self).executemany(query, vars_list), query, ())
+        self.connection.saw_statement(query)
+        return result
+
+    def copy_expert(self, sql, file, size=8192):
+        result = self._timed(lambda: super(InstrumentedCursor, self).copy_expert(sql, file, size), sql, None)
+        self.connection.saw_statement(sql)
+        return result
+
+
+class InstrumentedConnection(extensions.connection):
+    """Connection whose cursors are InstrumentedCursors and whose commits are timed too.
+
+    With ``track_writes`` (connections of the primary airline pool) and a
+    replica configured, committing a transaction that changed data records
+    the primary's WAL position for read-your-writes (see replica_connection).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedCursor
+        self.track_writes = False
+        self.wrote = False
+
+    def saw_statement(self, query):
+        if not (self.track_writes and replica_router.enabled):
+            return
+        if not self.wrote:
+            pattern = _WRITE_STATEMENT_BYTES if isinstance(query, bytes) else _WRITE_STATEMENT
+            self.wrote = pattern.search(query) is not None
+        if self.wrote and self.autocommit and self.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE:
+            _note_write(self)  # the statement committed itself, e.g. TwoPhaseCommit's "...; COMMIT"
+
+    def commit(self):
+        if not query_stats.enabled:
+            super().commit()
+        else:
+            started = time.perf_counter()
+            error = True
+            try:
+                super().commit()
+                error = False
+            finally:
+                query_stats.record("COMMIT", (), (time.perf_counter() - started) * 1000, 0, error)
+        if self.wrote:
+            _note_write(self)
+
+    def rollback(self):
+        self.wrote = False
+        super().rollback()
+
+
+# ------------------- Connection Pooling -------------------
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections to a single database.
+
+    Connections are checked out with ``connection()``, which yields a live
+    connection and hands it back (rolled back to a clean state) on exit.
+    Idle connections are pinged on checkout once they have been idle for
+    longer than ``health_check_interval`` seconds, and broken ones are
+    replaced transparently.
+    """
+
+    def __init__(self, name, db_config, minconn=1, maxconn=10, timeout=30,
+                 health_check_interval=30):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.name = name
+        self.db_config = db_config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(connection, returned_at)] - most recently used last
+        self._in_use = set()
+        self._opening = 0        # slots reserved by callers that are still connecting
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+        self._peak_in_use = 0
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**{"connection_factory": InstrumentedConnection, **self.db_config})
+        conn.track_writes = self.name == "airline"
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds for one to free up"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        conn = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError(f"Connection pool '{self.name}' is closed")
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+
+                if self._size() < self.maxconn:
+                    # Reserve the slot, then connect outside the lock
+                    self._opening += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No connection available in pool '{self.name}' after {self.timeout}s "
+                        f"({self.maxconn} in use)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        if conn is not None and not self._is_healthy(conn, idle_since):
+            with self._cond:
+                self._health_check_failures += 1
+                self._in_use.discard(conn)
+                self._discard(conn)
+                self._opening += 1
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if conn is not None:
+                        self._in_use.add(conn)
+                    else:
+                        self._cond.notify()
+
+        wait_time = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+            self._peak_in_use = max(self._peak_in_use, len(self._in_use))
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                discard = True
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or conn.closed or self._closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection.
+
+        Any transaction still open when the block exits is rolled back, so
+        callers must commit their own writes. Connections that fail with an
+        OperationalError or InterfaceError are dropped instead of reused.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Snapshot of pool size, utilisation and checkout wait times"""
+        with self._cond:
+            in_use = len(self._in_use)
+            return {
+                "name": self.name,
+                "size": self._size(),
+                "in_use": in_use,
+                "idle": len(self._idle),
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "utilisation": in_use / self.maxconn,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_avg": self._wait_time_total / self._checkouts if self._checkouts else 0.0,
+                "wait_time_max": self._wait_time_max,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "health_check_failures": self._health_check_failures,
+            }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+_POOL_SETTINGS = {
+    "airline": (AIRLINE_DB_CONFIG, AIRLINE_POOL_CONFIG),
+    "auth": (AUTH_DB_CONFIG, AUTH_POOL_CONFIG),
+    "airline_replica": (AIRLINE_REPLICA_DB_CONFIG, AIRLINE_REPLICA_POOL_CONFIG),
+}
+
+
+def get_pool(name):
+    """Return the process-wide pool for 'airline', 'auth' or 'airline_replica', creating it on first use"""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                db_config, pool_config = _POOL_SETTINGS[name]
+                pool = ConnectionPool(name, db_config, **pool_config)
+                _pools[name] = pool
+    return pool
+
+
+def configure_pool(name, db_config, **pool_config):
+    """Replace a pool, e.g. to point a benchmark at a scratch database.
+
+    Configuring 'airline_replica' turns on replica routing (see replica_connection).
+    """
+    with _pools_lock:
+        old = _pools.pop(name, None)
+        if old is not None:
+            old.closeall()
+        pool_config = {**_POOL_SETTINGS[name][1], **pool_config}
+        _pools[name] = ConnectionPool(name, db_config, **pool_config)
+    if name == "airline_replica":
+        replica_router.reset(enabled=True)
+    return _pools[name]
+
+
+def airline_connection():
+    """Pooled connection to the airline database - use as a context manager"""
+    return get_pool("airline").connection()
+
+
+def auth_connection():
+    """Pooled connection to the auth database - use as a context manager"""
+    return get_pool("auth").connection()
+
+
+def pool_stats():
+    """Stats for every pool created in this process, keyed by pool name"""
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+# ------------------- Read Replica Routing -------------------
+replica_log = logging.getLogger("airline.replica")
+
+# Statements that change data. SELECT ... FOR UPDATE matches too, which
+# only costs a needless WAL position lookup at commit.
+_WRITE_STATEMENT = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE)\b|\bFROM\s+STDIN\b", re.IGNORECASE)
+_WRITE_STATEMENT_BYTES = re.compile(_WRITE_STATEMENT.pattern.encode(), re.IGNORECASE)
+
+
+def lsn_value(lsn):
+    """A WAL position such as '16/B374D848' as an integer, for comparisons"""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class WriteMark:
+    """Newest WAL position a session (or the whole process) committed on the primary"""
+
+    def __init__(self):
+        self.lsn = 0
+        self._lock = threading.Lock()
+
+    def advance(self, lsn):
+        with self._lock:
+            self.lsn = max(self.lsn, lsn)
+
+
+_session_mark = contextvars.ContextVar("airline_write_mark")
+_process_mark = WriteMark()
+
+
+def session_write_mark():
+    """The WriteMark of the current context (thread, task or bound session), created on first use"""
+    mark = _session_mark.get(None)
+    if mark is None:
+        mark = WriteMark()
+        _session_mark.set(mark)
+    return mark
+
+
+def bind_write_mark(mark):
+    """Use ``mark`` in the current context, e.g. one kept in a Streamlit session across reruns"""
+    _session_mark.set(mark)
+
+
+def note_primary_position(lsn):
+    """Make process-wide replica reads wait for WAL position ``lsn`` too, e.g. once another process's
+    change was notified (see change_feed.py)"""
+    _process_mark.advance(lsn_value(lsn))
+
+
+def _note_write(conn):
+    """Record the primary's WAL position once ``conn`` committed a change"""
+    conn.wrote = False
+    autocommit = conn.autocommit
+    try:
+        conn.autocommit = True  # no BEGIN for the lookup
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_current_wal_lsn()")
+            lsn = lsn_value(cur.fetchone()[0])
+    except psycopg2.Error as e:
+        # The change is committed either way; only read-your-writes is lost
+        replica_log.warning("Could not read the WAL position after a commit: %s", e)
+        return
+    finally:
+        if not conn.closed:
+            conn.autocommit = autocommit
+    session_write_mark().advance(lsn)
+    _process_mark.advance(lsn)
+
+
+class ReplicaRouter:
+    """Decides per read whether the replica may serve it, and counts the outcomes"""
+
+    def __init__(self, enabled, retry_seconds):
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self.reset(enabled)
+
+    def reset(self, enabled):
+        with self._lock:
+            self.enabled = enabled
+            self.replayed_lsn = 0  # newest replay position seen on the replica
+            self.down_until = 0.0
+            self._counts = {"replica": 0, "replay_checks": 0, "primary_behind": 0, "primary_unavailable": 0}
+
+    def _count(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def checkout(self, stack, needed_lsn):
+        """A replica connection entered on ``stack`` if the replica has replayed ``needed_lsn``, else None"""
+        if time.monotonic() < self.down_until:
+            self._count("primary_unavailable")
+            return None
+        with ExitStack() as attempt:
+            try:
+                conn = attempt.enter_context(get_pool("airline_replica").connection())
+                if needed_lsn > self.replayed_lsn:
+                    self._count("replay_checks")
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_last_wal_replay_lsn()")
+                        replayed = cur.fetchone()[0]
+                    # NULL outside recovery: a promoted replica has every write
+                    replayed = lsn_value(replayed) if replayed else float("inf")
+                    with self._lock:
+                        self.replayed_lsn = max(self.replayed_lsn, replayed)
+            except (psycopg2.OperationalError, PoolTimeout) as e:
+                replica_log.warning("Replica unavailable, reading from the primary for %ss: %s",
+                                    self.retry_seconds, e)
+                self.down_until = time.monotonic() + self.retry_seconds
+                self._count("primary_unavailable")
+                return None
+            if needed_lsn > self.replayed_lsn:
+                self._count("primary_behind")
+                return None
+            self._count("replica")
+            stack.enter_context(attempt.pop_all())
+            return conn
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "replayed_lsn": self.replayed_lsn, **self._counts}
+
+
+replica_router = ReplicaRouter(AIRLINE_REPLICA_DB_CONFIG is not None, **REPLICA_CONFIG)
+
+
+@contextmanager
+def replica_connection(process_wide=False):
+    """Pooled connection for read-only queries - use as a context manager.
+
+    The airline replica serves the read once it has replayed the current
+    session's last write (see session_write_mark), so users always see
+    their own changes; with ``process_wide`` it must have replayed every
+    write this process committed, for caches shared by all sessions.
+    Otherwise - and without a replica configured, or while it cannot be
+    reached - the read goes to the primary.
+    """
+    with ExitStack() as stack:
+        conn = None
+        if replica_router.enabled:
+            mark = _process_mark if process_wide else session_write_mark()
+            conn = replica_router.checkout(stack, mark.lsn)
+        if conn is None:
+            conn = stack.enter_context(airline_connection())
+        yield conn
+
+
+def replica_stats():
+    """How reads were routed so far in this process"""
+    return replica_router.stats()
+
+
+def stream_query(sql, params=None, batch_size=2000, connection=airline_connection):
+    """Stream a large result through a server-side (named) cursor.
+
+    Yields ``(columns, rows)`` batches of at most ``batch_size`` rows, so only
+    one batch is held in memory at a time. The pooled connection stays
+    checked out until the generator is exhausted or closed.
+    """
+    with connection() as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [desc[0] for desc in cur.description], rows
+
+
+class _ChunkWriter:
+    """Collects COPY's one-write-per-row output into larger chunks before passing it on"""
+
+    def __init__(self, file, chunk_size=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        self._parts.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._parts:
+            self.file.write(b"".join(self._parts))
+            self._parts, self._size = [], 0
+
+
+def copy_query_to(file, sql, params=None, compress=False, connection=airline_connection):
+    """Write the result of a query as CSV with a header row via COPY ... TO STDOUT.
+
+    Rows are written to the binary ``file`` (or a path) chunk by chunk as the
+    server sends them, so memory stays flat however large the result;
+    ``compress`` gzips on the fly. Returns the number of rows written.
+    """
+    with ExitStack() as stack:
+        if isinstance(file, str):
+            file = stack.enter_context(open(file, "wb"))
+        if compress:
+            # Level 6 is nearly as small as the default 9 at twice the speed
+            file = stack.enter_context(gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6))
+        writer = _ChunkWriter(file)
+        with connection() as conn, conn.cursor() as cur:
+            # COPY takes no bind parameters, so they are inlined client-side
+            query = cur.mogrify(sql, params).decode()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", writer)
+            writer.flush()
+            rows = cur.rowcount
+            conn.rollback()
+    return rows
+
+
+class IteratorFile(io.IOBase):
+    """Read-only file object over an iterator of str or bytes chunks, for COPY ... FROM STDIN"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = None
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = [self._buffer] if self._buffer else []
+        length = len(self._buffer) if self._buffer else 0
+        while size < 0 or length < size:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        if not parts:
+            return self._buffer[:0] if self._buffer is not None else ""
+        data = parts[0][:0].join(parts)
+        if size < 0:
+            self._buffer = data[:0]
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+# ------------------- Transaction Retries -------------------
+RETRYABLE_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected)
+
+
+def run_in_transaction(conn, work, max_attempts=5, base_delay=0.005, max_delay=0.2):
+    """Run ``work(cur)`` in a transaction and commit it.
+
+    Serialization failures and deadlocks roll back and retry with jittered
+    exponential backoff, up to ``max_attempts`` times; the last failure is
+    re-raised. ``work`` must be safe to re-run from scratch. Whatever it
+    returns is passed back to the caller (the work is responsible for
+    rolling back if it decides not to commit - commit after a rollback is
+    a no-op).
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with conn.cursor() as cur:
+                result = work(cur)
+            conn.commit()
+            return result
+        except RETRYABLE_ERRORS:
+            conn.rollback()
+            if attempt == max_attempts:
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            time.sleep(random.uniform(0, delay))
+
+
+# ------------------- Cross-Database Transactions -------------------
+tpc_log = logging.getLogger("airline.tpc")
+
+TPC_GID_PREFIX = "airline-tpc:"
+
+_prepared_transactions = None  # whether the auth server allows PREPARE TRANSACTION, checked on first use
+
+
+def _prepared_transactions_enabled(cur):
+    global _prepared_transactions
+    if _prepared_transactions is None:
+        cur.execute("SELECT current_setting('max_prepared_transactions')::int > 0")
+        _prepared_transactions = cur.fetchone()[0]
+        if not _prepared_transactions:
+            tpc_log.warning("max_prepared_transactions is 0 on the auth database server - changes to both "
+                            "databases are committed one after the other, not atomically")
+    return _prepared_transactions
+
+
+class TwoPhaseCommit:
+    """One atomic change to both the airline and the auth database.
+
+    Both connections run in autocommit mode and the statements carry their
+    own transaction control, so BEGIN, the work and PREPARE TRANSACTION
+    share a round trip per database::
+
+        with TwoPhaseCommit() as tpc:
+            row = tpc.airline_execute("INSERT ... RETURNING passanger_id", params).fetchone()
+            tpc.prepare_auth("INSERT INTO user_credentials ...", {"passanger_id": row[0], ...})
+            tpc.commit()
+
+    Only the auth branch is prepared. The airline branch is the last
+    resource: it commits together with the transaction's gid in
+    tpc_decisions, so its commit is the commit decision, and phase two
+    then commits the prepared auth branch. If the process dies in between,
+    recover_in_doubt() commits the auth branch when the decision row
+    exists and rolls it back when it doesn't. Leaving the block without
+    commit() rolls both branches back.
+    """
+
+    def __init__(self):
+        self.gid = f"{TPC_GID_PREFIX}{uuid.uuid4()}"
+        self._stack = None
+        self._prepared = False   # the auth branch holds changes
+        self._two_phase = True
+        self._decided = False    # the airline branch committed
+        self._in_doubt = False   # unknown whether it did
+
+    def __enter__(self):
+        with ExitStack() as stack:
+            self._airline_conn = stack.enter_context(airline_connection())
+            self._auth_conn = stack.enter_context(auth_connection())
+            self._airline_conn.autocommit = self._auth_conn.autocommit = True
+            self.airline = stack.enter_context(self._airline_conn.cursor())
+            self.auth = stack.enter_context(self._auth_conn.cursor())
+            self._stack = stack.pop_all()
+        return self
+
+    def airline_execute(self, sql, params=None):
+        """Run sql in the airline branch, opening it with the same round trip; returns the cursor"""
+        if self._airline_conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE:
+            sql = "BEGIN; " + sql
+        self.airline.execute(sql, params)
+        return self.airline
+
+    def prepare_auth(self, sql, params):
+        """Phase one: run sql (with %(name)s placeholders) in the auth branch and prepare it, in one round trip"""
+        self._two_phase = _prepared_transactions_enabled(self.auth)
+        statements = [f"BEGIN; SET LOCAL lock_timeout = {int(TPC_CONFIG['lock_timeout_ms'])}", sql]
+        if self._two_phase:
+            statements.append("PREPARE TRANSACTION %(tpc_gid)s")
+        self.auth.execute("; ".join(statements), {**params, "tpc_gid": self.gid})
+        self._prepared = True
+
+    def auth_execute(self, sql, params=None):
+        """Run sql on the auth connection outside the branch, e.g. after a failed prepare_auth,
+        which rolls back first; returns the cursor"""
+        if self._auth_conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            self.auth.execute("ROLLBACK")
+        self.auth.execute(sql, params)
+        return self.auth
+
+    def commit(self):
+        """Phase two: commit the airline branch with its decision row, then the auth branch"""
+        try:
+            # Fails with a UniqueViolation if recover_in_doubt() already rolled this transaction back
+            self.airline_execute("INSERT INTO tpc_decisions (gid) VALUES (%s); COMMIT", (self.gid,))
+        except psycopg2.Error:
+            # A connection lost mid-commit may or may not have committed
+            self._in_doubt = (self._airline_conn.closed or self._airline_conn.info.transaction_status
+                              == extensions.TRANSACTION_STATUS_UNKNOWN)
+            raise
+        self._decided = True
+        try:
+            if self._two_phase:
+                self.auth.execute("COMMIT PREPARED %s", (self.gid,))
+            else:
+                self.auth.execute("COMMIT")
+        except psycopg2.Error as e:
+            # Decided all the same: recover_in_doubt() commits the prepared branch later
+            tpc_log.error("Auth branch of committed transaction %s not committed yet: %s", self.gid, e)
+
+    def _abort(self):
+        for conn, cur in ((self._airline_conn, self.airline), (self._auth_conn, self.auth)):
+            if not conn.closed and conn.info.transaction_status in (extensions.TRANSACTION_STATUS_INTRANS,
+                                                                    extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    cur.execute("ROLLBACK")
+                except psycopg2.Error:
+                    pass  # the pool drops broken connections
+        if self._prepared and self._two_phase and not self._in_doubt:
+            try:
+                self.auth.execute("ROLLBACK PREPARED %s", (self.gid,))
+            except errors.UndefinedObject:
+                pass  # recover_in_doubt() got there first
+            except psycopg2.Error as e:
+                tpc_log.warning("Prepared transaction %s left for recover_in_doubt(): %s", self.gid, e)
+
+    def __exit__(self, *exc_info):
+        if not self._decided:
+            self._abort()
+        return self._stack.__exit__(*exc_info)
+
+
+def recover_in_doubt(min_age_seconds=None):
+    """Resolve auth branches a TwoPhaseCommit left prepared, e.g. after a crash.
+
+    Branches prepared at least ``min_age_seconds`` ago (default
+    TPC_CONFIG["in_doubt_after_seconds"]) are committed if their decision
+    was recorded and rolled back otherwise - a coordinator that is merely
+    slow then fails its commit rather than committing half. Younger ones
+    are left alone, they are most likely still finishing. Decisions that
+    are no longer needed are pruned. Returns (committed, rolled_back).
+    """
+    if min_age_seconds is None:
+        min_age_seconds = TPC_CONFIG["in_doubt_after_seconds"]
+    committed = rolled_back = 0
+    with airline_connection() as airline_conn, auth_connection() as auth_conn:
+        airline_conn.autocommit = auth_conn.autocommit = True
+        with airline_conn.cursor() as airline, auth_conn.cursor() as auth:
+            auth.execute("SELECT LOCALTIMESTAMP - make_interval(secs => %s)", (min_age_seconds,))
+            cutoff = auth.fetchone()[0]
+            auth.execute("""
+                SELECT gid FROM pg_prepared_xacts
+                WHERE database = current_database() AND gid LIKE %s AND prepared < %s
+            """, (TPC_GID_PREFIX + "%", cutoff))
+            in_doubt = [row[0] for row in auth.fetchall()]
+            # Claim every undecided gid for rollback first: a coordinator still
+            # alive then fails to record its commit, and one recording it right
+            # now makes this wait and find it
+            airline.execute("""
+                INSERT INTO tpc_decisions (gid, committed) SELECT unnest(%s::text[]), FALSE
+                ON CONFLICT (gid) DO NOTHING
+            """, (in_doubt,))
+            airline.execute("SELECT gid FROM tpc_decisions WHERE gid = ANY(%s) AND committed", (in_doubt,))
+            decided = {row[0] for row in airline.fetchall()}
+
+            for gid in in_doubt:
+                try:
+                    auth.execute("COMMIT PREPARED %s" if gid in decided else "ROLLBACK PREPARED %s", (gid,))
+                except errors.UndefinedObject:
+                    continue  # resolved meanwhile
+                if gid in decided:
+                    committed += 1
+                else:
+                    rolled_back += 1
+                tpc_log.warning("%s in-doubt transaction %s", "Committed" if gid in decided else "Rolled back", gid)
+
+            # A decision is recorded after its prepare, so every branch decided
+            # before the cutoff was resolved above; rollback claims are kept a
+            # day longer in case their coordinator is still stalled
+            airline.execute("""
+                DELETE FROM tpc_decisions
+                WHERE decided_at < %s AND (committed OR decided_at < %s - INTERVAL '1 day')
+            """, (cutoff, cutoff))
+    return committed, rolled_back
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def initialize_single_admin():
+    """Make 'admin' the only admin account - a no-op write when it already is"""
+    with auth_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("DELETE FROM admin_user WHERE username != %s", ("admin",))
+
+            cur.execute("""
+                INSERT INTO admin_user (username, password_hash)
+                VALUES (%s, %s)
+                ON CONFLICT (username) DO UPDATE
+                SET password_hash = EXCLUDED.password_hash
+                WHERE admin_user.password_hash != EXCLUDED.password_hash
+            """, ("admin", hash_password("Rssb@1909")))
+
+            conn.commit()
+            print("✅ Single admin account initialized (username: admin, password: Rssb@1909)")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error initializing admin: {e}")
+if __name__ == "__main__":
+    from migrations import bootstrap
+    bootstrap()
@@ -23,3 +23,147 @@ POSTGRES_DEFAULT_CONFIG = {
     "port": "5432"
 }
 
+
+# Connection pool sizing (see database.ConnectionPool)
+# timeout: seconds a caller waits for a free connection before giving up
+# health_check_interval: idle connections older than this are pinged on checkout
+AIRLINE_POOL_CONFIG = {
+    "minconn": 2,
+    "maxconn": 20,
+    "timeout": 30,
+    "health_check_interval": 30
+}
+
+AUTH_POOL_CONFIG = {
+    "minconn": 1,
+    "maxconn": 10,
+    "timeout": 30,
+    "health_check_interval": 30
+}
+
+# Process-wide cache for airports, aircraft and flight metadata (see cache.py)
+# ttl: seconds before an entry is reloaded even without an invalidating write
+REFERENCE_CACHE_CONFIG = {
+    "maxsize": 64,
+    "ttl": 300
+}
+
+# Analytics results (see admin_functions.py). Bookings don't invalidate it,
+# so ttl is how stale the Analytics tab may be.
+ANALYTICS_CACHE_CONFIG = {
+    "maxsize": 64,
+    "ttl": 30
+}
+
+# Connecting-itinerary search (see itinerary.py)
+# refresh_seconds: full graph reload interval, to pick up other processes' flight changes
+ITINERARY_CONFIG = {
+    "min_layover_minutes": 45,
+    "max_layover_minutes": 360,
+    "refresh_seconds": 300
+}
+
+# Per-statement latency histograms and slow-query log (see database.QueryStats)
+# slow_query_ms: statements at least this slow are logged with their parameters
+# max_statements: distinct (function, statement) pairs tracked before the rest are lumped together
+QUERY_STATS_CONFIG = {
+    "enabled": True,
+    "slow_query_ms": 250,
+    "log_parameters": True,
+    "max_statements": 500,
+    "slow_log_size": 100
+}
+
+# Opt-in per-rerun sampling profiler (see profiling.py); AIRLINE_PROFILE=1 also turns it on
+# interval_ms: time between stack samples; keep: profiles held in memory
+PROFILING_CONFIG = {
+    "enabled": False,
+    "interval_ms": 5,
+    "keep": 20
+}
+
+# asyncio pools for async_user_functions.py (psycopg 3 / psycopg_pool, only needed there)
+# timeout: seconds a request waits for a free connection; max_idle: seconds before idle extras close
+ASYNC_AIRLINE_POOL_CONFIG = {
+    "min_size": 4,
+    "max_size": 40,
+    "timeout": 30,
+    "max_idle": 300
+}
+
+ASYNC_AUTH_POOL_CONFIG = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 30,
+    "max_idle": 300
+}
+
+# Headless JSON API (see api_server.py)
+# token_secret: HMAC key signing login tokens; None reads AIRLINE_API_SECRET, else a random key per process
+# keep_alive_seconds: idle time before a kept-alive client connection is closed
+# gzip_min_bytes: smaller responses are sent uncompressed
+API_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8600,
+    "token_secret": None,
+    "token_ttl_seconds": 3600,
+    "keep_alive_seconds": 15,
+    "gzip_min_bytes": 1024,
+    "max_body_bytes": 65536
+}
+
+# Registration and passenger deletion change both databases in one
+# two-phase commit (database.TwoPhaseCommit); the auth server needs
+# max_prepared_transactions > 0 for it, at least the auth pool's maxconn
+# plus room for branches left in doubt by crashes. Those are resolved by
+# `python manage.py recover-transactions` (schedule it) once prepared
+# in_doubt_after_seconds ago; lock_timeout_ms bounds how long a
+# registration waits on an email such a branch still holds.
+TPC_CONFIG = {
+    "in_doubt_after_seconds": 60,
+    "lock_timeout_ms": 5000,
+}
+
+# Unpaid 'pending' tickets hold their seat for ttl_minutes, then
+# hold_sweeper.py cancels them, at most batch_size per transaction, looking
+# again every interval_seconds (straight away while a backlog remains).
+# It prints a status line and records a heartbeat every report_seconds.
+HOLD_CONFIG = {
+    "ttl_minutes": 15,
+    "batch_size": 500,
+    "interval_seconds": 30,
+    "report_seconds": 60,
+}
+
+# Streaming replica of the airline database (same database name) serving
+# the read-only view_*/get_* functions - see database.replica_connection.
+# None sends every query to the primary. Reads fall back to the primary
+# until the replica has replayed the session's own writes, and for
+# retry_seconds after the replica could not be reached.
+AIRLINE_REPLICA_DB_CONFIG = None
+
+AIRLINE_REPLICA_POOL_CONFIG = {
+    "minconn": 1,
+    "maxconn": 20,
+    "timeout": 5,
+    "health_check_interval": 30
+}
+
+REPLICA_CONFIG = {
+    "retry_seconds": 30,
+}
+
+# Per-passenger tickets and payments and per-flight seat maps (see cache.py).
+# Used only while this process's change feed is listening, which evicts the
+# entries a change touches; ttl bounds staleness should a notification be missed.
+VIEW_CACHE_CONFIG = {
+    "maxsize": 5000,
+    "ttl": 60
+}
+
+# Listener for the airline database's change notifications (see change_feed.py).
+# live_refresh_seconds: how often open Streamlit views check it for changes
+CHANGE_FEED_CONFIG = {
+    "reconnect_seconds": 5,
+    "live_refresh_seconds": 5,
+}
@@ -0,0 +1,148 @@
+"""Background worker cancelling unpaid pending tickets once their seat hold runs out.
+
+book_flight holds a seat with a 'pending' ticket until make_payment
+confirms it. Holds older than HOLD_CONFIG["ttl_minutes"] are cancelled
+here and their seats go back on sale. Runs as its own process next to the
+Streamlit app (and api_server.py) on the same databases:
+
+    python hold_sweeper.py [--once] [--batch-size N] [--interval SECONDS]
+
+The hold length is only ever read from HOLD_CONFIG, the same setting
+make_payment uses to refuse paying for an expired hold.
+
+Each batch is one transaction of at most ``batch_size`` tickets
+(admin_functions.expire_pending_holds). Tickets are claimed with
+FOR UPDATE SKIP LOCKED, so payments and cancellations in flight are never
+waited on - those tickets are looked at again next round - and several
+sweepers can share the work. While batches come back full the next one
+starts straight away; otherwise the sweeper sleeps ``interval_seconds``.
+
+Every ``report_seconds`` the sweeper prints expired/sec and the backlog
+(expired holds not cancelled yet) and records them in hold_sweeper_status,
+shown on the admin Diagnostics page.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+from admin_functions import expire_pending_holds, hold_backlog
+from database import PoolTimeout, airline_connection, close_pools
+from db_config import HOLD_CONFIG
+
+# Rows of sweepers that died without removing theirs go after a day
+HEARTBEAT_SQL = """
+    DELETE FROM hold_sweeper_status WHERE updated_at < NOW() - INTERVAL '1 day';
+    INSERT INTO hold_sweeper_status (worker, started_at, updated_at, expired_total, expired_per_second,
+                                     backlog, oldest_expired_seconds)
+    VALUES (%(worker)s, %(started_at)s, NOW(), %(expired_total)s, %(rate)s, %(backlog)s, %(oldest)s)
+    ON CONFLICT (worker) DO UPDATE SET
+        updated_at = NOW(),
+        expired_total = EXCLUDED.expired_total,
+        expired_per_second = EXCLUDED.expired_per_second,
+        backlog = EXCLUDED.backlog,
+        oldest_expired_seconds = EXCLUDED.oldest_expired_seconds
+"""
+
+
+class HoldSweeper:
+    """The sweep loop and its running totals; stop() ends run() after the current batch"""
+
+    def __init__(self, batch_size=None, interval=None, report_every=None, name=None):
+        self.batch_size = batch_size or HOLD_CONFIG["batch_size"]
+        self.interval = HOLD_CONFIG["interval_seconds"] if interval is None else interval
+        self.report_every = HOLD_CONFIG["report_seconds"] if report_every is None else report_every
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.started_at = datetime.now()
+        self.expired_total = 0
+        self._window = (time.monotonic(), 0)  # (start of the current report window, expired_total then)
+        self._stop = threading.Event()
+
+    def sweep(self):
+        """Expire batches until one comes back short; returns the number of tickets cancelled"""
+        expired = 0
+        while not self._stop.is_set():
+            count = expire_pending_holds(self.batch_size)
+            expired += count
+            self.expired_total += count
+            if count < self.batch_size:
+                break
+        return expired
+
+    def report(self):
+        """Print and record expired/sec since the last report and the backlog; returns (rate, backlog)"""
+        now = time.monotonic()
+        since, expired_then = self._window
+        rate = (self.expired_total - expired_then) / max(now - since, 1e-6)
+        self._window = (now, self.expired_total)
+        backlog, oldest = hold_backlog()
+        with airline_connection() as conn, conn.cursor() as cur:
+            cur.execute(HEARTBEAT_SQL, {"worker": self.name, "started_at": self.started_at,
+                                        "expired_total": self.expired_total, "rate": rate,
+                                        "backlog": backlog, "oldest": oldest})
+            conn.commit()
+        print(f"⏱️ {self.name}: {self.expired_total:,} expired, {rate:,.1f}/s, backlog {backlog:,}"
+              + (f" (oldest {oldest:,.0f}s past expiry)" if oldest is not None else ""))
+        return rate, backlog
+
+    def run(self, once=False):
+        """Sweep every ``interval`` seconds until stop() - or a single sweep with ``once``"""
+        print(f"✅ Hold sweeper {self.name} expiring pending tickets after {HOLD_CONFIG['ttl_minutes']} minutes, "
+              f"{self.batch_size} per batch")
+        next_report = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.sweep()
+                    if once or time.monotonic() >= next_report:
+                        self.report()
+                        next_report = time.monotonic() + self.report_every
+                except (psycopg2.Error, PoolTimeout) as e:
+                    print(f"❌ Hold sweep failed, retrying in {self.interval}s: {e}")
+                if once:
+                    break
+                self._stop.wait(self.interval)
+        finally:
+            self._forget()
+
+    def stop(self):
+        self._stop.set()
+
+    def _forget(self):
+        """Remove this sweeper's status row"""
+        try:
+            with airline_connection() as conn, conn.cursor() as cur:
+                cur.execute("DELETE FROM hold_sweeper_status WHERE worker = %s", (self.name,))
+                conn.commit()
+        except (psycopg2.Error, PoolTimeout):
+            pass  # gone after a day anyway
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cancel pending tickets whose seat hold has expired")
+    parser.add_argument("--once", action="store_true", help="sweep once and exit")
+    parser.add_argument("--batch-size", type=int, help=f"tickets per transaction "
+                                                         f"(default {HOLD_CONFIG['batch_size']})")
+    parser.add_argument("--interval", type=float, help=f"seconds between sweeps "
+                                                       f"(default {HOLD_CONFIG['interval_seconds']})")
+    args = parser.parse_args(argv)
+
+    from migrations import bootstrap
+    bootstrap()
+    sweeper = HoldSweeper(args.batch_size, args.interval)
+    signal.signal(signal.SIGTERM, lambda *_: sweeper.stop())
+    try:
+        sweeper.run(once=args.once)
+    except KeyboardInterrupt:
+        sweeper.stop()
+    finally:
+        close_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+from collections import defaultdict
+from psycopg2.extras import execute_batch, execute_values
+
+# Per-flight occupied-seat bitmaps recomputed from tickets (see seatmap.py for
+# the bit order). {flight_filter} narrows both CTEs to the flights of interest.
+# seat_bits is materialized so seat_index() runs once per ticket, not once per use.
+SEAT_BITMAPS_CTE = """
+    seat_bits AS MATERIALIZED (
+        SELECT t.flight_id, seat_index(t.seat_no, a.seats_per_row, a.seat_capacity) AS seat
+        FROM tickets t
+        JOIN flights f ON f.flight_id = t.flight_id
+        JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        WHERE t.status != 'cancelled' {flight_filter}
+    ), seat_bytes AS (
+        SELECT flight_id, seat / 8 AS byte, bit_or(1 << mod(seat, 8)) AS bits
+        FROM seat_bits
+        WHERE seat IS NOT NULL
+        GROUP BY flight_id, seat / 8
+    ), bitmaps AS (
+        SELECT f.flight_id,
+               decode(string_agg(lpad(to_hex(COALESCE(sb.bits, 0)), 2, '0'), '' ORDER BY b.byte), 'hex')
+                   AS seat_bitmap
+        FROM flights f
+        JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        CROSS JOIN LATERAL generate_series(0, (a.seat_capacity + 7) / 8 - 1) AS b(byte)
+        LEFT JOIN seat_bytes sb ON sb.flight_id = f.flight_id AND sb.byte = b.byte
+        WHERE TRUE {flight_filter}
+        GROUP BY f.flight_id
+    )
+"""
+
+# Successful payments per flight. {flight_filter} as above.
+REVENUE_CTE = """
+    revenue AS (
+        SELECT t.flight_id, SUM(p.amount) AS revenue, COUNT(*) AS paid_tickets
+        FROM payments p
+        JOIN tickets t ON t.ticket_id = p.ticket_id
+        JOIN flights f ON f.flight_id = t.flight_id
+        WHERE p.status = 'success' {flight_filter}
+        GROUP BY t.flight_id
+    )
+"""
+
+# Seat counters per flight from its tickets. {flight_filter} as above.
+COUNTS_SELECT = """
+    SELECT f.flight_id,
+           COUNT(t.ticket_id) FILTER (WHERE t.status != 'cancelled') AS booked_seats,
+           COUNT(t.ticket_id) FILTER (WHERE t.status = 'pending') AS pending_seats,
+           COUNT(t.ticket_id) FILTER (WHERE t.status = 'confirmed') AS confirmed_seats,
+           COUNT(t.ticket_id) FILTER (WHERE t.status = 'cancelled') AS cancelled_seats
+    FROM flights f
+    LEFT JOIN tickets t ON t.flight_id = f.flight_id
+    WHERE TRUE {flight_filter}
+    GROUP BY f.flight_id
+"""
+
+
+def _holds_seat(status):
+    # Every ticket that exists and is not cancelled counts against capacity
+    return status is not None and status != 'cancelled'
+
+
+# Adds per-flight deltas to existing counter rows and returns the flights it
+# found; flights created outside add_flight get theirs from
+# ensure_inventory_row instead. VALUES %s is filled by execute_values.
+INVENTORY_DELTAS_SQL = """
+    UPDATE flight_inventory AS fi
+    SET booked_seats = fi.booked_seats + d.booked_seats,
+        pending_seats = fi.pending_seats + d.pending_seats,
+        confirmed_seats = fi.confirmed_seats + d.confirmed_seats,
+        cancelled_seats = fi.cancelled_seats + d.cancelled_seats,
+        revenue = fi.revenue + d.revenue,
+        paid_tickets = fi.paid_tickets + d.paid_tickets,
+        updated_at = NOW()
+    FROM (VALUES %s) AS d (flight_id, booked_seats, pending_seats, confirmed_seats, cancelled_seats,
+                           revenue, paid_tickets)
+    WHERE fi.flight_id = d.flight_id
+    RETURNING fi.flight_id
+"""
+
+# One UPDATE per seat: an UPDATE ... FROM with several seats of the same
+# flight would only apply one of them
+SEAT_BIT_SQL = """
+    UPDATE flight_inventory fi
+    SET seat_bitmap = set_bit(fi.seat_bitmap, seat_index(%s, a.seats_per_row, a.seat_capacity), %s)
+    FROM flights f
+    JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+    WHERE fi.flight_id = %s
+      AND f.flight_id = fi.flight_id
+      AND fi.seat_bitmap IS NOT NULL
+      AND seat_index(%s, a.seats_per_row, a.seat_capacity) IS NOT NULL
+"""
+
+
+def _inventory_deltas(changes, payments):
+    """INVENTORY_DELTAS_SQL rows and SEAT_BIT_SQL parameters for record_ticket_changes"""
+    # booked, pending, confirmed, cancelled, revenue, paid_tickets
+    deltas = defaultdict(lambda: [0, 0, 0, 0, 0, 0])
+    seat_bits = []
+    for flight_id, old_status, new_status, *seat in changes:
+        d = deltas[flight_id]
+        held = _holds_seat(new_status) - _holds_seat(old_status)
+        d[0] += held
+        d[1] += (new_status == 'pending') - (old_status == 'pending')
+        d[2] += (new_status == 'confirmed') - (old_status == 'confirmed')
+        d[3] += (new_status == 'cancelled') - (old_status == 'cancelled')
+        if held and seat and seat[0]:
+            seat_bits.append((flight_id, seat[0], int(held > 0)))
+    for flight_id, amount, count in payments:
+        d = deltas[flight_id]
+        d[4] += amount
+        d[5] += count
+
+    rows = [(flight_id, *d) for flight_id, d in sorted(deltas.items()) if any(d)]
+    # Sorted to lock rows in a stable order
+    seat_updates = [(seat_no, bit, flight_id, seat_no) for flight_id, seat_no, bit in sorted(seat_bits)]
+    return rows, seat_updates
+
+
+def _without_flights(seat_updates, flight_ids):
+    return [update for update in seat_updates if update[2] not in flight_ids]
+
+
+def record_ticket_changes(cur, changes, payments=()):
+    """Apply seat-count and revenue deltas for ticket and payment changes.
+
+    ``changes`` is an iterable of ``(flight_id, old_status, new_status)`` or
+    ``(flight_id, old_status, new_status, seat_no)``; use ``None`` as
+    old_status for a new ticket and as new_status for a deleted one. When
+    seat_no is given, the seat's bit in the flight's seat bitmap is set or
+    cleared to match. ``payments`` is an iterable of ``(flight_id, amount,
+    count)`` changes to the flight's successful payments (negative when
+    they are deleted). Runs on the caller's cursor, after the change, so
+    the counters commit or roll back together with it. A flight without a
+    counter row gets one recomputed from its tickets, which already
+    include the change.
+    """
+    rows, seat_updates = _inventory_deltas(changes, payments)
+    if not rows:
+        return
+    found = {flight_id for flight_id, in execute_values(cur, INVENTORY_DELTAS_SQL, rows, fetch=True)}
+    missing = {row[0] for row in rows} - found
+    for flight_id in sorted(missing):
+        ensure_inventory_row(cur, flight_id)
+    execute_batch(cur, SEAT_BIT_SQL, _without_flights(seat_updates, missing))
+
+
+async def record_ticket_changes_async(cur, changes, payments=()):
+    """record_ticket_changes on a psycopg 3 async cursor (see async_database.py)"""
+    rows, seat_updates = _inventory_deltas(changes, payments)
+    if not rows:
+        return
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    await cur.execute(INVENTORY_DELTAS_SQL.replace("VALUES %s", f"VALUES {values}"),
+                      [value for row in rows for value in row])
+    missing = {row[0] for row in rows} - {flight_id for flight_id, in await cur.fetchall()}
+    for flight_id in sorted(missing):
+        await cur.execute(ENSURE_INVENTORY_SQL, {"flight_id": flight_id})
+    seat_updates = _without_flights(seat_updates, missing)
+    if seat_updates:
+        await cur.executemany(SEAT_BIT_SQL, seat_updates)
+
+
+# Counter row and seat bitmap of one flight (%(flight_id)s), recomputed from its tickets
+ENSURE_INVENTORY_SQL = f"""
+    WITH {SEAT_BITMAPS_CTE.format(flight_filter="AND f.flight_id = %(flight_id)s")},
+         {REVENUE_CTE.format(flight_filter="AND f.flight_id = %(flight_id)s")},
+         counts AS ({COUNTS_SELECT.format(flight_filter="AND f.flight_id = %(flight_id)s")})
+    INSERT INTO flight_inventory (flight_id, booked_seats, pending_seats, confirmed_seats,
+                                  cancelled_seats, revenue, paid_tickets, seat_bitmap)
+    SELECT c.flight_id, c.booked_seats, c.pending_seats, c.confirmed_seats, c.cancelled_seats,
+           COALESCE(r.revenue, 0), COALESCE(r.paid_tickets, 0), b.seat_bitmap
+    FROM counts c
+    LEFT JOIN revenue r ON r.flight_id = c.flight_id
+    LEFT JOIN bitmaps b ON b.flight_id = c.flight_id
+    ON CONFLICT (flight_id) DO NOTHING
+"""
+
+
+def ensure_inventory_row(cur, flight_id):
+    """Create the counter row and seat bitmap for a flight that predates flight_inventory"""
+    cur.execute(ENSURE_INVENTORY_SQL, {"flight_id": flight_id})
+
+
+def rebuild_inventory(cur):
+    """Recompute every flight's counters, revenue and seat bitmap from tickets and payments.
+
+    Takes a SHARE lock on tickets and payments so no booking or payment can
+    slip in between the count and the write. Returns
+    ``(flights_checked, flights_corrected)``.
+    """
+    cur.execute("LOCK TABLE tickets, payments IN SHARE MODE")
+    cur.execute(f"""
+        WITH {SEAT_BITMAPS_CTE.format(flight_filter="")},
+             {REVENUE_CTE.format(flight_filter="")},
+             counts AS ({COUNTS_SELECT.format(flight_filter="")}),
+        actual AS (
+            SELECT c.*, COALESCE(r.revenue, 0) AS revenue, COALESCE(r.paid_tickets, 0) AS paid_tickets,
+                   b.seat_bitmap
+            FROM counts c
+            LEFT JOIN revenue r ON r.flight_id = c.flight_id
+            LEFT JOIN bitmaps b ON b.flight_id = c.flight_id
+        ), fixed AS (
+            INSERT INTO flight_inventory AS fi
+                (flight_id, booked_seats, pending_seats, confirmed_seats, cancelled_seats,
+                 revenue, paid_tickets, seat_bitmap)
+            SELECT flight_id, booked_seats, pending_seats, confirmed_seats, cancelled_seats,
+                   revenue, paid_tickets, seat_bitmap
+            FROM actual
+            ON CONFLICT (flight_id) DO UPDATE
+            SET booked_seats = EXCLUDED.booked_seats,
+                pending_seats = EXCLUDED.pending_seats,
+                confirmed_seats = EXCLUDED.confirmed_seats,
+                cancelled_seats = EXCLUDED.cancelled_seats,
+                revenue = EXCLUDED.revenue,
+                paid_tickets = EXCLUDED.paid_tickets,
+                seat_bitmap = EXCLUDED.seat_bitmap,
+                updated_at = NOW()
+            WHERE (fi.booked_seats, fi.pending_seats, fi.confirmed_seats, fi.cancelled_seats,
+                   fi.revenue, fi.paid_tickets, fi.seat_bitmap)
+                  IS DISTINCT FROM
+                  (EXCLUDED.booked_seats, EXCLUDED.pending_seats, EXCLUDED.confirmed_seats,
+                   EXCLUDED.cancelled_seats, EXCLUDED.revenue, EXCLUDED.paid_tickets,
+                   EXCLUDED.seat_bitmap)
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM actual), (SELECT COUNT(*) FROM fixed)
+    """)
+    return cur.fetchone()
@@ -0,0 +1,312 @@
+"""Connecting-itinerary search over an in-memory flight graph.
+
+The graph is time-expanded: every airport keeps its departures sorted by
+departure time, and every (origin, destination) pair keeps its own sorted
+timetable. A connection from a flight arriving at time T is a bisect for
+the window [T + min_layover, T + max_layover], and the final leg of an
+itinerary is looked up directly on its route, so a search touches only
+the flights that can actually connect instead of joining flights to
+itself in SQL.
+
+One graph is shared by every Streamlit session in the process. It is
+loaded lazily from the database, updated in place by add_flight and
+delete_flight_by_number, and fully reloaded after ``refresh_seconds`` to
+pick up writes made by other processes. Seat availability is not kept in
+the graph; it is read for the candidate flights in one query per search.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from database import replica_connection
+from db_config import ITINERARY_CONFIG
+
+Leg = namedtuple("Leg", "flight_id flight_number origin_id destination_id departure arrival fare")
+
+ITINERARY_COLUMNS = ["stops", "route", "flights", "departure_time", "arrival_time",
+                     "total_duration", "layovers", "total_fare", "available_seats", "flight_ids"]
+
+
+class _Timetable:
+    """Legs kept sorted by departure time, with a parallel key list for bisect"""
+
+    __slots__ = ("keys", "legs")
+
+    def __init__(self):
+        self.keys = []   # (departure, flight_id)
+        self.legs = []
+
+    def add(self, leg):
+        key = (leg.departure, leg.flight_id)
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.legs.insert(i, leg)
+
+    def remove(self, leg):
+        i = bisect_left(self.keys, (leg.departure, leg.flight_id))
+        if i < len(self.keys) and self.keys[i] == (leg.departure, leg.flight_id):
+            del self.keys[i]
+            del self.legs[i]
+
+    def between(self, start, end):
+        """Legs departing in [start, end]"""
+        lo = bisect_left(self.keys, (start,))
+        hi = bisect_right(self.keys, (end, float("inf")))
+        return self.legs[lo:hi]
+
+    def __len__(self):
+        return len(self.legs)
+
+
+class FlightGraph:
+    """Airports and future flights indexed for connection search. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._flights = {}        # flight_id -> Leg
+        self._departures = {}     # airport_id -> _Timetable
+        self._routes = {}         # (origin_id, destination_id) -> _Timetable
+        self._airport_ids = {}    # code -> airport_id
+        self._airport_codes = {}  # airport_id -> code
+        self._loaded_at = None
+
+    # ---- maintenance ----
+    def load(self, airports, flights):
+        """Replace the whole graph with the given (id, code) airports and flight rows"""
+        with self._lock:
+            self._flights.clear()
+            self._departures.clear()
+            self._routes.clear()
+            self._airport_ids = {code: airport_id for airport_id, code in airports}
+            self._airport_codes = {airport_id: code for airport_id, code in airports}
+            for row in flights:
+                self._add(Leg(*row))
+            self._loaded_at = time.monotonic()
+
+    def load_from_database(self):
+        with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT airport_id, code FROM airports")
+            airports = cur.fetchall()
+            # Past flights can never be part of an itinerary
+            cur.execute("""
+                SELECT flight_id, flight_number, origin_airport_id, destination_airport_id,
+                       departure_time, arrival_time, fare
+                FROM flights
+                WHERE departure_time > NOW()
+            """)
+            flights = cur.fetchall()
+        self.load(airports, flights)
+
+    def ensure_fresh(self, max_age):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > max_age:
+                self.load_from_database()
+
+    def invalidate(self):
+        """Force a full reload on the next search (e.g. after airports or aircraft are deleted)"""
+        with self._lock:
+            self._loaded_at = None
+
+    def add_flight(self, leg):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._add(Leg(*leg))
+
+    def remove_flight(self, flight_id):
+        with self._lock:
+            leg = self._flights.pop(flight_id, None)
+            if leg is not None:
+                self._departures[leg.origin_id].remove(leg)
+                self._routes[(leg.origin_id, leg.destination_id)].remove(leg)
+
+    def _add(self, leg):
+        if leg.flight_id in self._flights:
+            return  # already picked up by a reload
+        self._flights[leg.flight_id] = leg
+        self._departures.setdefault(leg.origin_id, _Timetable()).add(leg)
+        self._routes.setdefault((leg.origin_id, leg.destination_id), _Timetable()).add(leg)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "airports": len(self._airport_ids),
+                "flights": len(self._flights),
+                "routes": len(self._routes),
+                "age_seconds": None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+            }
+
+    # ---- search ----
+    def airport_id(self, code):
+        return self._airport_ids.get(code.strip().upper())
+
+    def airport_code(self, airport_id):
+        return self._airport_codes.get(airport_id, "?")
+
+    def connections(self, origin_id, destination_id, depart_from, depart_to, max_stops,
+                    min_layover, max_layover, sort="time", k=10, exclude=()):
+        """Best ``k`` itineraries (lists of Legs) from origin to destination.
+
+        The first leg departs within [depart_from, depart_to]; each further
+        leg departs between min_layover and max_layover after the previous
+        arrival. ``sort`` is 'time' (first departure to last arrival) or
+        'fare' (sum of fares), with the other as tie-breaker. Flights in
+        ``exclude`` are skipped. Partial itineraries already worse than the
+        current k-th best are pruned, since both costs only grow with legs.
+        """
+        if sort not in ("time", "fare"):
+            raise ValueError(f"Unknown sort {sort!r}, expected 'time' or 'fare'")
+
+        def cost(legs):
+            duration = legs[-1].arrival - legs[0].departure
+            fare = sum(leg.fare for leg in legs)
+            return (duration, fare) if sort == "time" else (fare, duration)
+
+        best = []  # max-heap on cost: (negated cost, tie, legs)
+        counter = 0
+
+        def worse_than_kth(c):
+            if len(best) < k:
+                return False
+            worst = best[0][0]
+            return (c[0], c[1]) >= (-worst[0], -worst[1])
+
+        def offer(legs):
+            nonlocal counter
+            c = cost(legs)
+            if worse_than_kth(c):
+                return
+            counter += 1
+            neg = (-c[0], -c[1])
+            if len(best) < k:
+                heapq.heappush(best, (neg, counter, legs))
+            else:
+                heapq.heapreplace(best, (neg, counter, legs))
+
+        def extend(legs, visited):
+            last = legs[-1]
+            if worse_than_kth(cost(legs)):
+                return
+            start, end = last.arrival + min_layover, last.arrival + max_layover
+            stops_left = max_stops - (len(legs) - 1)
+
+            # Final hop: straight onto the destination's route timetable
+            final = self._routes.get((last.destination_id, destination_id))
+            if final:
+                for leg in final.between(start, end):
+                    if leg.flight_id not in exclude:
+                        offer(legs + [leg])
+
+            if stops_left > 1:
+                timetable = self._departures.get(last.destination_id)
+                if timetable:
+                    for leg in timetable.between(start, end):
+                        if (leg.destination_id in visited or leg.destination_id == destination_id
+                                or leg.flight_id in exclude):
+                            continue
+                        extend(legs + [leg], visited | {leg.destination_id})
+
+        with self._lock:
+            direct = self._routes.get((origin_id, destination_id))
+            if direct:
+                for leg in direct.between(depart_from, depart_to):
+                    if leg.flight_id not in exclude:
+                        offer([leg])
+            if max_stops > 0:
+                timetable = self._departures.get(origin_id)
+                if timetable:
+                    for leg in timetable.between(depart_from, depart_to):
+                        if leg.destination_id in (origin_id, destination_id) or leg.flight_id in exclude:
+                            continue
+                        extend([leg], {origin_id, leg.destination_id})
+
+        return sorted((legs for _, _, legs in best), key=cost)
+
+
+flight_graph = FlightGraph()
+
+
+def _available_seats(flight_ids):
+    """Free seats per flight, read in one query from flight_inventory"""
+    if not flight_ids:
+        return {}
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.flight_id, a.seat_capacity - COALESCE(fi.booked_seats, 0)
+            FROM flights f
+            JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+            LEFT JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+            WHERE f.flight_id = ANY(%s)
+        """, (list(flight_ids),))
+        return dict(cur.fetchall())
+
+
+def _as_datetime(value, end_of_day=False):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        if len(value.strip()) > 10:
+            return datetime.fromisoformat(value)
+        value = date.fromisoformat(value.strip())
+    day = datetime.combine(value, datetime.min.time())
+    return day + timedelta(days=1) - timedelta(microseconds=1) if end_of_day else day
+
+
+def search_itineraries(origin, destination, depart_from=None, depart_to=None, max_stops=2,
+                       min_free_seats=1, sort="time", k=10, min_layover_minutes=None,
+                       max_layover_minutes=None):
+    """Top-k direct, one-stop and two-stop itineraries between two airport codes - NO CACHING
+
+    depart_from/depart_to bound the first departure (dates are inclusive;
+    default: from now for the next 7 days). Every leg must have at least
+    ``min_free_seats`` free seats; flights found to be full are excluded
+    and the search is repeated until k bookable itineraries are found or
+    none remain.
+    """
+    config = ITINERARY_CONFIG
+    flight_graph.ensure_fresh(config["refresh_seconds"])
+
+    origin_id, destination_id = flight_graph.airport_id(origin), flight_graph.airport_id(destination)
+    if origin_id is None or destination_id is None or origin_id == destination_id:
+        return ITINERARY_COLUMNS, []
+
+    now = datetime.now()
+    depart_from = max(_as_datetime(depart_from) or now, now)
+    depart_to = _as_datetime(depart_to, end_of_day=True) or depart_from + timedelta(days=7)
+    min_layover = timedelta(minutes=config["min_layover_minutes"] if min_layover_minutes is None
+                            else min_layover_minutes)
+    max_layover = timedelta(minutes=config["max_layover_minutes"] if max_layover_minutes is None
+                            else max_layover_minutes)
+
+    excluded, seats = set(), {}
+    while True:
+        itineraries = flight_graph.connections(origin_id, destination_id, depart_from, depart_to,
+                                               min(max_stops, 2), min_layover, max_layover,
+                                               sort=sort, k=k, exclude=excluded)
+        unknown = {leg.flight_id for legs in itineraries for leg in legs} - seats.keys()
+        seats.update(_available_seats(unknown))
+        full = {leg.flight_id for legs in itineraries for leg in legs
+                if seats.get(leg.flight_id, 0) < min_free_seats}
+        if not full:
+            break
+        excluded |= full
+
+    code = flight_graph.airport_code
+    data = []
+    for legs in itineraries:
+        layovers = [b.departure - a.arrival for a, b in zip(legs, legs[1:])]
+        data.append((
+            len(legs) - 1,
+            " → ".join([code(legs[0].origin_id)] + [code(leg.destination_id) for leg in legs]),
+            " → ".join(leg.flight_number for leg in legs),
+            legs[0].departure,
+            legs[-1].arrival,
+            legs[-1].arrival - legs[0].departure,
+            ", ".join(str(layover) for layover in layovers),
+            sum(leg.fare for leg in legs),
+            min(seats[leg.flight_id] for leg in legs),
+            tuple(leg.flight_id for leg in legs),
+        ))
+    return ITINERARY_COLUMNS, data
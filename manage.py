@@ -0,0 +1,97 @@
+"""Maintenance commands for the airline reservation databases.
+
+Usage:
+    python manage.py migrate [--status]
+    python manage.py reconcile-inventory
+    python manage.py recover-transactions [--min-age SECONDS]
+    python manage.py import {airports,aircrafts,flights} FILE [--format csv|parquet] [--dry-run]
+    python manage.py export {tickets,payments} FILE [--from DATE] [--to DATE] [--status S]
+"""
+import argparse
+import sys
+
+
+def cmd_migrate(args):
+    from migrations import bootstrap, pending_migrations
+    if args.status:
+        for db in ("auth", "airline"):
+            pending = pending_migrations(db)
+            print(f"{db}: {len(pending)} pending" + "".join(f"\n  {v}: {name}" for v, name, _ in pending))
+        return
+    bootstrap()
+
+
+def cmd_reconcile_inventory(args):
+    from admin_functions import reconcile_flight_inventory
+    checked, corrected = reconcile_flight_inventory()
+    print(f"✅ Checked {checked} flight(s), corrected {corrected}")
+
+
+def cmd_recover_transactions(args):
+    from database import recover_in_doubt
+    committed, rolled_back = recover_in_doubt(args.min_age)
+    print(f"✅ Committed {committed} and rolled back {rolled_back} in-doubt transaction(s)")
+
+
+def cmd_import(args):
+    from admin_functions import bulk_import
+    result = bulk_import(args.table, args.file, fmt=args.format, dry_run=args.dry_run)
+    _, rejects = result["rejects"]
+    for row_number, reason, values in rejects:
+        print(f"  row {row_number}: {reason} [{values}]")
+    print(f"{'🔍 Validated' if args.dry_run else '✅ Imported'} {result['rows']} row(s): "
+          f"{result['inserted']} added, {result['updated']} updated, {result['unchanged']} unchanged, "
+          f"{result['rejected']} rejected")
+    return 1 if result["rejected"] else 0
+
+
+def cmd_export(args):
+    from admin_functions import export_all_payments, export_all_tickets
+    compress = args.file.endswith(".gz")
+    if args.table == "tickets":
+        rows = export_all_tickets(args.file, compress, status=args.status,
+                                  depart_from=args.date_from, depart_to=args.date_to)
+    else:
+        rows = export_all_payments(args.file, compress, status=args.status,
+                                   paid_from=args.date_from, paid_to=args.date_to)
+    print(f"✅ Exported {rows} {args.table} to {args.file}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Airline reservation maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="create databases and apply pending schema migrations")
+    p.add_argument("--status", action="store_true", help="only list pending migrations")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("reconcile-inventory", help="rebuild flight_inventory counters from tickets")
+    p.set_defaults(func=cmd_reconcile_inventory)
+
+    p = sub.add_parser("recover-transactions",
+                       help="resolve registrations and passenger deletions left half-committed by a crash")
+    p.add_argument("--min-age", type=float, help="only transactions prepared this many seconds ago "
+                                                 "(default: TPC_CONFIG['in_doubt_after_seconds'])")
+    p.set_defaults(func=cmd_recover_transactions)
+
+    p = sub.add_parser("import", help="bulk load airports, aircrafts or flights from CSV or Parquet")
+    p.add_argument("table", choices=["airports", "aircrafts", "flights"])
+    p.add_argument("file")
+    p.add_argument("--format", choices=["csv", "parquet"], help="default: from the file extension")
+    p.add_argument("--dry-run", action="store_true", help="validate and report without saving")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="stream tickets or payments to a CSV file (gzipped if FILE ends in .gz)")
+    p.add_argument("table", choices=["tickets", "payments"])
+    p.add_argument("file")
+    p.add_argument("--from", dest="date_from", help="first departure (tickets) or payment date, YYYY-MM-DD")
+    p.add_argument("--to", dest="date_to", help="last departure or payment date, inclusive")
+    p.add_argument("--status", help="only tickets or payments with this status")
+    p.set_defaults(func=cmd_export)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,660 @@
+"""Versioned schema migrations for the airline and auth databases.
+
+Each database has an ordered list of ``(version, name, step)`` migrations,
+where step is either SQL text or a callable taking a cursor. Applied
+versions are recorded in a ``schema_migrations`` table, so running
+``bootstrap()`` against an up-to-date database costs one SELECT per
+database and no DDL. Concurrent bootstraps (several Streamlit processes
+starting at once) are serialised with an advisory lock.
+
+Add new migrations to the end of the list with the next version number;
+never edit one that has already shipped.
+"""
+import psycopg2
+from psycopg2 import sql
+from database import get_airline_connection, get_auth_connection, initialize_single_admin
+from db_config import AIRLINE_DB_CONFIG, AUTH_DB_CONFIG, POSTGRES_DEFAULT_CONFIG
+
+# Arbitrary key for pg_advisory_lock, shared by every migrating process
+MIGRATION_LOCK_ID = 72_0419_001
+
+
+AUTH_MIGRATIONS = [
+    (1, "admin_user and user_credentials tables", """
+        CREATE TABLE IF NOT EXISTS admin_user (
+            admin_id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS user_credentials (
+            user_cred_id SERIAL PRIMARY KEY,
+            passanger_id INTEGER UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+    """),
+]
+
+
+def _create_flight_inventory(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS flight_inventory (
+            flight_id INTEGER PRIMARY KEY REFERENCES flights(flight_id) ON DELETE CASCADE,
+            booked_seats INTEGER NOT NULL DEFAULT 0,
+            pending_seats INTEGER NOT NULL DEFAULT 0,
+            confirmed_seats INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    # Fill the counters from existing tickets. A frozen copy of what
+    # inventory.rebuild_inventory() did at this version: later migrations
+    # change that function along with the schema.
+    cur.execute("LOCK TABLE tickets IN SHARE MODE")
+    cur.execute("""
+        INSERT INTO flight_inventory AS fi (flight_id, booked_seats, pending_seats, confirmed_seats)
+        SELECT f.flight_id,
+               COUNT(t.ticket_id) FILTER (WHERE t.status != 'cancelled'),
+               COUNT(t.ticket_id) FILTER (WHERE t.status = 'pending'),
+               COUNT(t.ticket_id) FILTER (WHERE t.status = 'confirmed')
+        FROM flights f
+        LEFT JOIN tickets t ON t.flight_id = f.flight_id
+        GROUP BY f.flight_id
+        ON CONFLICT (flight_id) DO UPDATE
+        SET booked_seats = EXCLUDED.booked_seats,
+            pending_seats = EXCLUDED.pending_seats,
+            confirmed_seats = EXCLUDED.confirmed_seats,
+            updated_at = NOW()
+    """)
+
+
+def _has_index_on(cur, table, column):
+    cur.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = %s::regclass AND a.attname = %s
+    """, (table, column))
+    return cur.fetchone() is not None
+
+
+def _create_hot_query_indexes(cur):
+    cur.execute("""
+        -- Seat counts, availability and per-flight ticket lookups
+        CREATE INDEX IF NOT EXISTS tickets_flight_status_idx ON tickets (flight_id, status);
+        -- view_user_tickets, view_user_payments, passenger deletion
+        CREATE INDEX IF NOT EXISTS tickets_passanger_idx ON tickets (passanger_id);
+        -- payments by ticket: fares, per-user payment history, cascades
+        CREATE INDEX IF NOT EXISTS payments_ticket_idx ON payments (ticket_id);
+        -- route / date search
+        CREATE INDEX IF NOT EXISTS flights_route_departure_idx
+            ON flights (origin_airport_id, destination_airport_id, departure_time);
+        -- delete_flight_by_number and the flight-number filters
+        CREATE INDEX IF NOT EXISTS flights_number_idx ON flights (flight_number);
+    """)
+    # Fresh schemas already index email through its UNIQUE constraint;
+    # only add one for databases created before the schema lived here.
+    if not _has_index_on(cur, "passangers", "email"):
+        cur.execute("CREATE INDEX passangers_email_idx ON passangers (email)")
+
+
+# Per-flight occupied-seat bitmaps as of migration 5, for the migrations that
+# fill seat_bitmap. A frozen copy of inventory.SEAT_BITMAPS_CTE: never change it,
+# give a later migration needing something else its own copy.
+_SEAT_BITMAPS_V5 = """
+    seat_bits AS MATERIALIZED (
+        SELECT t.flight_id, seat_index(t.seat_no, a.seats_per_row, a.seat_capacity) AS seat
+        FROM tickets t
+        JOIN flights f ON f.flight_id = t.flight_id
+        JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        WHERE t.status != 'cancelled'
+    ), seat_bytes AS (
+        SELECT flight_id, seat / 8 AS byte, bit_or(1 << mod(seat, 8)) AS bits
+        FROM seat_bits
+        WHERE seat IS NOT NULL
+        GROUP BY flight_id, seat / 8
+    ), bitmaps AS (
+        SELECT f.flight_id,
+               decode(string_agg(lpad(to_hex(COALESCE(sb.bits, 0)), 2, '0'), '' ORDER BY b.byte), 'hex')
+                   AS seat_bitmap
+        FROM flights f
+        JOIN aircrafts a ON a.aircraft_id = f.aircraft_id
+        CROSS JOIN LATERAL generate_series(0, (a.seat_capacity + 7) / 8 - 1) AS b(byte)
+        LEFT JOIN seat_bytes sb ON sb.flight_id = f.flight_id AND sb.byte = b.byte
+        GROUP BY f.flight_id
+    )
+"""
+
+
+def _create_seat_maps(cur):
+    cur.execute(r"""
+        -- Row layout per aircraft model; seats are lettered A.. across a row (see seatmap.py)
+        ALTER TABLE aircrafts ADD COLUMN IF NOT EXISTS seats_per_row INTEGER NOT NULL DEFAULT 6
+            CHECK (seats_per_row BETWEEN 1 AND 10);
+
+        -- Occupied seats, one bit per seat index, in get_bit/set_bit order
+        ALTER TABLE flight_inventory ADD COLUMN IF NOT EXISTS seat_bitmap BYTEA;
+
+        -- Seat label ('12C') to seat index, NULL when the aircraft has no such seat.
+        -- Mirrors seatmap.SeatMap.seat_index; string functions rather than a regex,
+        -- since rebuild_inventory calls it once per ticket.
+        CREATE OR REPLACE FUNCTION seat_index(label TEXT, per_row INTEGER, capacity INTEGER)
+        RETURNS INTEGER LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+        DECLARE
+            seat TEXT := upper(translate(label, E' \t\r\n', ''));
+            digits TEXT := left(seat, -1);
+            seat_row INTEGER;
+            seat_column INTEGER;
+        BEGIN
+            IF length(digits) NOT BETWEEN 1 AND 4 OR translate(digits, '0123456789', '') <> '' THEN
+                RETURN NULL;
+            END IF;
+            seat_row := digits::int;
+            seat_column := strpos('ABCDEFGHJK', right(seat, 1)) - 1;
+            IF seat_row < 1 OR seat_column < 0 OR seat_column >= per_row
+               OR (seat_row - 1) * per_row + seat_column >= capacity THEN
+                RETURN NULL;
+            END IF;
+            RETURN (seat_row - 1) * per_row + seat_column;
+        END
+        $$;
+
+        -- A cancelled ticket gives its seat back, so only live tickets must be unique
+        ALTER TABLE tickets DROP CONSTRAINT IF EXISTS tickets_flight_seat_unique;
+        CREATE UNIQUE INDEX IF NOT EXISTS tickets_flight_seat_unique
+            ON tickets (flight_id, seat_no) WHERE status != 'cancelled';
+    """)
+    # Bitmaps for existing tickets; flights without a counter row get one
+    cur.execute("LOCK TABLE tickets IN SHARE MODE")
+    cur.execute(f"""
+        WITH {_SEAT_BITMAPS_V5}, counts AS (
+            SELECT f.flight_id,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status != 'cancelled') AS booked_seats,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status = 'pending') AS pending_seats,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status = 'confirmed') AS confirmed_seats
+            FROM flights f
+            LEFT JOIN tickets t ON t.flight_id = f.flight_id
+            GROUP BY f.flight_id
+        )
+        INSERT INTO flight_inventory AS fi (flight_id, booked_seats, pending_seats, confirmed_seats, seat_bitmap)
+        SELECT c.flight_id, c.booked_seats, c.pending_seats, c.confirmed_seats, b.seat_bitmap
+        FROM counts c
+        LEFT JOIN bitmaps b ON b.flight_id = c.flight_id
+        ON CONFLICT (flight_id) DO UPDATE
+        SET booked_seats = EXCLUDED.booked_seats,
+            pending_seats = EXCLUDED.pending_seats,
+            confirmed_seats = EXCLUDED.confirmed_seats,
+            seat_bitmap = EXCLUDED.seat_bitmap,
+            updated_at = NOW()
+    """)
+
+
+def _create_bulk_import_support(cur):
+    # Upserting schedules needs a natural key for flights; refuse to guess
+    # which of two identical flights is the real one
+    cur.execute("""
+        SELECT flight_number, departure_time, COUNT(*)
+        FROM flights
+        GROUP BY flight_number, departure_time
+        HAVING COUNT(*) > 1
+        LIMIT 5
+    """)
+    duplicates = cur.fetchall()
+    if duplicates:
+        listed = ", ".join(f"{number} at {departure} (x{count})" for number, departure, count in duplicates)
+        raise RuntimeError(f"Duplicate flights must be resolved before migrating: {listed}")
+
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS flights_number_departure_unique
+            ON flights (flight_number, departure_time);
+        -- Covered by the unique index above
+        DROP INDEX IF EXISTS flights_number_idx;
+    """)
+
+    # Casts that return NULL instead of failing, so a bad value rejects one
+    # imported row rather than the whole statement. pg_input_is_valid (16+)
+    # checks without the subtransaction a plpgsql EXCEPTION block costs per call.
+    cur.execute("SHOW server_version_num")
+    has_input_check = int(cur.fetchone()[0]) >= 160000
+    for name, type_name in (("try_timestamp", "TIMESTAMP"), ("try_numeric", "NUMERIC"),
+                            ("try_integer", "INTEGER")):
+        if has_input_check:
+            cur.execute(f"""
+                CREATE OR REPLACE FUNCTION {name}(value TEXT) RETURNS {type_name}
+                LANGUAGE sql STABLE AS $$
+                    SELECT CASE WHEN pg_input_is_valid(value, '{type_name.lower()}') THEN value::{type_name} END
+                $$
+            """)
+        else:
+            cur.execute(f"""
+                CREATE OR REPLACE FUNCTION {name}(value TEXT) RETURNS {type_name}
+                LANGUAGE plpgsql STABLE AS $$
+                BEGIN
+                    RETURN value::{type_name};
+                EXCEPTION WHEN others THEN
+                    RETURN NULL;
+                END
+                $$
+            """)
+
+
+def _create_flight_analytics(cur):
+    # flight_inventory doubles as the per-flight analytics summary: the same
+    # booking and payment writes that move the seat counters move these
+    cur.execute("""
+        ALTER TABLE flight_inventory
+            ADD COLUMN IF NOT EXISTS cancelled_seats INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS paid_tickets INTEGER NOT NULL DEFAULT 0
+    """)
+    # Recompute every counter, the new ones included, and the seat bitmaps
+    cur.execute("LOCK TABLE tickets, payments IN SHARE MODE")
+    cur.execute(f"""
+        WITH {_SEAT_BITMAPS_V5}, revenue AS (
+            SELECT t.flight_id, SUM(p.amount) AS revenue, COUNT(*) AS paid_tickets
+            FROM payments p
+            JOIN tickets t ON t.ticket_id = p.ticket_id
+            WHERE p.status = 'success'
+            GROUP BY t.flight_id
+        ), counts AS (
+            SELECT f.flight_id,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status != 'cancelled') AS booked_seats,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status = 'pending') AS pending_seats,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status = 'confirmed') AS confirmed_seats,
+                   COUNT(t.ticket_id) FILTER (WHERE t.status = 'cancelled') AS cancelled_seats
+            FROM flights f
+            LEFT JOIN tickets t ON t.flight_id = f.flight_id
+            GROUP BY f.flight_id
+        )
+        INSERT INTO flight_inventory AS fi
+            (flight_id, booked_seats, pending_seats, confirmed_seats, cancelled_seats,
+             revenue, paid_tickets, seat_bitmap)
+        SELECT c.flight_id, c.booked_seats, c.pending_seats, c.confirmed_seats, c.cancelled_seats,
+               COALESCE(r.revenue, 0), COALESCE(r.paid_tickets, 0), b.seat_bitmap
+        FROM counts c
+        LEFT JOIN revenue r ON r.flight_id = c.flight_id
+        LEFT JOIN bitmaps b ON b.flight_id = c.flight_id
+        ON CONFLICT (flight_id) DO UPDATE
+        SET booked_seats = EXCLUDED.booked_seats,
+            pending_seats = EXCLUDED.pending_seats,
+            confirmed_seats = EXCLUDED.confirmed_seats,
+            cancelled_seats = EXCLUDED.cancelled_seats,
+            revenue = EXCLUDED.revenue,
+            paid_tickets = EXCLUDED.paid_tickets,
+            seat_bitmap = EXCLUDED.seat_bitmap,
+            updated_at = NOW()
+    """)
+
+
+def _create_idempotent_payments(cur):
+    # A ticket paid twice before payments were serialised must be refunded
+    # by hand first; refuse to guess which of its payments stands
+    cur.execute("""
+        SELECT ticket_id, COUNT(*)
+        FROM payments
+        WHERE status = 'success'
+        GROUP BY ticket_id
+        HAVING COUNT(*) > 1
+        ORDER BY ticket_id
+        LIMIT 5
+    """)
+    duplicates = cur.fetchall()
+    if duplicates:
+        listed = ", ".join(f"ticket {ticket_id} (x{count})" for ticket_id, count in duplicates)
+        raise RuntimeError(f"Tickets with several successful payments must be resolved before migrating: {listed}")
+
+    cur.execute("""
+        -- Client-supplied key of make_payment; a repeated key gets the first call's answer
+        ALTER TABLE payments ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+        CREATE UNIQUE INDEX IF NOT EXISTS payments_idempotency_key_unique ON payments (idempotency_key);
+        -- At most one successful payment per ticket, whatever the code path
+        CREATE UNIQUE INDEX IF NOT EXISTS payments_ticket_success_unique
+            ON payments (ticket_id) WHERE status = 'success';
+    """)
+
+
+# Channel of migration 11's change notifications, listened on by change_feed.py
+CHANGE_CHANNEL = "airline_changes"
+
+# Rows a changed row stands for: its flight and passenger
+_CHANGED_ROWS = {
+    "tickets": "SELECT flight_id, passanger_id FROM {rows}",
+    "payments": "SELECT t.flight_id, t.passanger_id FROM {rows} r JOIN tickets t ON t.ticket_id = r.ticket_id",
+    "flights": "SELECT flight_id, NULL::int AS passanger_id FROM {rows}",
+}
+
+
+def _create_change_notifications(cur):
+    # One NOTIFY per statement (not per row), naming the flights and
+    # passengers it touched; statements touching more than 500 of them say
+    # "all" instead, keeping the payload under NOTIFY's 8000-byte limit.
+    # Identical notifications within a transaction are delivered once.
+    for table, changed_rows in _CHANGED_ROWS.items():
+        selects = {op: changed_rows.format(rows=rows) for op, rows in
+                   (("INSERT", "new_rows"), ("DELETE", "old_rows"))}
+        selects["UPDATE"] = f"{selects['INSERT']} UNION ALL {selects['DELETE']}"
+        branches = "\n            ELS".join(
+            f"""IF TG_OP = '{op}' THEN
+                SELECT array_remove(array_agg(DISTINCT flight_id), NULL),
+                       array_remove(array_agg(DISTINCT passanger_id), NULL)
+                INTO flight_ids, passanger_ids
+                FROM ({select}) changed;""" for op, select in selects.items())
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION notify_{table}_change() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                flight_ids INTEGER[];
+                passanger_ids INTEGER[];
+            BEGIN
+            {branches}
+            END IF;
+            IF flight_ids IS NULL THEN
+                RETURN NULL;  -- no rows changed
+            END IF;
+            PERFORM pg_notify('{CHANGE_CHANNEL}', CASE
+                WHEN cardinality(flight_ids) + cardinality(passanger_ids) > 500
+                THEN json_build_object('table', TG_TABLE_NAME, 'all', true)
+                ELSE json_build_object('table', TG_TABLE_NAME, 'flights', flight_ids, 'passengers', passanger_ids)
+            END::text);
+            RETURN NULL;
+            END
+            $$
+        """)
+        for op, referencing in (("INSERT", "NEW TABLE AS new_rows"),
+                                ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+                                ("DELETE", "OLD TABLE AS old_rows")):
+            trigger = f"{table}_notify_{op.lower()}"
+            cur.execute(f"""
+                DROP TRIGGER IF EXISTS {trigger} ON {table};
+                CREATE TRIGGER {trigger} AFTER {op} ON {table}
+                    REFERENCING {referencing}
+                    FOR EACH STATEMENT EXECUTE FUNCTION notify_{table}_change();
+            """)
+
+
+def _make_passenger_email_unique(cur):
+    # register_passenger upserts on email; databases created before the
+    # schema lived here only got a plain index from migration 3
+    cur.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'passangers'::regclass AND a.attname = 'email'
+          AND i.indisunique AND i.indnkeyatts = 1 AND i.indpred IS NULL
+    """)
+    if cur.fetchone():
+        return
+    cur.execute("""
+        SELECT email, COUNT(*)
+        FROM passangers
+        GROUP BY email
+        HAVING COUNT(*) > 1
+        LIMIT 5
+    """)
+    duplicates = cur.fetchall()
+    if duplicates:
+        listed = ", ".join(f"{email} (x{count})" for email, count in duplicates)
+        raise RuntimeError(f"Passengers sharing an email must be resolved before migrating: {listed}")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS passangers_email_unique ON passangers (email);
+        -- Covered by the unique index above
+        DROP INDEX IF EXISTS passangers_email_idx;
+    """)
+
+
+def _notify_cascaded_payment_deletes(cur):
+    # Payments deleted by the cascade from their ticket can't be joined to it
+    # any more, so migration 11's payments notification names nobody. The
+    # tickets trigger, which still has the deleted rows, reports them instead.
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION notify_tickets_change() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            flight_ids INTEGER[];
+            passanger_ids INTEGER[];
+            tables TEXT[] := ARRAY['tickets'];
+        BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_remove(array_agg(DISTINCT flight_id), NULL),
+                   array_remove(array_agg(DISTINCT passanger_id), NULL)
+            INTO flight_ids, passanger_ids
+            FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_remove(array_agg(DISTINCT flight_id), NULL),
+                   array_remove(array_agg(DISTINCT passanger_id), NULL)
+            INTO flight_ids, passanger_ids
+            FROM old_rows;
+            tables := tables || 'payments'::text;
+        ELSE
+            SELECT array_remove(array_agg(DISTINCT flight_id), NULL),
+                   array_remove(array_agg(DISTINCT passanger_id), NULL)
+            INTO flight_ids, passanger_ids
+            FROM (SELECT flight_id, passanger_id FROM new_rows
+                  UNION ALL SELECT flight_id, passanger_id FROM old_rows) changed;
+        END IF;
+        IF flight_ids IS NULL THEN
+            RETURN NULL;  -- no rows changed
+        END IF;
+        PERFORM pg_notify('{CHANGE_CHANNEL}', CASE
+            WHEN cardinality(flight_ids) + cardinality(passanger_ids) > 500
+            THEN json_build_object('table', changed_table, 'all', true)
+            ELSE json_build_object('table', changed_table, 'flights', flight_ids, 'passengers', passanger_ids)
+        END::text)
+        FROM unnest(tables) AS changed_table;
+        RETURN NULL;
+        END
+        $$
+    """)
+
+
+AIRLINE_MIGRATIONS = [
+    (1, "base airline schema", """
+        CREATE TABLE IF NOT EXISTS aircrafts (
+            aircraft_id SERIAL PRIMARY KEY,
+            model TEXT UNIQUE NOT NULL,
+            manufacturer TEXT NOT NULL,
+            seat_capacity INTEGER NOT NULL CHECK (seat_capacity > 0)
+        );
+
+        CREATE TABLE IF NOT EXISTS airports (
+            airport_id SERIAL PRIMARY KEY,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            city TEXT,
+            country TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS flights (
+            flight_id SERIAL PRIMARY KEY,
+            flight_number TEXT NOT NULL,
+            origin_airport_id INTEGER REFERENCES airports(airport_id) ON DELETE CASCADE,
+            destination_airport_id INTEGER REFERENCES airports(airport_id) ON DELETE CASCADE,
+            departure_time TIMESTAMP NOT NULL,
+            arrival_time TIMESTAMP NOT NULL,
+            aircraft_id INTEGER REFERENCES aircrafts(aircraft_id) ON DELETE CASCADE,
+            fare NUMERIC(10, 2) NOT NULL CHECK (fare >= 0)
+        );
+
+        CREATE TABLE IF NOT EXISTS passangers (
+            passanger_id SERIAL PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT,
+            nationality TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id SERIAL PRIMARY KEY,
+            passanger_id INTEGER NOT NULL REFERENCES passangers(passanger_id) ON DELETE CASCADE,
+            flight_id INTEGER NOT NULL REFERENCES flights(flight_id) ON DELETE CASCADE,
+            seat_no TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'confirmed', 'cancelled')),
+            CONSTRAINT tickets_flight_seat_unique UNIQUE (flight_id, seat_no)
+        );
+
+        CREATE TABLE IF NOT EXISTS payments (
+            payment_id SERIAL PRIMARY KEY,
+            ticket_id INTEGER NOT NULL REFERENCES tickets(ticket_id) ON DELETE CASCADE,
+            amount NUMERIC(10, 2) NOT NULL,
+            method TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payment_time TIMESTAMP DEFAULT NOW()
+        );
+    """),
+    (2, "flight_inventory seat counters", _create_flight_inventory),
+    (3, "indexes for hot queries", _create_hot_query_indexes),
+    (4, "departure time index for flight search", """
+        -- search_flights without a route: future flights in departure order
+        CREATE INDEX IF NOT EXISTS flights_departure_idx ON flights (departure_time);
+    """),
+    (5, "seat layouts and per-flight seat bitmaps", _create_seat_maps),
+    (6, "flight natural key and safe casts for bulk import", _create_bulk_import_support),
+    (7, "cancellation and revenue counters in flight_inventory", _create_flight_analytics),
+    (8, "commit decisions for transactions spanning both databases", """
+        -- Outcome of the prepared auth branch with this gid: committed rows come
+        -- from database.TwoPhaseCommit, rolled back ones from recover_in_doubt
+        CREATE TABLE IF NOT EXISTS tpc_decisions (
+            gid TEXT PRIMARY KEY,
+            committed BOOLEAN NOT NULL DEFAULT TRUE,
+            -- Not NOW(): that is when the airline branch began, before the prepare
+            decided_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+        );
+    """),
+    (9, "seat hold expiry for pending tickets", """
+        -- Start of a pending ticket's seat hold; existing tickets start theirs now
+        ALTER TABLE tickets ADD COLUMN IF NOT EXISTS booked_at TIMESTAMP NOT NULL DEFAULT NOW();
+        -- hold_sweeper.py: oldest holds first, and the backlog count
+        CREATE INDEX IF NOT EXISTS tickets_pending_booked_idx ON tickets (booked_at) WHERE status = 'pending';
+
+        -- One heartbeat row per running hold_sweeper.py process
+        CREATE TABLE IF NOT EXISTS hold_sweeper_status (
+            worker TEXT PRIMARY KEY,
+            started_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP NOT NULL,
+            expired_total BIGINT NOT NULL,
+            expired_per_second DOUBLE PRECISION NOT NULL,
+            backlog INTEGER NOT NULL,
+            oldest_expired_seconds DOUBLE PRECISION
+        );
+    """),
+    (10, "idempotent payments", _create_idempotent_payments),
+    (11, "change notifications for tickets, payments and flights", _create_change_notifications),
+    (12, "unique passenger emails", _make_passenger_email_unique),
+    (13, "payments notification for tickets deleted with their payments", _notify_cascaded_payment_deletes),
+]
+
+
+MIGRATIONS = {
+    "auth": (get_auth_connection, AUTH_MIGRATIONS),
+    "airline": (get_airline_connection, AIRLINE_MIGRATIONS),
+}
+
+
+def create_database_if_missing(name):
+    """Create a database on the server from POSTGRES_DEFAULT_CONFIG. Returns True if it was created"""
+    conn = psycopg2.connect(**POSTGRES_DEFAULT_CONFIG)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if cur.fetchone():
+                return False
+            try:
+                cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+            except psycopg2.errors.DuplicateDatabase:
+                return False  # another process won the race
+            print(f"✅ Database {name} created")
+            return True
+    finally:
+        conn.close()
+
+
+def _applied_versions(cur):
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return set()
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def pending_migrations(db, connect=None):
+    """Migrations not yet applied to db ('auth' or 'airline')"""
+    default_connect, migrations = MIGRATIONS[db]
+    conn = (connect or default_connect)()
+    try:
+        with conn.cursor() as cur:
+            applied = _applied_versions(cur)
+        return [m for m in migrations if m[0] not in applied]
+    finally:
+        conn.close()
+
+
+def apply_migrations(db, connect=None):
+    """Apply pending migrations to db ('auth' or 'airline'), each in its own transaction.
+
+    ``connect`` overrides how the connection is opened, e.g. to migrate a
+    scratch copy of the schema. Returns the list of versions applied.
+    """
+    default_connect, migrations = MIGRATIONS[db]
+    conn = (connect or default_connect)()
+    applied_now = []
+    try:
+        with conn.cursor() as cur:
+            # Fast path: nothing to do, no lock and no DDL
+            applied = _applied_versions(cur)
+            conn.rollback()
+            if all(version in applied for version, _, _ in migrations):
+                return applied_now
+
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                """)
+                conn.commit()
+                # Re-read under the lock - another process may have migrated meanwhile
+                applied = _applied_versions(cur)
+
+                for version, name, step in migrations:
+                    if version in applied:
+                        continue
+                    if callable(step):
+                        step(cur)
+                    else:
+                        cur.execute(step)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                (version, name))
+                    conn.commit()
+                    applied_now.append(version)
+                    print(f"✅ {db} migration {version} applied: {name}")
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+    finally:
+        conn.close()
+    return applied_now
+
+
+def bootstrap():
+    """Create both databases, apply pending migrations and seed the admin account.
+
+    Idempotent and cheap when everything is current; the Streamlit app runs
+    it once per process behind st.cache_resource.
+    """
+    create_database_if_missing(AUTH_DB_CONFIG["database"])
+    create_database_if_missing(AIRLINE_DB_CONFIG["database"])
+    apply_migrations("auth")
+    apply_migrations("airline")
+    initialize_single_admin()
+
+
+if __name__ == "__main__":
+    bootstrap()
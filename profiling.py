@@ -0,0 +1,207 @@
+"""Opt-in sampling profiler for Streamlit reruns.
+
+With profiling on (PROFILING_CONFIG["enabled"], the AIRLINE_PROFILE=1
+environment variable, or the toggle on the admin Diagnostics tab), every
+rerun of app.py - and every fragment rerun, labelled "<user type>:<fragment>"
+- runs under profile_rerun(): a background thread samples the rerun's
+stack every ``interval_ms`` and charges the time since the previous
+sample to that stack. Each sample is also attributed to a
+section by the innermost frame from a known library - DB (psycopg2 and
+the database helpers), pandas or rendering (Streamlit) - and to "app"
+otherwise.
+
+The last ``keep`` profiles are held in memory for the whole process and
+can be exported as speedscope JSON (https://www.speedscope.app) or as
+collapsed stacks for flamegraph.pl / inferno.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from db_config import PROFILING_CONFIG
+
+# Innermost-frame module prefixes per section, checked in this order
+SECTIONS = [
+    ("DB", ("psycopg2", "database", "inventory")),
+    ("pandas", ("pandas", "numpy", "pyarrow")),
+    ("rendering", ("streamlit", "altair", "tornado", "google.protobuf")),
+]
+OTHER_SECTION = "app"
+
+
+def _section(module):
+    for section, prefixes in SECTIONS:
+        if module.startswith(prefixes):
+            return section
+    return None
+
+
+class RerunProfile:
+    """Sampled stacks of one rerun: ``stacks`` maps root-first (name, file, line) tuples to milliseconds"""
+
+    def __init__(self, label, interval_ms):
+        self.label = label
+        self.interval_ms = interval_ms
+        self.started_at = datetime.now()
+        self.wall_ms = 0.0
+        self.samples = 0
+        self.outcome = "ok"
+        self.stacks = Counter()
+        self.sections = Counter()
+
+    def summary(self):
+        sampled = sum(self.sections.values()) or 1
+        return {
+            "label": self.label,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_ms": round(self.wall_ms, 1),
+            "samples": self.samples,
+            "outcome": self.outcome,
+            **{f"{section}_pct": round(100 * self.sections[section] / sampled, 1)
+               for section in [name for name, _ in SECTIONS] + [OTHER_SECTION]},
+        }
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack until stopped"""
+
+    def __init__(self, thread_id, profile, root):
+        super().__init__(name="rerun-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.profile = profile
+        self.root = root  # frame that opened the profile; stacks start here
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = self.profile.interval_ms / 1000
+        last = time.perf_counter()
+        while not self._stop_event.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self._record(frame, (now - last) * 1000)
+            last = now
+
+    def _record(self, frame, elapsed_ms):
+        stack, section = [], None
+        while frame is not None:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "")
+            section = section or _section(module)
+            stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+            frame = None if frame is self.root else frame.f_back
+        stack.reverse()
+        self.profile.stacks[tuple(stack)] += elapsed_ms
+        self.profile.sections[section or OTHER_SECTION] += elapsed_ms
+        self.profile.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+_enabled = PROFILING_CONFIG["enabled"] or os.environ.get("AIRLINE_PROFILE", "") not in ("", "0")
+_profiles = deque(maxlen=PROFILING_CONFIG["keep"])
+_lock = threading.Lock()
+_running = threading.local()  # .active: a profile_rerun is open on this thread
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """Turn rerun profiling on or off for every session of this process"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+@contextmanager
+def profile_rerun(label):
+    """Profile the enclosed block (one rerun) if profiling is on; a no-op otherwise.
+
+    Nested blocks (a fragment running as part of a full rerun) belong to
+    the outer profile and are not profiled separately.
+    """
+    if not _enabled or getattr(_running, "active", False):
+        yield None
+        return
+    profile = RerunProfile(label, PROFILING_CONFIG["interval_ms"])
+    root = sys._getframe(1)
+    while root.f_globals.get("__name__") == "contextlib":
+        root = root.f_back
+    sampler = _Sampler(threading.get_ident(), profile, root)
+    started = time.perf_counter()
+    sampler.start()
+    _running.active = True
+    try:
+        yield profile
+    except BaseException as e:
+        # st.rerun() and st.stop() end a rerun by raising
+        profile.outcome = type(e).__name__
+        raise
+    finally:
+        _running.active = False
+        sampler.stop()
+        profile.wall_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            _profiles.append(profile)
+
+
+def recent_profiles():
+    """Kept profiles, oldest first"""
+    with _lock:
+        return list(_profiles)
+
+
+def clear_profiles():
+    with _lock:
+        _profiles.clear()
+
+
+def to_collapsed(profiles):
+    """Collapsed stacks ('root;caller;leaf <microseconds>' per line) merged over ``profiles``"""
+    merged = Counter()
+    for profile in profiles:
+        for stack, ms in profile.stacks.items():
+            merged[";".join(name for name, _, _ in stack)] += ms
+    return "".join(f"{stack} {round(ms * 1000)}\n" for stack, ms in sorted(merged.items()))
+
+
+def to_speedscope(profiles):
+    """Speedscope file with one sampled profile per rerun, weights in milliseconds"""
+    frames, index = [], {}
+    documents = []
+    for profile in profiles:
+        samples, weights = [], []
+        for stack, ms in profile.stacks.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    name, file, line = frame
+                    frames.append({"name": name, "file": file, "line": line})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(round(ms, 3))
+        documents.append({
+            "type": "sampled",
+            "name": f"{profile.label} {profile.started_at:%H:%M:%S} ({profile.wall_ms:.0f} ms)",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        })
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": documents,
+        "name": "airline reservation reruns",
+        "exporter": "profiling.py",
+    })
@@ -0,0 +1,132 @@
+"""Seat layout and occupancy bitmap for one flight.
+
+Seats are numbered row by row from the front: seat index ``i`` is row
+``i // seats_per_row + 1``, letter ``LETTERS[i % seats_per_row]``, so with
+six seats per row index 0 is 1A and index 7 is 2B. The last row is partial
+when seat_capacity is not a multiple of seats_per_row.
+
+Occupancy is a bitmap with one bit per seat index, stored in
+flight_inventory.seat_bitmap. The bit order matches PostgreSQL's
+get_bit/set_bit on bytea (bit ``i`` is ``byte[i // 8] & (1 << i % 8)``),
+so the database can claim a seat with set_bit and Python reads the same
+bytes. Both lookups and updates are O(1).
+
+``seat_index`` must stay in step with the seat_index() SQL function
+created by migration 5.
+"""
+import re
+
+LETTERS = "ABCDEFGHJK"  # no I - too easily confused with 1
+MAX_SEATS_PER_ROW = len(LETTERS)
+
+# Columns followed by an aisle, per seats_per_row (single-aisle up to 6, twin-aisle above)
+AISLES_AFTER = {
+    1: (), 2: (0,), 3: (0,), 4: (1,), 5: (1,), 6: (2,),
+    7: (1, 4), 8: (1, 5), 9: (2, 5), 10: (2, 6),
+}
+
+# Whitespace is ignored anywhere in a label ('12 C' is 12C)
+SEAT_PATTERN = re.compile(r"^([0-9]{1,4})([A-Za-z])$")
+WHITESPACE = re.compile(r"\s+")
+
+# Seat classes, best first, for auto-assignment
+SEAT_CLASSES = ("window", "aisle", "middle")
+
+
+def normalise_seat_label(label):
+    """Canonical form of a seat label ('012c ' -> '12C'); other text is just trimmed and upper-cased"""
+    match = SEAT_PATTERN.match(WHITESPACE.sub("", label))
+    if not match:
+        return label.strip().upper()
+    return f"{int(match.group(1))}{match.group(2).upper()}"
+
+
+def empty_bitmap(seat_capacity):
+    return bytearray((seat_capacity + 7) // 8)
+
+
+class SeatMap:
+    """Seat layout of an aircraft plus the occupied-seat bitmap of one flight"""
+
+    def __init__(self, seat_capacity, seats_per_row=6, bitmap=None):
+        if not 1 <= seats_per_row <= MAX_SEATS_PER_ROW:
+            raise ValueError(f"seats_per_row must be between 1 and {MAX_SEATS_PER_ROW}")
+        self.seat_capacity = seat_capacity
+        self.seats_per_row = seats_per_row
+        self.bitmap = bytearray(bitmap) if bitmap is not None else empty_bitmap(seat_capacity)
+        if len(self.bitmap) * 8 < seat_capacity:
+            self.bitmap.extend(bytes((seat_capacity + 7) // 8 - len(self.bitmap)))
+
+    @property
+    def rows(self):
+        return -(-self.seat_capacity // self.seats_per_row)
+
+    # ---- labels ----
+    def seat_index(self, label):
+        """Index of a seat label such as '12C', or None if the aircraft has no such seat"""
+        match = SEAT_PATTERN.match(WHITESPACE.sub("", label or ""))
+        if not match:
+            return None
+        row, letter = int(match.group(1)), match.group(2).upper()
+        column = LETTERS.find(letter)
+        if row < 1 or column < 0 or column >= self.seats_per_row:
+            return None
+        index = (row - 1) * self.seats_per_row + column
+        return index if index < self.seat_capacity else None
+
+    def label(self, index):
+        row, column = divmod(index, self.seats_per_row)
+        return f"{row + 1}{LETTERS[column]}"
+
+    def seat_class(self, index):
+        column = index % self.seats_per_row
+        aisles = AISLES_AFTER[self.seats_per_row]
+        if column in (0, self.seats_per_row - 1):
+            return "window"
+        if column in aisles or column - 1 in aisles:
+            return "aisle"
+        return "middle"
+
+    # ---- occupancy ----
+    def is_taken(self, index):
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def take(self, index):
+        self.bitmap[index >> 3] |= 1 << (index & 7)
+
+    def release(self, index):
+        self.bitmap[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def taken_count(self):
+        return sum(bin(byte).count("1") for byte in self.bitmap)
+
+    def free_seats(self):
+        return [self.label(i) for i in range(self.seat_capacity) if not self.is_taken(i)]
+
+    def best_available(self, preference=SEAT_CLASSES):
+        """Label of the best free seat: frontmost row first, then by seat class preference"""
+        rank = {seat_class: n for n, seat_class in enumerate(preference)}
+        best = None
+        for index in range(self.seat_capacity):
+            if best is not None and index // self.seats_per_row > best[0][0]:
+                break  # past the frontmost row with a free seat
+            if self.is_taken(index):
+                continue
+            key = (index // self.seats_per_row, rank.get(self.seat_class(index), len(rank)))
+            if best is None or key < best[0]:
+                best = (key, index)
+        return None if best is None else self.label(best[1])
+
+    def grid(self):
+        """Rows of (label, taken) per seat, with None where an aisle falls"""
+        aisles = AISLES_AFTER[self.seats_per_row]
+        rows = []
+        for row in range(self.rows):
+            cells = []
+            for column in range(self.seats_per_row):
+                index = row * self.seats_per_row + column
+                cells.append((self.label(index), self.is_taken(index)) if index < self.seat_capacity else None)
+                if column in aisles:
+                    cells.append(None)
+            rows.append(cells)
+        return rows
@@ -1,251 +1,556 @@
-from database import get_airline_connection
-import streamlit as st
-
-def add_passenger(full_name, email, phone, nationality):
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO passangers (full_name, email, phone, nationality)
-        VALUES (%s, %s, %s, %s)
-        RETURNING passanger_id
-    """, (full_name, email, phone, nationality))
-    passanger_id = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
-    return passanger_id
-
-
-def book_flight(passanger_id, flight_id, seat_no):
-    """Book a flight - status is 'pending' until payment - CHECK CAPACITY"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    try:
-        # Check flight capacity
-        cur.execute("""
-            SELECT 
-                a.seat_capacity,
-                COALESCE(
-                    (SELECT COUNT(*) FROM tickets t 
-                     WHERE t.flight_id = %s 
-                     AND t.status != 'cancelled'), 0
-                ) AS booked_seats
-            FROM flights f
-            JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
-            WHERE f.flight_id = %s
-        """, (flight_id, flight_id))
-
-        result = cur.fetchone()
-
-        if not result:
-            return False, None, "❌ Flight not found!"
-
-        seat_capacity, booked_seats = result
-
-        # Check if flight is full
-        if booked_seats >= seat_capacity:
-            return False, None, f"❌ Flight is full! Capacity: {seat_capacity}, Booked: {booked_seats}"
-
-        # Book the ticket
-        cur.execute("""
-            INSERT INTO tickets (passanger_id, flight_id, seat_no, status)
-            VALUES (%s, %s, %s, 'pending')
-            RETURNING ticket_id
-        """, (passanger_id, flight_id, seat_no))
-        ticket_id = cur.fetchone()[0]
-        conn.commit()
-        remaining_seats = seat_capacity - booked_seats - 1
-        return True, ticket_id, f"Booking successful! {remaining_seats} seats remaining. Please complete payment to confirm."
-
-    except Exception as e:
-        conn.rollback()
-        if "tickets_flight_seat_unique" in str(e):
-            return False, None, "❌ This seat is already booked for this flight!"
-        return False, None, f"❌ Error: {str(e)}"
-    finally:
-        cur.close()
-        conn.close()
-
-
-def cancel_ticket(ticket_id, passanger_id):
-    conn = get_airline_connection()
-    cur = conn.cursor()
-
-    try:
-        # Check if ticket exists and belongs to user
-        cur.execute("""
-            SELECT status FROM tickets 
-            WHERE ticket_id = %s AND passanger_id = %s
-        """, (ticket_id, passanger_id))
-
-        result = cur.fetchone()
-
-        if not result:
-            return 0  # Ticket not found or doesn't belong to user
-
-        if result[0] == 'cancelled':
-            return -1  # Already cancelled
-
-        # Cancel the ticket
-        cur.execute("""
-            UPDATE tickets 
-            SET status = 'cancelled' 
-            WHERE ticket_id = %s AND passanger_id = %s
-        """, (ticket_id, passanger_id))
-
-        rows_affected = cur.rowcount
-        conn.commit()
-        return rows_affected
-
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
-
-
-def view_user_tickets(passanger_id):
-    """Get all tickets for a passenger - NO CACHING for real-time updates"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT t.ticket_id, f.flight_number,
-               o.name AS origin, d.name AS destination,
-               f.departure_time, f.arrival_time, t.seat_no, t.status
-        FROM tickets t
-        JOIN flights f ON t.flight_id = f.flight_id
-        LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
-        LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
-        WHERE t.passanger_id = %s
-        ORDER BY t.ticket_id
-    """, (passanger_id,))
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-
-# ------------------- Payment Functions -------------------
-def make_payment(ticket_id, amount, method, passanger_id):
-    """Make payment and confirm the ticket - MUST PAY EXACT FARE"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-
-    try:
-        # Get ticket details including fare
-        cur.execute("""
-            SELECT t.status, t.passanger_id, f.fare 
-            FROM tickets t
-            JOIN flights f ON t.flight_id = f.flight_id
-            WHERE t.ticket_id = %s
-        """, (ticket_id,))
-        result = cur.fetchone()
-
-        if not result:
-            return False, "Ticket not found!"
-
-        ticket_status, ticket_passanger_id, flight_fare = result
-
-        if ticket_passanger_id != passanger_id:
-            return False, "This ticket doesn't belong to you!"
-
-        if ticket_status == 'cancelled':
-            return False, "Cannot pay for a cancelled ticket!"
-
-        if ticket_status == 'confirmed':
-            return False, "Payment already made for this ticket!"
-
-        # Validate payment amount matches fare exactly
-        if float(amount) != float(flight_fare):
-            return False, f"Payment amount must be exactly ₹{flight_fare:.2f}. You entered ₹{amount:.2f}"
-
-        # Insert payment
-        cur.execute("""
-            INSERT INTO payments (ticket_id, amount, method, status)
-            VALUES (%s, %s, %s, 'success')
-        """, (ticket_id, amount, method))
-
-        # Update ticket status to confirmed
-        cur.execute("""
-            UPDATE tickets 
-            SET status = 'confirmed' 
-            WHERE ticket_id = %s
-        """, (ticket_id,))
-
-        conn.commit()
-        return True, "Payment successful! Ticket confirmed."
-
-    except Exception as e:
-        conn.rollback()
-        return False, f"Error: {str(e)}"
-    finally:
-        cur.close()
-        conn.close()
-
-
-def view_user_payments(passanger_id):
-    """Get all payments for a passenger - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT p.payment_id, p.ticket_id, p.amount, p.method, p.status, p.payment_time
-        FROM payments p
-        JOIN tickets t ON p.ticket_id = t.ticket_id
-        WHERE t.passanger_id = %s
-        ORDER BY p.payment_time DESC
-    """, (passanger_id,))
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-
-# ------------------- Available Flights -------------------
-def get_available_flights():
-    """Get all available flights with capacity info - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT f.flight_id, f.flight_number, 
-               o.name AS origin, d.name AS destination, 
-               f.departure_time, f.arrival_time, 
-               a.model AS aircraft,
-               a.seat_capacity,
-               COALESCE(
-                   (SELECT COUNT(*) FROM tickets t 
-                    WHERE t.flight_id = f.flight_id 
-                    AND t.status != 'cancelled'), 0
-               ) AS booked_seats,
-               f.fare
-        FROM flights f
-        LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
-        LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
-        LEFT JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
-        ORDER BY f.flight_id
-    """)
-    columns = [desc[0] for desc in cur.description]
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
-    return columns, data
-
-
-def get_ticket_fare(ticket_id):
-    """Get the fare for a specific ticket - NO CACHING"""
-    conn = get_airline_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT f.fare 
-        FROM tickets t
-        JOIN flights f ON t.flight_id = f.flight_id
-        WHERE t.ticket_id = %s
-    """, (ticket_id,))
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-    return result[0] if result else None
-
-
+from psycopg2 import errors
+from database import airline_connection, replica_connection, run_in_transaction
+from inventory import record_ticket_changes, ensure_inventory_row
+from seatmap import SeatMap, normalise_seat_label
+from db_config import HOLD_CONFIG
+from cache import view_cache
+from change_feed import cached_view
+
+def add_passenger(full_name, email, phone, nationality):
+    with airline_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO passangers (full_name, email, phone, nationality)
+            VALUES (%s, %s, %s, %s)
+            RETURNING passanger_id
+        """, (full_name, email, phone, nationality))
+        passanger_id = cur.fetchone()[0]
+        conn.commit()
+    return passanger_id
+
+
+# Claims a seat and inserts the ticket in one statement. The conditional
+# UPDATE row-locks the flight's inventory row, so concurrent bookers on the
+# same flight queue behind each other and re-check capacity and the seat's
+# bit in seat_bitmap once they get the lock. A taken or unknown seat leaves
+# the claim empty, so no INSERT is attempted; the partial unique index only
+# backs up seats booked before seat maps existed.
+BOOK_SEAT_SQL = """
+    WITH claim AS (
+        UPDATE flight_inventory fi
+        SET booked_seats = fi.booked_seats + 1,
+            pending_seats = fi.pending_seats + 1,
+            seat_bitmap = set_bit(COALESCE(fi.seat_bitmap, decode(repeat('00', (a.seat_capacity + 7) / 8), 'hex')),
+                                  seat_index(%(seat_no)s, a.seats_per_row, a.seat_capacity), 1),
+            updated_at = NOW()
+        FROM flights f
+        JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+        WHERE fi.flight_id = %(flight_id)s
+          AND f.flight_id = fi.flight_id
+          AND fi.booked_seats < a.seat_capacity
+          AND seat_index(%(seat_no)s, a.seats_per_row, a.seat_capacity) IS NOT NULL
+          AND (fi.seat_bitmap IS NULL
+               OR get_bit(fi.seat_bitmap, seat_index(%(seat_no)s, a.seats_per_row, a.seat_capacity)) = 0)
+        RETURNING fi.flight_id, a.seat_capacity, fi.booked_seats
+    ), ticket AS (
+        INSERT INTO tickets (passanger_id, flight_id, seat_no, status)
+        SELECT %(passanger_id)s, flight_id, %(seat_no)s, 'pending' FROM claim
+        ON CONFLICT (flight_id, seat_no) WHERE status != 'cancelled' DO NOTHING
+        RETURNING ticket_id
+    )
+    SELECT (SELECT ticket_id FROM ticket), seat_capacity, booked_seats FROM claim
+"""
+
+SEAT_STATE_SQL = """
+    SELECT a.seat_capacity, a.seats_per_row, fi.booked_seats, fi.seat_bitmap
+    FROM flights f
+    JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+    LEFT JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+    WHERE f.flight_id = %s
+"""
+
+# Auto-assigned seats can be taken by someone else between reading the seat
+# map and claiming; pick again this many times before giving up
+SEAT_CLAIM_ATTEMPTS = 5
+
+
+def get_seat_map(flight_id):
+    """Seat layout and occupancy of a flight as a SeatMap, or None if the flight doesn't exist.
+
+    Cached until a booking on the flight is notified (see change_feed.py).
+    """
+    def load():
+        with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+            cur.execute(SEAT_STATE_SQL, (flight_id,))
+            return cur.fetchone()
+
+    return seat_map_of(cached_view(("seat_map", flight_id), load))
+
+
+def seat_map_of(seat_state):
+    """SeatMap from a SEAT_STATE_SQL row, or None for no row"""
+    if not seat_state:
+        return None
+    seat_capacity, seats_per_row, _, bitmap = seat_state
+    return SeatMap(seat_capacity, seats_per_row, bitmap)
+
+
+def next_seat_claim(seat_state, seat_no, label):
+    """What book_flight does after a claim of ``label`` came back empty (or was not tried yet).
+
+    ``seat_state`` is the SEAT_STATE_SQL row read after it. Returns
+    (label, None) to claim that seat, (None, None) when the flight's
+    inventory row must be created before claiming again, or (None, message)
+    to give up with that message.
+    """
+    if not seat_state:
+        return None, "❌ Flight not found!"
+
+    seat_capacity, seats_per_row, booked_seats, bitmap = seat_state
+    if booked_seats is None:
+        # Flight predates flight_inventory
+        return None, None
+    if booked_seats >= seat_capacity:
+        return None, f"❌ Flight is full! Capacity: {seat_capacity}, Booked: {booked_seats}"
+
+    seat_map = SeatMap(seat_capacity, seats_per_row, bitmap)
+    if seat_no:
+        index = seat_map.seat_index(label)
+        if index is None:
+            return None, (f"❌ Seat {label} does not exist on this aircraft "
+                          f"(rows 1-{seat_map.rows}, seats {seat_map.label(0)[-1]}-"
+                          f"{seat_map.label(seats_per_row - 1)[-1]})")
+        if seat_map.is_taken(index):
+            return None, "❌ This seat is already booked for this flight!"
+        return label, None
+
+    label = seat_map.best_available()
+    if label is None:
+        return None, f"❌ Flight is full! Capacity: {seat_capacity}"
+    return label, None
+
+
+def booking_message(label, seat_capacity, booked_seats):
+    remaining_seats = seat_capacity - booked_seats
+    return (f"Booking successful! Seat {label}, {remaining_seats} seats remaining. "
+            f"Please complete payment within {HOLD_CONFIG['ttl_minutes']} minutes to confirm.")
+
+
+def book_flight(passanger_id, flight_id, seat_no=None):
+    """Book a flight - status is 'pending' until payment - CHECK CAPACITY
+
+    Capacity check, seat claim and ticket insert are a single atomic
+    statement, so concurrent bookers can never oversell a flight or sell
+    a seat twice. With no seat_no the best free seat is assigned
+    (frontmost row, window before aisle before middle).
+    """
+    requested = normalise_seat_label(seat_no) if seat_no else None
+
+    with airline_connection() as conn:
+        def attempt(cur):
+            label = requested
+            for _ in range(SEAT_CLAIM_ATTEMPTS):
+                result = None
+                if label:
+                    cur.execute(BOOK_SEAT_SQL, {"passanger_id": passanger_id, "flight_id": flight_id,
+                                                "seat_no": label})
+                    result = cur.fetchone()
+                if result:
+                    break
+
+                # Nothing claimed yet - read the seat map to pick a seat or explain why
+                cur.execute(SEAT_STATE_SQL, (flight_id,))
+                next_label, error = next_seat_claim(cur.fetchone(), seat_no, label)
+                if error:
+                    return False, None, error
+                if next_label is None:
+                    ensure_inventory_row(cur, flight_id)
+                else:
+                    label = next_label
+            else:
+                return False, None, "❌ Could not reserve a seat right now, please try again"
+
+            ticket_id, seat_capacity, booked_seats = result
+            if ticket_id is None:
+                conn.rollback()  # give the claimed seat back
+                return False, None, "❌ This seat is already booked for this flight!"
+            return True, ticket_id, booking_message(label, seat_capacity, booked_seats)
+
+        try:
+            result = run_in_transaction(conn, attempt)
+        except Exception as e:
+            conn.rollback()
+            return False, None, f"❌ Error: {str(e)}"
+    if result[0]:
+        view_cache.invalidate(("tickets", passanger_id), ("seat_map", flight_id))
+    return result
+
+
+LOCK_USER_TICKET_SQL = """
+    SELECT status FROM tickets
+    WHERE ticket_id = %s AND passanger_id = %s
+    FOR UPDATE
+"""
+
+CANCEL_TICKET_SQL = """
+    UPDATE tickets
+    SET status = 'cancelled'
+    WHERE ticket_id = %s AND passanger_id = %s
+    RETURNING flight_id, seat_no
+"""
+
+
+def cancel_ticket(ticket_id, passanger_id):
+    with airline_connection() as conn, conn.cursor() as cur:
+        try:
+            # Check if ticket exists and belongs to user
+            cur.execute(LOCK_USER_TICKET_SQL, (ticket_id, passanger_id))
+
+            result = cur.fetchone()
+
+            if not result:
+                return 0  # Ticket not found or doesn't belong to user
+
+            if result[0] == 'cancelled':
+                return -1  # Already cancelled
+
+            # Cancel the ticket
+            cur.execute(CANCEL_TICKET_SQL, (ticket_id, passanger_id))
+
+            rows_affected = cur.rowcount
+            cancelled = cur.fetchall()
+            record_ticket_changes(cur, [(flight_id, result[0], 'cancelled', seat) for flight_id, seat in cancelled])
+            conn.commit()
+            view_cache.invalidate(("tickets", passanger_id),
+                                  *[("seat_map", flight_id) for flight_id, _ in cancelled])
+            return rows_affected
+
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+
+def cancel_tickets_bulk(ticket_ids, passanger_id=None):
+    """Cancel many tickets in one transaction.
+
+    With a passanger_id only that passenger's tickets count, as in
+    cancel_ticket; without one (admin clean-up) any ticket does. Returns
+    {ticket_id: 'cancelled', 'already cancelled' or 'not found'}.
+    """
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    with airline_connection() as conn, conn.cursor() as cur:
+        try:
+            # Rows are locked in ticket_id order so overlapping batches can't deadlock
+            cur.execute("""
+                WITH locked AS (
+                    SELECT ticket_id, status FROM tickets
+                    WHERE ticket_id = ANY(%(ticket_ids)s::int[])
+                      AND (%(passanger_id)s::int IS NULL OR passanger_id = %(passanger_id)s)
+                    ORDER BY ticket_id
+                    FOR UPDATE
+                ), cancelled AS (
+                    UPDATE tickets t
+                    SET status = 'cancelled'
+                    FROM locked l
+                    WHERE t.ticket_id = l.ticket_id AND l.status != 'cancelled'
+                    RETURNING t.ticket_id, t.flight_id, t.seat_no
+                )
+                SELECT l.ticket_id, l.status, c.flight_id, c.seat_no
+                FROM locked l
+                LEFT JOIN cancelled c ON c.ticket_id = l.ticket_id
+            """, {"ticket_ids": ticket_ids, "passanger_id": passanger_id})
+
+            rows = cur.fetchall()
+            record_ticket_changes(cur, [(flight_id, status, 'cancelled', seat)
+                                        for _, status, flight_id, seat in rows if flight_id is not None])
+            conn.commit()
+            # Other passengers' tickets (admin clean-up) are evicted by the change feed
+            keys = [("seat_map", flight_id) for _, _, flight_id, _ in rows if flight_id is not None]
+            if keys and passanger_id is not None:
+                keys.append(("tickets", passanger_id))
+            if keys:
+                view_cache.invalidate(*keys)
+
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+    found = {ticket_id: status for ticket_id, status, _, _ in rows}
+    return {ticket_id: "not found" if ticket_id not in found
+            else "already cancelled" if found[ticket_id] == 'cancelled'
+            else "cancelled"
+            for ticket_id in ticket_ids}
+
+
+USER_TICKETS_SQL = """
+    SELECT t.ticket_id, f.flight_number,
+           o.name AS origin, d.name AS destination,
+           f.departure_time, f.arrival_time, t.seat_no, t.status, f.fare
+    FROM tickets t
+    JOIN flights f ON t.flight_id = f.flight_id
+    LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+    LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+    WHERE t.passanger_id = %s
+    ORDER BY t.ticket_id
+"""
+
+
+def view_user_tickets(passanger_id):
+    """Get all tickets for a passenger - cached until a change to them is notified"""
+    def load():
+        with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+            cur.execute(USER_TICKETS_SQL, (passanger_id,))
+            columns = [desc[0] for desc in cur.description]
+            data = cur.fetchall()
+        return columns, data
+
+    return cached_view(("tickets", passanger_id), load)
+
+
+# ------------------- Payment Functions -------------------
+PAYMENT_METHODS = ["credit_card", "upi", "debit_card", "netbanking", "cash"]
+
+# Checks, confirms and pays for a ticket in one statement. The ticket CTE
+# locks the row first, so a concurrent payment, cancellation or hold expiry
+# is waited out and its outcome seen; the ticket is confirmed and the
+# payment recorded only if it is still pending, its hold has not expired
+# (even if hold_sweeper.py has not cancelled it yet), it belongs to the
+# payer and the amount is the fare. Returns the ticket's current state,
+# the new payment_id (NULL if nothing was paid) and whether the hold has
+# expired, or no row if there is no such ticket.
+PAY_TICKET_SQL = """
+    WITH ticket AS (
+        SELECT t.ticket_id, t.status, t.passanger_id, f.fare, t.flight_id,
+               t.booked_at <= NOW() - make_interval(secs => %(hold_seconds)s) AS expired
+        FROM tickets t
+        JOIN flights f ON t.flight_id = f.flight_id
+        WHERE t.ticket_id = %(ticket_id)s
+        FOR UPDATE OF t
+    ), confirmed AS (
+        UPDATE tickets t
+        SET status = 'confirmed'
+        FROM ticket
+        WHERE t.ticket_id = ticket.ticket_id
+          AND ticket.status = 'pending'
+          AND NOT ticket.expired
+          AND ticket.passanger_id = %(passanger_id)s
+          AND ticket.fare = %(amount)s
+        RETURNING t.ticket_id
+    ), paid AS (
+        INSERT INTO payments (ticket_id, amount, method, status, idempotency_key)
+        SELECT ticket_id, %(amount)s, %(method)s, 'success', %(idempotency_key)s
+        FROM confirmed
+        RETURNING payment_id
+    )
+    SELECT ticket.status, ticket.passanger_id, ticket.fare, ticket.flight_id, paid.payment_id, ticket.expired
+    FROM ticket
+    LEFT JOIN paid ON TRUE
+"""
+
+# The payment an idempotency key already went to, and whose ticket it paid for
+PAYMENT_BY_KEY_SQL = """
+    SELECT p.ticket_id, t.passanger_id
+    FROM payments p
+    JOIN tickets t ON t.ticket_id = p.ticket_id
+    WHERE p.idempotency_key = %s
+"""
+
+PAYMENT_CONFIRMED = "Payment successful! Ticket confirmed."
+HOLD_EXPIRED = "Your seat hold has expired! Please book the flight again."
+
+
+def pay_ticket_params(ticket_id, amount, method, passanger_id, idempotency_key):
+    """PAY_TICKET_SQL parameters, with the hold TTL from HOLD_CONFIG"""
+    return {"ticket_id": ticket_id, "amount": amount, "method": method, "passanger_id": passanger_id,
+            "idempotency_key": idempotency_key, "hold_seconds": 60 * HOLD_CONFIG["ttl_minutes"]}
+
+
+def payment_error(ticket, amount, passanger_id):
+    """Why a payment of ``amount`` for the PAY_TICKET_SQL row ``ticket`` is refused, or None"""
+    if not ticket:
+        return "Ticket not found!"
+
+    ticket_status, ticket_passanger_id, flight_fare = ticket[:3]
+
+    if ticket_passanger_id != passanger_id:
+        return "This ticket doesn't belong to you!"
+
+    if ticket_status == 'cancelled':
+        return "Cannot pay for a cancelled ticket!"
+
+    if ticket_status == 'confirmed':
+        return "Payment already made for this ticket!"
+
+    if len(ticket) > 5 and ticket[5]:
+        return HOLD_EXPIRED
+
+    # Validate payment amount matches fare exactly
+    if float(amount) != float(flight_fare):
+        return f"Payment amount must be exactly ₹{flight_fare:.2f}. You entered ₹{amount:.2f}"
+    return None
+
+
+def unpaid_result(ticket, earlier, amount, ticket_id, passanger_id):
+    """make_payment's (success, message) when PAY_TICKET_SQL paid nothing.
+
+    ``earlier`` is the PAYMENT_BY_KEY_SQL row of the call's idempotency key,
+    if that key was used before: a retry of the payment that went through
+    gets the same answer as the first call.
+    """
+    if earlier == (ticket_id, passanger_id):
+        return True, PAYMENT_CONFIRMED
+    if earlier:
+        return False, "This idempotency key was already used for another payment!"
+    return False, payment_error(ticket, amount, passanger_id) or "Payment already made for this ticket!"
+
+
+def make_payment(ticket_id, amount, method, passanger_id, idempotency_key=None):
+    """Make payment and confirm the ticket - MUST PAY EXACT FARE.
+
+    Calls repeating an ``idempotency_key`` (a double click, a client retry)
+    are answered like the first one instead of paying again.
+    """
+    with airline_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute(PAY_TICKET_SQL, pay_ticket_params(ticket_id, amount, method, passanger_id, idempotency_key))
+            ticket = cur.fetchone()
+            if ticket and ticket[4] is not None:
+                _, _, flight_fare, flight_id, _, _ = ticket
+                record_ticket_changes(cur, [(flight_id, 'pending', 'confirmed')],
+                                      payments=[(flight_id, flight_fare, 1)])
+                conn.commit()
+                view_cache.invalidate(("tickets", passanger_id), ("payments", passanger_id))
+                return True, PAYMENT_CONFIRMED
+            conn.rollback()
+
+        except errors.UniqueViolation:
+            # The key went to another ticket, or the ticket was paid for already:
+            # answer as for a confirmed ticket
+            conn.rollback()
+            ticket = ('confirmed', passanger_id, amount)
+        except Exception as e:
+            conn.rollback()
+            return False, f"Error: {str(e)}"
+
+        earlier = None
+        if idempotency_key is not None:
+            cur.execute(PAYMENT_BY_KEY_SQL, (idempotency_key,))
+            earlier = cur.fetchone()
+        return unpaid_result(ticket, earlier, amount, ticket_id, passanger_id)
+
+
+USER_PAYMENTS_SQL = """
+    SELECT p.payment_id, p.ticket_id, p.amount, p.method, p.status, p.payment_time
+    FROM payments p
+    JOIN tickets t ON p.ticket_id = t.ticket_id
+    WHERE t.passanger_id = %s
+    ORDER BY p.payment_time DESC
+"""
+
+
+def view_user_payments(passanger_id):
+    """Get all payments for a passenger - cached until a change to them is notified"""
+    def load():
+        with replica_connection(process_wide=True) as conn, conn.cursor() as cur:
+            cur.execute(USER_PAYMENTS_SQL, (passanger_id,))
+            columns = [desc[0] for desc in cur.description]
+            data = cur.fetchall()
+        return columns, data
+
+    return cached_view(("payments", passanger_id), load)
+
+
+# ------------------- Available Flights -------------------
+def get_available_flights():
+    """Get all available flights with capacity info from flight_inventory - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.flight_id, f.flight_number,
+                   o.name AS origin, d.name AS destination,
+                   f.departure_time, f.arrival_time,
+                   a.model AS aircraft,
+                   a.seat_capacity,
+                   COALESCE(fi.booked_seats, 0) AS booked_seats,
+                   f.fare
+            FROM flights f
+            LEFT JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+            LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+            LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+            LEFT JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+            ORDER BY f.flight_id
+        """)
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+
+# Sort keys accepted by search_flights, mapped to their ORDER BY clauses
+FLIGHT_SORTS = {
+    "departure": "f.departure_time, f.flight_id",
+    "fare": "f.fare, f.departure_time, f.flight_id",
+    "duration": "f.arrival_time - f.departure_time, f.departure_time, f.flight_id",
+    "seats": "available_seats DESC, f.departure_time, f.flight_id",
+}
+MAX_SEARCH_RESULTS = 500
+
+
+def search_flights(origin=None, destination=None, depart_from=None, depart_to=None,
+                   min_free_seats=1, max_fare=None, sort="departure", limit=50):
+    """Search future flights with at least ``min_free_seats`` free seats - NO CACHING
+
+    origin/destination are airport codes; depart_from/depart_to are dates
+    (inclusive). Airport codes are resolved to ids first, so a route search
+    seeks on the (origin, destination, departure) index and reads only the
+    matching flights. Returns at most ``limit`` rows ordered by ``sort``
+    (one of FLIGHT_SORTS).
+    """
+    if sort not in FLIGHT_SORTS:
+        raise ValueError(f"Unknown sort {sort!r}, expected one of {', '.join(FLIGHT_SORTS)}")
+
+    clauses = [
+        "f.departure_time > NOW()",
+        "a.seat_capacity - COALESCE(fi.booked_seats, 0) >= %s",
+    ]
+    params = [max(int(min_free_seats), 1)]
+    if origin:
+        clauses.append("f.origin_airport_id = (SELECT airport_id FROM airports WHERE code = %s)")
+        params.append(origin.strip().upper())
+    if destination:
+        clauses.append("f.destination_airport_id = (SELECT airport_id FROM airports WHERE code = %s)")
+        params.append(destination.strip().upper())
+    if depart_from:
+        clauses.append("f.departure_time >= %s::date")
+        params.append(depart_from)
+    if depart_to:
+        clauses.append("f.departure_time < %s::date + 1")
+        params.append(depart_to)
+    if max_fare is not None:
+        clauses.append("f.fare <= %s")
+        params.append(max_fare)
+    params.append(min(max(int(limit), 1), MAX_SEARCH_RESULTS))
+
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT f.flight_id, f.flight_number,
+                   o.code AS origin_code, o.name AS origin,
+                   d.code AS destination_code, d.name AS destination,
+                   f.departure_time, f.arrival_time,
+                   a.model AS aircraft,
+                   a.seat_capacity,
+                   COALESCE(fi.booked_seats, 0) AS booked_seats,
+                   a.seat_capacity - COALESCE(fi.booked_seats, 0) AS available_seats,
+                   f.fare
+            FROM flights f
+            JOIN aircrafts a ON f.aircraft_id = a.aircraft_id
+            LEFT JOIN flight_inventory fi ON fi.flight_id = f.flight_id
+            LEFT JOIN airports o ON f.origin_airport_id = o.airport_id
+            LEFT JOIN airports d ON f.destination_airport_id = d.airport_id
+            WHERE {" AND ".join(clauses)}
+            ORDER BY {FLIGHT_SORTS[sort]}
+            LIMIT %s
+        """, params)
+        columns = [desc[0] for desc in cur.description]
+        data = cur.fetchall()
+    return columns, data
+
+
+def get_ticket_fare(ticket_id):
+    """Get the fare for a specific ticket - NO CACHING"""
+    with replica_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.fare
+            FROM tickets t
+            JOIN flights f ON t.flight_id = f.flight_id
+            WHERE t.ticket_id = %s
+        """, (ticket_id,))
+        result = cur.fetchone()
+    return result[0] if result else None